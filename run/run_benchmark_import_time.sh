@@ -0,0 +1,5 @@
+# Measures the cold start import time of the entry points in fresh interpreters.
+# Run it on two commits to compare them.
+repeats=5
+
+python3 -u ./src/benchmarks/import_time.py --repeats "${repeats}"
@@ -0,0 +1,8 @@
+# Compares rendering large schema prompts through LangChain against the compiled template cache.
+tables=60 # Tables of the synthetic schema
+columns=40 # Columns per table
+repeats=50
+
+python3 -u ./src/benchmarks/prompt_render.py --tables "${tables}" \
+                                             --columns "${columns}" \
+                                             --repeats "${repeats}"
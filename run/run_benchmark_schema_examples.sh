@@ -0,0 +1,8 @@
+# Define variables
+source .env
+db_root_directory=$DB_ROOT_DIRECTORY # UPDATE THIS WITH THE PATH TO THE PARENT DIRECTORY OF THE DATABASES (e.g. the BIRD dev databases)
+db_id="all" # Options: all or a specific db_id
+
+# Run the benchmark with the defined variables
+python3 -u ./src/benchmarks/schema_examples.py --db_root_directory "${db_root_directory}" \
+                                               --db_id "${db_id}"
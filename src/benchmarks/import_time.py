@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+SRC_DIRECTORY = Path(__file__).resolve().parents[1]
+ROOT_DIRECTORY = SRC_DIRECTORY.parent
+
+# Provider SDKs that are only needed once an engine of the provider is constructed.
+PROVIDER_MODULES = [
+    "langchain_openai",
+    "langchain_anthropic",
+    "langchain_google_genai",
+    "langchain_google_vertexai",
+    "google.cloud.aiplatform",
+    "vertexai",
+]
+
+# Entry points, with the directory they are started from.
+ENTRY_POINTS = {
+    "web_interface": ROOT_DIRECTORY,
+    "main": SRC_DIRECTORY,
+}
+
+MEASURE_SCRIPT = """
+import sys, json, time
+sys.path[:0] = {paths!r}
+start_time = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start_time
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {provider_modules!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str, directory: Path) -> dict:
+    """
+    Imports a module in a fresh interpreter and measures the import time.
+
+    Args:
+        module (str): The module to import.
+        directory (Path): The directory the interpreter is started from.
+
+    Returns:
+        dict: The import time in seconds and the provider SDKs loaded by the import.
+    """
+    script = MEASURE_SCRIPT.format(paths=[str(directory), str(SRC_DIRECTORY)], module=module, provider_modules=PROVIDER_MODULES)
+    completed = subprocess.run([sys.executable, "-c", script], cwd=directory, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr.strip().splitlines()[-1]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_entry_point(module: str, directory: Path, repeats: int) -> dict:
+    """
+    Measures the cold start import time of an entry point over several fresh interpreters.
+
+    Args:
+        module (str): The entry point module.
+        directory (Path): The directory the entry point is started from.
+        repeats (int): The number of measurements.
+
+    Returns:
+        dict: The median and minimum import times, and the provider SDKs loaded at import.
+    """
+    measurements = [measure_import(module, directory) for _ in range(repeats)]
+    seconds = [measurement["seconds"] for measurement in measurements]
+    return {
+        "median_seconds": statistics.median(seconds),
+        "min_seconds": min(seconds),
+        "loaded_providers": measurements[-1]["loaded"],
+    }
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Benchmark the cold start import time of the entry points.")
+    args_parser.add_argument('--entry_points', type=str, nargs='+', default=list(ENTRY_POINTS), help="Entry point modules to import")
+    args_parser.add_argument('--repeats', type=int, default=5, help="Number of fresh interpreters per entry point")
+    args = args_parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    for module in args.entry_points:
+        result = benchmark_entry_point(module, ENTRY_POINTS.get(module, ROOT_DIRECTORY), args.repeats)
+        print(f"{module}: median {result['median_seconds']:.3f}s | min {result['min_seconds']:.3f}s | "
+              f"provider SDKs loaded at import: {', '.join(result['loaded_providers']) or 'none'}")
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+# Add the src directory to Python path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from langchain.prompts import PromptTemplate, HumanMessagePromptTemplate, ChatPromptTemplate
+
+from llm.prompts import PROMPT_TEMPLATE_REGISTRY, PROMPT_LAYOUT_SHUFFLED, _load_template, apply_prompt_layout, get_prompt
+
+
+def build_schema_string(tables: int, columns: int) -> str:
+    """
+    Builds a synthetic database schema in the layout of the schema prompts.
+
+    Args:
+        tables (int): The number of tables.
+        columns (int): The number of columns per table.
+
+    Returns:
+        str: The schema string.
+    """
+    schema_lines = []
+    for table_index in range(tables):
+        schema_lines.append(f"CREATE TABLE table_{table_index}\n(")
+        for column_index in range(columns):
+            schema_lines.append(f"\tcolumn_{column_index} TEXT, -- Column {column_index} of table {table_index}. "
+                                f"Example Values: `value_a`, `value_b`, `value_c` | Value Statics: Total count 1000 - Distinct count 3 - Null count 0")
+        schema_lines.append(");")
+    return "\n".join(schema_lines)
+
+def get_langchain_prompt(template_name: str, prompt_layout: str) -> ChatPromptTemplate:
+    """
+    Builds a prompt the way it was built before the template cache: read, scanned and constructed on every call.
+
+    Args:
+        template_name (str): The name of the template.
+        prompt_layout (str): The prompt layout.
+
+    Returns:
+        ChatPromptTemplate: The prompt.
+    """
+    template = apply_prompt_layout(_load_template(template_name), prompt_layout)
+    prompt_template = PromptTemplate.from_template(template)
+    return ChatPromptTemplate.from_messages([HumanMessagePromptTemplate(prompt=prompt_template)])
+
+def benchmark_template(template_name: str, schema_string: str, repeats: int) -> dict:
+    """
+    Compares building and rendering a prompt through LangChain against the compiled template cache.
+
+    Args:
+        template_name (str): The name of the template.
+        schema_string (str): The schema rendered into the prompt.
+        repeats (int): The number of renders per path.
+
+    Returns:
+        dict: The median render times in milliseconds and whether both paths render the same text.
+    """
+    input_variables = get_prompt(template_name=template_name).input_variables
+    values = {variable: schema_string if "schema" in variable.lower() else f"<{variable}>" for variable in input_variables}
+    results = {}
+    for path_name, build_prompt in (("langchain", get_langchain_prompt), ("compiled", lambda name, layout: get_prompt(template_name=name, prompt_layout=layout))):
+        timings = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            prompt_text = build_prompt(template_name, PROMPT_LAYOUT_SHUFFLED).format(**values)
+            timings.append((time.perf_counter() - start_time) * 1000)
+        results[path_name] = (statistics.median(timings), prompt_text)
+    return {
+        "langchain_ms": results["langchain"][0],
+        "compiled_ms": results["compiled"][0],
+        "prompt_length": len(results["compiled"][1]),
+        "same_output": results["langchain"][1] == results["compiled"][1],
+    }
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Benchmark prompt rendering for large schema prompts.")
+    args_parser.add_argument('--templates', type=str, nargs='+', default=["generate_candidate_one", "generate_candidate_two", "select_tables", "select_columns"], help="Template names to render")
+    args_parser.add_argument('--tables', type=int, default=60, help="Number of tables of the synthetic schema")
+    args_parser.add_argument('--columns', type=int, default=40, help="Number of columns per table of the synthetic schema")
+    args_parser.add_argument('--repeats', type=int, default=50, help="Number of renders per template and path")
+    args = args_parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    PROMPT_TEMPLATE_REGISTRY.load_all()
+    schema_string = build_schema_string(args.tables, args.columns)
+    for template_name in args.templates:
+        result = benchmark_template(template_name, schema_string, args.repeats)
+        print(f"{template_name} ({result['prompt_length']} chars): langchain {result['langchain_ms']:.3f}ms | "
+              f"compiled {result['compiled_ms']:.3f}ms | same output: {result['same_output']}")
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+# Add the src directory to Python path
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from database_utils.execution import execute_sql
+from database_utils.db_info import get_db_schema
+from database_utils.schema_generator import DatabaseSchemaGenerator
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def benchmark_database(db_path: str) -> dict:
+    """
+    Compares per-column example queries against the single-scan table sampler on one database.
+
+    Args:
+        db_path (str): The path to the database file.
+
+    Returns:
+        dict: The number of queries, the elapsed times and the number of columns with identical examples.
+    """
+    schema = get_db_schema(db_path)
+
+    start_time = time.perf_counter()
+    per_column_examples = {}
+    for table_name, column_names in schema.items():
+        for column_name in column_names:
+            per_column_examples[(table_name, column_name)] = execute_sql(db_path=db_path, 
+                                                                         sql=f"SELECT DISTINCT `{column_name}` FROM `{table_name}` WHERE `{column_name}` IS NOT NULL LIMIT 3", 
+                                                                         fetch="all")
+    per_column_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    per_table_examples = {}
+    for table_name, column_names in schema.items():
+        table_examples = DatabaseSchemaGenerator._sample_table_examples(db_path, table_name, column_names)
+        per_table_examples.update({(table_name, column_name): examples for column_name, examples in table_examples.items()})
+    per_table_time = time.perf_counter() - start_time
+
+    same_examples = sum(1 for key, examples in per_column_examples.items() if set(examples) == set(per_table_examples[key]))
+    return {
+        "tables": len(schema),
+        "columns": len(per_column_examples),
+        "per_column_queries": len(per_column_examples),
+        "per_column_time": per_column_time,
+        "per_table_time": per_table_time,
+        "same_examples": same_examples,
+    }
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description="Benchmark example fetching for schema generation.")
+    args_parser.add_argument('--db_root_directory', type=str, required=True, help="Root directory of the databases")
+    args_parser.add_argument('--db_id', type=str, default='all', help="Database ID or 'all' to process all databases")
+    args = args_parser.parse_args()
+
+    db_ids = sorted(os.listdir(args.db_root_directory)) if args.db_id == 'all' else [args.db_id]
+    total_per_column_time = 0.0
+    total_per_table_time = 0.0
+    for db_id in db_ids:
+        db_path = Path(args.db_root_directory) / db_id / f"{db_id}.sqlite"
+        if not db_path.exists():
+            continue
+        result = benchmark_database(str(db_path))
+        total_per_column_time += result["per_column_time"]
+        total_per_table_time += result["per_table_time"]
+        print(f"{db_id}: {result['columns']} columns in {result['tables']} tables | "
+              f"per column: {result['per_column_queries']} queries, {result['per_column_time']:.3f}s | "
+              f"per table: {result['per_table_time']:.3f}s | "
+              f"identical examples: {result['same_examples']}/{result['columns']}")
+    print(f"Total per column: {total_per_column_time:.3f}s | Total per table: {total_per_table_time:.3f}s")
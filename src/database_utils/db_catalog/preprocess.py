@@ -1,32 +1,18 @@
 import os
+import pickle
+import numpy as np
 from pathlib import Path
 import logging
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain.schema.document import Document
 from langchain_openai import OpenAIEmbeddings
-from langchain_google_vertexai import VertexAIEmbeddings
-from google.oauth2 import service_account
-from google.cloud import aiplatform
-import vertexai
 
 from database_utils.db_catalog.csv_utils import load_tables_description
 
 load_dotenv(override=True)
 
-GCP_PROJECT = os.getenv("GCP_PROJECT")
-GCP_REGION = os.getenv("GCP_REGION")
-GCP_CREDENTIALS = os.getenv("GCP_CREDENTIALS")
-
-if GCP_CREDENTIALS and GCP_PROJECT and GCP_REGION:
-    aiplatform.init(
-    project=GCP_PROJECT,
-    location=GCP_REGION,
-    credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS)
-    )
-    vertexai.init(project=GCP_PROJECT, location=GCP_REGION, credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS))
-
-
+# Vertex AI embeddings need `from langchain_google_vertexai import VertexAIEmbeddings` and `llm.providers.initialize_vertex_ai()` first.
 # EMBEDDING_FUNCTION = VertexAIEmbeddings(model_name="text-embedding-004")#OpenAIEmbeddings(model="text-embedding-3-large")
 EMBEDDING_FUNCTION = OpenAIEmbeddings(model="text-embedding-3-large")
 
@@ -66,6 +52,34 @@ def make_db_context_vec_db(db_directory_path: str, **kwargs) -> None:
 
     vector_db_path.mkdir(exist_ok=True)
 
-    Chroma.from_documents(docs, EMBEDDING_FUNCTION, persist_directory=str(vector_db_path))
+    vector_db = Chroma.from_documents(docs, EMBEDDING_FUNCTION, persist_directory=str(vector_db_path))
 
     logging.info(f"Context vector database created at {vector_db_path}")
+
+    export_context_flat_index(db_directory_path, vector_db=vector_db)
+
+def export_context_flat_index(db_directory_path: str, vector_db: Chroma = None) -> None:
+    """
+    Exports the context vector database to an in-process flat index (normalized embedding matrix and metadata).
+
+    Args:
+        db_directory_path (str): The path to the database directory.
+        vector_db (Chroma, optional): An already loaded context vector database. If not provided, it is loaded from disk.
+    """
+    db_id = Path(db_directory_path).name
+    if vector_db is None:
+        vector_db_path = Path(db_directory_path) / "context_vector_db"
+        vector_db = Chroma(persist_directory=str(vector_db_path), embedding_function=EMBEDDING_FUNCTION)
+
+    collection = vector_db.get(include=["embeddings", "metadatas"])
+    matrix = np.asarray(collection["embeddings"], dtype=np.float32)
+    if matrix.size:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+    preprocessed_path = Path(db_directory_path) / "preprocessed"
+    preprocessed_path.mkdir(exist_ok=True)
+    with open(preprocessed_path / f"{db_id}_context_index.pkl", "wb") as file:
+        pickle.dump({"matrix": matrix, "metadatas": collection["metadatas"]}, file)
+
+    logging.info(f"Context flat index with {len(collection['metadatas'])} entries exported for {db_id}")
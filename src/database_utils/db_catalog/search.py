@@ -1,5 +1,6 @@
 import logging
-from typing import Dict
+import numpy as np
+from typing import Dict, List, Any
 from langchain_chroma import Chroma
 
 def query_vector_db(vector_db: Chroma, query: str, top_k: int) -> Dict[str, Dict[str, dict]]:
@@ -23,8 +24,55 @@ def query_vector_db(vector_db: Chroma, query: str, top_k: int) -> Dict[str, Dict
         logging.error(f"Error executing query: {query}, Error: {e}")
         raise e
     
-    for doc, score in relevant_docs_score:
-        metadata = doc.metadata
+    table_description = _add_metadata_to_description(table_description, [(doc.metadata, score) for doc, score in relevant_docs_score])
+    logging.info(f"Query results processed for query: {query}")
+    return table_description
+
+def query_flat_index(matrix: np.ndarray, metadatas: List[Dict[str, Any]], query_embeddings: List[List[float]], top_k: int) -> List[Dict[str, Dict[str, dict]]]:
+    """
+    Answers a batch of queries against the in-process flat index with a single matrix multiplication.
+    Scores are squared L2 distances between normalized vectors, matching the scores returned by Chroma.
+
+    Args:
+        matrix (np.ndarray): The normalized embedding matrix of the catalog documents.
+        metadatas (List[Dict[str, Any]]): The metadata of each row of the matrix.
+        query_embeddings (List[List[float]]): The embeddings of the queries.
+        top_k (int): The number of top results to return per query.
+
+    Returns:
+        List[Dict[str, Dict[str, dict]]]: One table description dictionary per query, in the order of the queries.
+    """
+    if not query_embeddings:
+        return []
+    if matrix.size == 0:
+        return [{} for _ in query_embeddings]
+
+    queries = np.asarray(query_embeddings, dtype=np.float32)
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = queries / np.where(norms == 0, 1, norms)
+    similarities = queries @ matrix.T
+
+    k = min(top_k, matrix.shape[0])
+    top_indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    results = []
+    for row, indices in enumerate(top_indices):
+        indices = indices[np.argsort(-similarities[row, indices])]
+        scored_metadatas = [(metadatas[i], float(2 - 2 * similarities[row, i])) for i in indices]
+        results.append(_add_metadata_to_description({}, scored_metadatas))
+    return results
+
+def _add_metadata_to_description(table_description: Dict[str, Dict[str, dict]], scored_metadatas: List[Any]) -> Dict[str, Dict[str, dict]]:
+    """
+    Adds the retrieved catalog entries to a table description dictionary, keeping the first hit per column.
+
+    Args:
+        table_description (Dict[str, Dict[str, dict]]): The table description dictionary to update.
+        scored_metadatas (List[Any]): The (metadata, score) pairs ordered by relevance.
+
+    Returns:
+        Dict[str, Dict[str, dict]]: The updated table description dictionary.
+    """
+    for metadata, score in scored_metadatas:
         table_name = metadata["table_name"]
         original_column_name = metadata["original_column_name"].strip()
         column_name = metadata["column_name"].strip()
@@ -41,6 +89,4 @@ def query_vector_db(vector_db: Chroma, query: str, top_k: int) -> Dict[str, Dict
                 "value_description": value_description,
                 "score": score
             }
-    
-    logging.info(f"Query results processed for query: {query}")
     return table_description
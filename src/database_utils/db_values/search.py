@@ -2,7 +2,7 @@ import pickle
 from datasketch import MinHash, MinHashLSH
 from pathlib import Path
 import logging
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Set
 
 from database_utils.db_values.preprocess import _create_minhash
 
@@ -76,3 +76,37 @@ def query_lsh(lsh: MinHashLSH, minhashes: Dict[str, Tuple[MinHash, str, str, str
         similar_values_trimmed[table_name][column_name].append(value)
 
     return similar_values_trimmed
+
+def build_value_ngram_index(minhashes: Dict[str, Tuple[MinHash, str, str, str]], n_gram: int = 3) -> Set[str]:
+    """
+    Builds the set of character n-grams present in the indexed database values.
+
+    Args:
+        minhashes (Dict[str, Tuple[MinHash, str, str, str]]): The dictionary of MinHashes.
+        n_gram (int, optional): The n-gram size, which should match the one used to build the LSH.
+
+    Returns:
+        Set[str]: The set of n-grams present in at least one value.
+    """
+    ngram_index: Set[str] = set()
+    for _, _, _, value in minhashes.values():
+        ngram_index.update(value[i:i + n_gram] for i in range(len(value) - n_gram + 1))
+    return ngram_index
+
+def ngram_presence(ngram_index: Set[str], keyword: str, n_gram: int = 3) -> float:
+    """
+    Computes the fraction of the keyword's n-grams that are present in the value n-gram index.
+    A keyword with no n-gram in the index has a Jaccard similarity of zero with every indexed value.
+
+    Args:
+        ngram_index (Set[str]): The set of n-grams present in the indexed values.
+        keyword (str): The keyword to check.
+        n_gram (int, optional): The n-gram size.
+
+    Returns:
+        float: The fraction of present n-grams, 0.0 if the keyword is shorter than the n-gram size.
+    """
+    keyword_ngrams = {keyword[i:i + n_gram] for i in range(len(keyword) - n_gram + 1)}
+    if not keyword_ngrams:
+        return 0.0
+    return sum(1 for ngram in keyword_ngrams if ngram in ngram_index) / len(keyword_ngrams)
@@ -0,0 +1,212 @@
+from collections import deque
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from database_utils.schema import DatabaseSchema
+
+JoinEdge = Tuple[str, str, str, str]
+
+class JoinGraph:
+    """
+    Join graph of a database built once from its primary and foreign key metadata.
+    Tables are the nodes and foreign key relations are the (undirected) edges.
+    Connection columns and join paths between sets of tables are memoized, so repeated
+    schema expansions for the same database are cache lookups.
+
+    Attributes:
+        table_names (Dict[str, str]): Mapping from lowercase table names to actual table names.
+        primary_keys (Dict[str, List[str]]): The primary key columns of each table.
+        column_links (Dict[str, Dict[str, Set[str]]]): For each column, the tables whose presence makes it a connection.
+        adjacency (Dict[str, Dict[str, List[Tuple[str, str]]]]): For each table, the neighbouring tables and the joined column pairs.
+    """
+
+    def __init__(self, database_schema: DatabaseSchema):
+        self.table_names: Dict[str, str] = {}
+        self.primary_keys: Dict[str, List[str]] = {}
+        self.column_links: Dict[str, Dict[str, Set[str]]] = {}
+        self.adjacency: Dict[str, Dict[str, List[Tuple[str, str]]]] = {}
+        self._connection_cache: Dict[FrozenSet[str], Dict[str, List[str]]] = {}
+        self._join_path_cache: Dict[FrozenSet[str], Tuple[List[str], List[JoinEdge]]] = {}
+        self._bfs_cache: Dict[str, Dict[str, Optional[str]]] = {}
+        self._lock = Lock()
+        self._build(database_schema)
+
+    def _build(self, database_schema: DatabaseSchema) -> None:
+        """
+        Builds the graph from the schema metadata.
+
+        Args:
+            database_schema (DatabaseSchema): The full database schema with keys set.
+        """
+        primary_key_tables: Dict[str, Set[str]] = {}
+        for table_name, table_schema in database_schema.tables.items():
+            self.table_names.setdefault(table_name.lower(), table_name)
+            self.adjacency[table_name] = {}
+            self.column_links[table_name] = {}
+            self.primary_keys[table_name] = [name for name, info in table_schema.columns.items() if info.primary_key]
+            for column_name in self.primary_keys[table_name]:
+                primary_key_tables.setdefault(column_name.lower(), set()).add(table_name)
+
+        for table_name, table_schema in database_schema.tables.items():
+            for column_name, column_info in table_schema.columns.items():
+                links = set()
+                for target_table, target_column in column_info.foreign_keys:
+                    target_table = self.get_actual_table_name(target_table)
+                    if target_table is None:
+                        continue
+                    links.add(target_table)
+                    self._add_edge(table_name, column_name, target_table, target_column)
+                for source_table, _ in column_info.referenced_by:
+                    source_table = self.get_actual_table_name(source_table)
+                    if source_table is not None:
+                        links.add(source_table)
+                # A column sharing its name with the primary key of another table is an implicit join column.
+                links.update(primary_key_tables.get(column_name.lower(), set()) - {table_name})
+                self.column_links[table_name][column_name] = links
+
+    def _add_edge(self, table_a: str, column_a: str, table_b: str, column_b: str) -> None:
+        if table_a == table_b:
+            return
+        self.adjacency[table_a].setdefault(table_b, []).append((column_a, column_b))
+        self.adjacency[table_b].setdefault(table_a, []).append((column_b, column_a))
+
+    def get_actual_table_name(self, table_name: str) -> Optional[str]:
+        """
+        Retrieves the actual table name matching the provided name, case-insensitive.
+
+        Args:
+            table_name (str): The name of the table.
+
+        Returns:
+            Optional[str]: The actual table name if found, otherwise None.
+        """
+        return self.table_names.get(table_name.lower())
+
+    def _resolve_tables(self, table_names: Iterable[str]) -> FrozenSet[str]:
+        resolved = (self.get_actual_table_name(table_name) for table_name in table_names)
+        return frozenset(table_name for table_name in resolved if table_name is not None)
+
+    def get_connection_columns(self, table_names: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Retrieves the columns needed to join the given tables together: primary keys, foreign keys
+        pointing to or from another selected table, and columns named after another selected table's primary key.
+
+        Args:
+            table_names (Iterable[str]): The selected tables.
+
+        Returns:
+            Dict[str, List[str]]: A dictionary mapping actual table names to their connection columns.
+        """
+        selected_tables = self._resolve_tables(table_names)
+        with self._lock:
+            connections = self._connection_cache.get(selected_tables)
+        if connections is None:
+            connections = {
+                table_name: [
+                    column_name for column_name, links in self.column_links[table_name].items()
+                    if column_name in self.primary_keys[table_name] or not links.isdisjoint(selected_tables)
+                ]
+                for table_name in selected_tables
+            }
+            with self._lock:
+                self._connection_cache[selected_tables] = connections
+        return {table_name: list(columns) for table_name, columns in connections.items()}
+
+    def _get_bfs_parents(self, source: str) -> Dict[str, Optional[str]]:
+        """
+        Runs (and memoizes) a breadth-first search over the join graph from a table.
+
+        Args:
+            source (str): The actual name of the source table.
+
+        Returns:
+            Dict[str, Optional[str]]: The BFS parent of every reachable table.
+        """
+        with self._lock:
+            parents = self._bfs_cache.get(source)
+        if parents is not None:
+            return parents
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            table_name = queue.popleft()
+            for neighbour in sorted(self.adjacency[table_name]):
+                if neighbour not in parents:
+                    parents[neighbour] = table_name
+                    queue.append(neighbour)
+        with self._lock:
+            self._bfs_cache[source] = parents
+        return parents
+
+    def get_shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+        """
+        Retrieves the shortest join path between two tables.
+
+        Args:
+            source (str): The first table.
+            target (str): The second table.
+
+        Returns:
+            Optional[List[str]]: The tables on the path, from source to target, or None if they are not connected.
+        """
+        source, target = self.get_actual_table_name(source), self.get_actual_table_name(target)
+        if source is None or target is None:
+            return None
+        parents = self._get_bfs_parents(source)
+        if target not in parents:
+            return None
+        path = [target]
+        while parents[path[-1]] is not None:
+            path.append(parents[path[-1]])
+        return path[::-1]
+
+    def get_join_path(self, table_names: Iterable[str]) -> Tuple[List[str], List[JoinEdge]]:
+        """
+        Retrieves a minimal subgraph connecting the given tables, using the greedy shortest-path
+        Steiner tree heuristic: terminals are attached one by one through their closest tree table.
+        Terminals that are not reachable from the others are returned on their own.
+
+        Args:
+            table_names (Iterable[str]): The tables to connect.
+
+        Returns:
+            Tuple[List[str], List[JoinEdge]]: The tables of the subgraph (including bridge tables), and the join edges
+                as (table, column, other table, other column) tuples.
+        """
+        terminals = self._resolve_tables(table_names)
+        with self._lock:
+            cached = self._join_path_cache.get(terminals)
+        if cached is not None:
+            return list(cached[0]), list(cached[1])
+
+        tree_tables: List[str] = []
+        tree_edges: List[JoinEdge] = []
+        remaining = sorted(terminals)
+        while remaining:
+            if not tree_tables:
+                tree_tables.append(remaining.pop(0))
+                continue
+            best_path = None
+            for terminal in remaining:
+                parents = self._get_bfs_parents(terminal)
+                for tree_table in tree_tables:
+                    if tree_table not in parents:
+                        continue
+                    path = self.get_shortest_path(terminal, tree_table)
+                    if best_path is None or len(path) < len(best_path):
+                        best_path = path
+            if best_path is None:
+                # The remaining terminals live in other components of the graph.
+                tree_tables.extend(remaining)
+                break
+            for table_a, table_b in zip(best_path, best_path[1:]):
+                column_a, column_b = self.adjacency[table_a][table_b][0]
+                tree_edges.append((table_a, column_a, table_b, column_b))
+            for table_name in best_path:
+                if table_name not in tree_tables:
+                    tree_tables.append(table_name)
+            remaining = [table_name for table_name in remaining if table_name not in tree_tables]
+
+        with self._lock:
+            self._join_path_cache[terminals] = (tree_tables, tree_edges)
+        return list(tree_tables), list(tree_edges)
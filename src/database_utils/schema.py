@@ -1,8 +1,110 @@
 import logging
+import sys
 from dataclasses import dataclass, field
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Iterable, Optional, Tuple
 
-@dataclass
+# Slotted dataclasses are only available from Python 3.10 onwards.
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+class NameIndexedDict(dict):
+    """
+    A dictionary keyed by table or column names that keeps a lowercase index of its keys,
+    so case-insensitive lookups do not have to scan every key.
+    When several keys share the same lowercase form, the first inserted one is returned,
+    matching the behaviour of a linear scan over the keys.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._lower_index: Dict[str, str] = {}
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        super().__setitem__(key, value)
+        self._lower_index.setdefault(key.lower(), key)
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self._unindex(key)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def _unindex(self, key: str) -> None:
+        key_lower = key.lower()
+        if self._lower_index.get(key_lower) != key:
+            return
+        del self._lower_index[key_lower]
+        replacement = next((name for name in self if name.lower() == key_lower), None)
+        if replacement is not None:
+            self._lower_index[key_lower] = replacement
+
+    def get_actual_name(self, name: str) -> Optional[str]:
+        """
+        Retrieves the stored key matching the provided name, case-insensitive.
+        
+        Args:
+            name (str): The name to look up.
+        
+        Returns:
+            Optional[str]: The stored key if found, otherwise None.
+        """
+        return self._lower_index.get(name.lower())
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *args) -> Any:
+        if key not in self:
+            return super().pop(key, *args)
+        value = super().pop(key)
+        self._unindex(key)
+        return value
+
+    def popitem(self) -> Tuple[str, Any]:
+        key, value = super().popitem()
+        self._unindex(key)
+        return key, value
+
+    def clear(self) -> None:
+        super().clear()
+        self._lower_index.clear()
+
+    def copy(self) -> "NameIndexedDict":
+        return self.__class__(self)
+
+    @classmethod
+    def fromkeys(cls, keys: Iterable[str], value: Any = None) -> "NameIndexedDict":
+        new_dict = cls()
+        for key in keys:
+            new_dict[key] = value
+        return new_dict
+
+    def __ior__(self, other: Any) -> "NameIndexedDict":
+        self.update(other)
+        return self
+
+    def __or__(self, other: Any) -> "NameIndexedDict":
+        if not isinstance(other, dict):
+            return NotImplemented
+        new_dict = self.copy()
+        new_dict.update(other)
+        return new_dict
+
+    def __ror__(self, other: Any) -> "NameIndexedDict":
+        if not isinstance(other, dict):
+            return NotImplemented
+        new_dict = self.__class__(other)
+        new_dict.update(self)
+        return new_dict
+
+@dataclass(**_SLOTS)
 class ColumnInfo:
     """
     Represents metadata for a single column in a database table.
@@ -57,7 +159,24 @@ class TableSchema:
     Attributes:
         columns (Dict[str, ColumnInfo]): A dictionary mapping column names to their metadata.
     """
-    columns: Dict[str, ColumnInfo] = field(default_factory=dict)
+    columns: Dict[str, ColumnInfo] = field(default_factory=NameIndexedDict)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "columns" and not isinstance(value, NameIndexedDict):
+            value = NameIndexedDict(value)
+        super().__setattr__(name, value)
+
+    def get_actual_column_name(self, column_name: str) -> Optional[str]:
+        """
+        Retrieves the actual column name matching the provided name, case-insensitive.
+        
+        Args:
+            column_name (str): The name of the column to search for.
+        
+        Returns:
+            Optional[str]: The actual column name if found, otherwise None.
+        """
+        return self.columns.get_actual_name(column_name)
 
 def get_primary_keys(table_schema: TableSchema) -> List[str]:
     """
@@ -79,7 +198,12 @@ class DatabaseSchema:
     Attributes:
         tables (Dict[str, TableSchema]): A dictionary mapping table names to their schemas.
     """
-    tables: Dict[str, TableSchema] = field(default_factory=dict)
+    tables: Dict[str, TableSchema] = field(default_factory=NameIndexedDict)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == "tables" and not isinstance(value, NameIndexedDict):
+            value = NameIndexedDict(value)
+        super().__setattr__(name, value)
 
     @classmethod
     def from_table_names(cls, table_names: List[str]) -> "DatabaseSchema":
@@ -158,8 +282,7 @@ class DatabaseSchema:
         Returns:
             Optional[str]: The actual table name if found, otherwise None.
         """
-        table_name_lower = table_name.lower()
-        return next((name for name in self.tables if name.lower() == table_name_lower), None)
+        return self.tables.get_actual_name(table_name)
 
     def get_table_info(self, table_name: str) -> Optional[TableSchema]:
         """
@@ -172,7 +295,9 @@ class DatabaseSchema:
             Optional[TableSchema]: The TableSchema if found, otherwise None.
         """
         actual_name = self.get_actual_table_name(table_name)
-        return self.tables.get(actual_name)
+        if actual_name is None:
+            return None
+        return self.tables[actual_name]
 
     def get_actual_column_name(self, table_name: str, column_name: str) -> Optional[str]:
         """
@@ -187,8 +312,7 @@ class DatabaseSchema:
         """
         table_info = self.get_table_info(table_name)
         if table_info:
-            column_name_lower = column_name.lower()
-            return next((name for name in table_info.columns if name.lower() == column_name_lower), None)
+            return table_info.get_actual_column_name(column_name)
         return None
 
     def get_column_info(self, table_name: str, column_name: str) -> Optional[ColumnInfo]:
@@ -202,10 +326,13 @@ class DatabaseSchema:
         Returns:
             Optional[ColumnInfo]: The ColumnInfo if found, otherwise None.
         """
-        actual_name = self.get_actual_column_name(table_name, column_name)
-        if actual_name:
-            return self.tables[table_name].columns[actual_name]
-        return None
+        table_info = self.get_table_info(table_name)
+        if table_info is None:
+            return None
+        actual_name = table_info.get_actual_column_name(column_name)
+        if actual_name is None:
+            return None
+        return table_info.columns[actual_name]
 
     def set_columns_info(self, schema_with_info: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
         """
@@ -220,7 +347,7 @@ class DatabaseSchema:
                 # logging.warning(f"Table {table_name} not found in the schema")
                 continue
             for column_name, info in columns_info.items():
-                actual_name = self.get_actual_column_name(table_name, column_name)
+                actual_name = table_info.get_actual_column_name(column_name)
                 if actual_name is None:
                     # logging.warning(f"Column {column_name} not found in table {table_name}")
                     continue
@@ -244,9 +371,10 @@ class DatabaseSchema:
             if actual_table_name is None:
                 # logging.warning(f"Table {table_name} not found in the schema")
                 continue
+            full_table_info = self.tables[actual_table_name]
             new_table_info = TableSchema()
             for column_name, column_info in table_info.columns.items():
-                actual_column_name = self.get_actual_column_name(table_name, column_name)
+                actual_column_name = full_table_info.get_actual_column_name(column_name)
                 if actual_column_name is None:
                     # logging.warning(f"Column {column_name} not found in table {table_name}")
                     continue
@@ -266,14 +394,31 @@ class DatabaseSchema:
             actual_table_name = schema.get_actual_table_name(table_name)
             if actual_table_name is None:
                 continue
+            source_table_info = schema.tables[actual_table_name]
             for column_name, column_info in table_info.columns.items():
-                actual_column_name = schema.get_actual_column_name(table_name, column_name)
+                actual_column_name = source_table_info.get_actual_column_name(column_name)
                 if actual_column_name is None:
                     continue
-                new_column_info = schema.tables[actual_table_name].columns[actual_column_name]
+                new_column_info = source_table_info.columns[actual_column_name]
                 for field_name in field_names:
                     set_field(column_info, field_name, getattr(new_column_info, field_name))
 
+    def to_schema_dict_with_info(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Converts the DatabaseSchema to a dictionary holding every field of every column.
+        The result can be turned back into a schema with from_schema_dict_with_descriptions.
+        
+        Returns:
+            Dict[str, Dict[str, Dict[str, Any]]]: The dictionary representation of the schema with column information.
+        """
+        return {
+            table_name: {
+                column_name: {field_name: getattr(column_info, field_name) for field_name in column_info.__dataclass_fields__}
+                for column_name, column_info in table_info.columns.items()
+            }
+            for table_name, table_info in self.tables.items()
+        }
+
     def to_dict(self) -> Dict[str, List[str]]:
         """
         Converts the DatabaseSchema to a dictionary representation.
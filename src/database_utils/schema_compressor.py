@@ -0,0 +1,134 @@
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database_utils.schema_generator import ColumnDetail, DatabaseSchemaGenerator
+
+class SchemaCompressor:
+    """
+    Renders a schema string that fits a token budget.
+    Column comments (value descriptions, then examples, then descriptions) of the least relevant columns are trimmed first,
+    and only then are the least relevant columns dropped. Keys, join columns and protected columns are never dropped.
+
+    Attributes:
+        schema_generator (DatabaseSchemaGenerator): The generator rendering the schema.
+        column_relevance (Dict[Tuple[str, str], float]): The relevance of each (table, column), higher is more relevant.
+        protected_columns (Set[Tuple[str, str]]): The (table, column) pairs that must stay in the schema.
+        token_counter (Callable[[str], int]): The function counting the tokens of a text.
+        include_value_description (bool): Flag to include value descriptions.
+    """
+
+    TRIM_LEVELS = [ColumnDetail.NO_VALUE_DESCRIPTION, ColumnDetail.NO_EXAMPLES, ColumnDetail.BARE]
+
+    def __init__(self, schema_generator: DatabaseSchemaGenerator, column_relevance: Dict[str, Dict[str, float]],
+                 protected_columns: Dict[str, List[str]], token_counter: Callable[[str], int],
+                 include_value_description: bool = True):
+        self.schema_generator = schema_generator
+        self.token_counter = token_counter
+        self.include_value_description = include_value_description
+        self.column_relevance = {}
+        self.protected_columns = set()
+
+        schema_structure = schema_generator.schema_structure
+        join_graph = DatabaseSchemaGenerator.get_join_graph(schema_generator.db_id)
+        connections = join_graph.get_connection_columns(schema_structure.tables.keys())
+        for table_name, table_schema in schema_structure.tables.items():
+            for column_name, column_info in table_schema.columns.items():
+                key = (table_name, column_name)
+                self.column_relevance[key] = 0.0
+                if column_info.primary_key or column_info.foreign_keys or column_info.referenced_by \
+                        or column_name in connections.get(table_name, []):
+                    self.protected_columns.add(key)
+
+        for table_name, columns in column_relevance.items():
+            for column_name, relevance in columns.items():
+                key = self._resolve_column(table_name, column_name)
+                if key is not None:
+                    self.column_relevance[key] = max(self.column_relevance[key], relevance)
+        for table_name, column_names in protected_columns.items():
+            for column_name in column_names:
+                key = self._resolve_column(table_name, column_name)
+                if key is not None:
+                    self.protected_columns.add(key)
+
+    def _resolve_column(self, table_name: str, column_name: str) -> Optional[Tuple[str, str]]:
+        schema_structure = self.schema_generator.schema_structure
+        actual_table_name = schema_structure.get_actual_table_name(table_name)
+        if actual_table_name is None:
+            return None
+        actual_column_name = schema_structure.get_actual_column_name(actual_table_name, column_name)
+        if actual_column_name is None:
+            return None
+        return actual_table_name, actual_column_name
+
+    def _get_column_cost(self, key: Tuple[str, str], detail_level: ColumnDetail) -> int:
+        """
+        Estimates the tokens a column takes in the schema string at a level of detail.
+
+        Args:
+            key (Tuple[str, str]): The (table, column) pair.
+            detail_level (ColumnDetail): The level of detail.
+
+        Returns:
+            int: The estimated number of tokens.
+        """
+        if detail_level == ColumnDetail.DROPPED:
+            return 0
+        table_name, column_name = key
+        column_info = self.schema_generator.schema_structure.tables[table_name].columns[column_name]
+        definition = f"\t`{column_name}` {column_info.type},"
+        comment = self.schema_generator._get_example_column_name_description(table_name, column_name, self.include_value_description, detail_level)
+        return self.token_counter(definition + comment)
+
+    def compress(self, token_budget: Optional[int], shuffle_seed: Optional[int] = None, shuffle: bool = True) -> Tuple[str, Dict[str, int]]:
+        """
+        Renders the schema string within the token budget.
+
+        Args:
+            token_budget (Optional[int]): The maximum number of tokens of the schema string. None disables the compression.
+            shuffle_seed (Optional[int]): Seed making the shuffles of the schema string reproducible.
+            shuffle (bool): Whether to shuffle the tables and columns of the schema string.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The schema string and its token report.
+        """
+        schema_string = self.schema_generator.generate_schema_string(include_value_description=self.include_value_description, shuffle_cols=shuffle,
+                                                                     shuffle_tables=shuffle, shuffle_seed=shuffle_seed)
+        original_tokens = self.token_counter(schema_string)
+        report = {
+            "token_budget": token_budget,
+            "original_tokens": original_tokens,
+            "schema_tokens": original_tokens,
+            "trimmed_columns": 0,
+            "dropped_columns": 0,
+        }
+        if token_budget is None or original_tokens <= token_budget:
+            report["within_budget"] = True
+            return schema_string, report
+
+        ordered_columns = sorted(self.column_relevance, key=lambda key: (self.column_relevance[key], key))
+        steps = [(key, detail_level) for key in ordered_columns for detail_level in self.TRIM_LEVELS]
+        steps += [(key, ColumnDetail.DROPPED) for key in ordered_columns if key not in self.protected_columns]
+        detail_levels = {}
+        schema_tokens = original_tokens
+        step_index = 0
+        # Savings are estimated per column, so the estimate is resynchronized with the rendered string until it fits.
+        while schema_tokens > token_budget and step_index < len(steps):
+            estimated_tokens = schema_tokens
+            while estimated_tokens > token_budget and step_index < len(steps):
+                key, detail_level = steps[step_index]
+                current_level = detail_levels.get(key, ColumnDetail.FULL)
+                estimated_tokens -= self._get_column_cost(key, current_level) - self._get_column_cost(key, detail_level)
+                detail_levels[key] = detail_level
+                step_index += 1
+            schema_string = self.schema_generator.generate_schema_string(include_value_description=self.include_value_description,
+                                                                         shuffle_cols=shuffle, shuffle_tables=shuffle, shuffle_seed=shuffle_seed,
+                                                                         column_detail_levels=detail_levels)
+            schema_tokens = self.token_counter(schema_string)
+
+        report["schema_tokens"] = schema_tokens
+        report["trimmed_columns"] = sum(1 for level in detail_levels.values() if level != ColumnDetail.DROPPED)
+        report["dropped_columns"] = sum(1 for level in detail_levels.values() if level == ColumnDetail.DROPPED)
+        report["within_budget"] = report["schema_tokens"] <= token_budget
+        if not report["within_budget"]:
+            logging.warning(f"Schema string of {report['schema_tokens']} tokens does not fit the budget of {token_budget} tokens")
+        return schema_string, report
@@ -1,11 +1,24 @@
 import re
 import logging
 import random
-from typing import Dict, List, Optional
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple
 
 from database_utils.execution import execute_sql
 from database_utils.db_info import get_db_schema
-from database_utils.schema import DatabaseSchema, get_primary_keys
+from database_utils.schema import ColumnInfo, DatabaseSchema, get_primary_keys
+from database_utils.join_graph import JoinGraph
+from database_utils.schema_snapshot import load_schema_snapshot, save_schema_snapshot
+
+class ColumnDetail(IntEnum):
+    """
+    Level of detail used when rendering a column in the schema string, from the most to the least verbose.
+    """
+    FULL = 4
+    NO_VALUE_DESCRIPTION = 3
+    NO_EXAMPLES = 2
+    BARE = 1
+    DROPPED = 0
 
 class DatabaseSchemaGenerator:
     """
@@ -20,6 +33,12 @@ class DatabaseSchemaGenerator:
         schema_with_descriptions (DatabaseSchema): The schema including descriptions.
     """
     CACHED_DB_SCHEMA = {}
+    CACHED_DDL_COMMANDS = {}
+    CACHED_COLUMN_EXAMPLES = {}
+    CACHED_JOIN_GRAPHS = {}
+    CACHED_COLUMN_PROFILES = {}
+    EXAMPLE_SCAN_ROW_LIMIT = 1000
+    EXAMPLES_PER_COLUMN = 3
 
     def __init__(self, tentative_schema: Optional[DatabaseSchema] = None, schema_with_examples: Optional[DatabaseSchema] = None,
                  schema_with_descriptions: Optional[DatabaseSchema] = None, db_id: Optional[str] = None, db_path: Optional[str] = None,
@@ -32,6 +51,7 @@ class DatabaseSchemaGenerator:
         self.schema_structure = tentative_schema or DatabaseSchema()
         self.schema_with_examples = schema_with_examples or DatabaseSchema()
         self.schema_with_descriptions = schema_with_descriptions or DatabaseSchema()
+        self._connections = None
         self._initialize_schema_structure()
 
     @staticmethod
@@ -83,12 +103,19 @@ class DatabaseSchemaGenerator:
     @classmethod
     def _load_schema_into_cache(cls, db_id: str, db_path: str) -> None:
         """
-        Loads database schema into cache.
+        Loads database schema into cache, from the schema snapshot if it is up to date, 
+        otherwise by profiling the database and saving a new snapshot.
         
         Args:
             db_id (str): The database identifier.
             db_path (str): The path to the database file.
         """
+        snapshot = load_schema_snapshot(db_path)
+        if snapshot is not None:
+            cls.CACHED_DB_SCHEMA[db_id] = snapshot["schema"]
+            cls.CACHED_COLUMN_EXAMPLES[db_id] = snapshot["column_examples"]
+            cls.CACHED_COLUMN_PROFILES[db_id] = snapshot.get("column_profiles", {})
+            return
         db_schema = DatabaseSchema.from_schema_dict(get_db_schema(db_path))
         # schema_with_type = {
         #     table_name: {col[1]: {"type": col[2]} for col in execute_sql(db_path, f"PRAGMA table_info(`{table_name}`)", fetch="all")}
@@ -123,6 +150,12 @@ class DatabaseSchemaGenerator:
         cls.CACHED_DB_SCHEMA[db_id] = db_schema
         cls._set_primary_keys(db_path, cls.CACHED_DB_SCHEMA[db_id])
         cls._set_foreign_keys(db_path, cls.CACHED_DB_SCHEMA[db_id])
+        column_examples = {}
+        for table_name, table_schema in db_schema.tables.items():
+            table_examples = cls._sample_table_examples(db_path, table_name, list(table_schema.columns.keys()))
+            column_examples.update({(table_name, column_name): examples for column_name, examples in table_examples.items()})
+        cls.CACHED_COLUMN_EXAMPLES[db_id] = column_examples
+        save_schema_snapshot(db_path, cls.CACHED_DB_SCHEMA[db_id], column_examples=column_examples)
    
     def _initialize_schema_structure(self) -> None:
         """
@@ -143,9 +176,11 @@ class DatabaseSchemaGenerator:
     def _load_column_examples(self) -> None:
         """
         Loads examples for columns in the schema.
+        Database examples for all the columns of a table that need them are fetched together.
         """
         self.schema_structure.add_info_from_schema(schema=self.schema_with_examples, field_names=["examples"])
         
+        columns_needing_examples = {}
         for table_name, table_schema in self.schema_structure.tables.items():
             for column_name, column_info in table_schema.columns.items():
                 if not column_info.examples:
@@ -154,17 +189,76 @@ class DatabaseSchemaGenerator:
                         column_info.examples = [str(x[0]) for x in examples][:5]
                 
                 if (self.add_examples and not column_info.examples) or ((column_info.type.lower()) == "date" or ("date" in column_name.lower())):
-                    example = execute_sql(db_path=self.db_path, 
-                                          sql=f"SELECT DISTINCT `{column_name}` FROM `{table_name}` WHERE `{column_name}` IS NOT NULL LIMIT 3", 
-                                          fetch="all") 
-                    if example and len(str(example[0])) < 50:
-                        column_info.examples = example
+                    columns_needing_examples.setdefault(table_name, []).append(column_name)
                 
                 if not column_info.value_statics:
                     value_statics = DatabaseSchemaGenerator.CACHED_DB_SCHEMA[self.db_id].get_column_info(table_name, column_name).value_statics
                     if value_statics:
                         column_info.value_statics = value_statics
-                    
+        
+        for table_name, column_names in columns_needing_examples.items():
+            table_examples = self._get_cached_table_examples(table_name, column_names)
+            for column_name in column_names:
+                example = table_examples[column_name]
+                if example and len(str(example[0])) < 50:
+                    self.schema_structure.tables[table_name].columns[column_name].examples = example
+
+    def _get_cached_table_examples(self, table_name: str, column_names: List[str]) -> Dict[str, List[tuple]]:
+        """
+        Retrieves a few distinct non-null values for columns of a table, sampling the database only for columns not cached yet.
+        
+        Args:
+            table_name (str): The name of the table.
+            column_names (List[str]): The names of the columns.
+            
+        Returns:
+            Dict[str, List[tuple]]: The example rows of each column.
+        """
+        db_examples = DatabaseSchemaGenerator.CACHED_COLUMN_EXAMPLES.setdefault(self.db_id, {})
+        missing_columns = [column_name for column_name in column_names if (table_name, column_name) not in db_examples]
+        if missing_columns:
+            sampled_examples = DatabaseSchemaGenerator._sample_table_examples(self.db_path, table_name, missing_columns)
+            for column_name, examples in sampled_examples.items():
+                db_examples[(table_name, column_name)] = examples
+        return {column_name: db_examples[(table_name, column_name)] for column_name in column_names}
+
+    @classmethod
+    def _sample_table_examples(cls, db_path: str, table_name: str, column_names: List[str]) -> Dict[str, List[tuple]]:
+        """
+        Collects up to EXAMPLES_PER_COLUMN distinct non-null values for each column with a single bounded scan of the table.
+        When the scan stopped at its row limit, columns with fewer than EXAMPLES_PER_COLUMN distinct values in the scanned
+        rows fall back to a per-column query, so they get as many examples as a per-column query would give.
+        
+        Args:
+            db_path (str): The path to the database file.
+            table_name (str): The name of the table.
+            column_names (List[str]): The names of the columns.
+            
+        Returns:
+            Dict[str, List[tuple]]: The example rows of each column, in the format returned by execute_sql.
+        """
+        examples = {column_name: [] for column_name in column_names}
+        seen_values = {column_name: set() for column_name in column_names}
+        columns_sql = ", ".join(f"`{column_name}`" for column_name in column_names)
+        rows = execute_sql(db_path=db_path, 
+                           sql=f"SELECT {columns_sql} FROM `{table_name}` LIMIT {cls.EXAMPLE_SCAN_ROW_LIMIT}", 
+                           fetch="all")
+        for row in rows:
+            for column_name, value in zip(column_names, row):
+                if value is None or value in seen_values[column_name] or len(examples[column_name]) >= cls.EXAMPLES_PER_COLUMN:
+                    continue
+                seen_values[column_name].add(value)
+                examples[column_name].append((value,))
+        
+        if len(rows) < cls.EXAMPLE_SCAN_ROW_LIMIT:
+            # The whole table was scanned, so no column has more distinct values.
+            return examples
+        for column_name in column_names:
+            if len(examples[column_name]) < cls.EXAMPLES_PER_COLUMN:
+                examples[column_name] = execute_sql(db_path=db_path, 
+                                                    sql=f"SELECT DISTINCT `{column_name}` FROM `{table_name}` WHERE `{column_name}` IS NOT NULL LIMIT {cls.EXAMPLES_PER_COLUMN}", 
+                                                    fetch="all")
+        return examples
 
     def _load_column_descriptions(self) -> None:
         """
@@ -179,13 +273,13 @@ class DatabaseSchemaGenerator:
         Returns:
             Dict[str, str]: A dictionary mapping table names to their DDL commands.
         """
-        ddl_commands = {}
-        for table_name in self.schema_structure.tables.keys():
-            create_prompt = execute_sql(db_path=self.db_path, 
-                                        sql=f"SELECT sql FROM sqlite_master WHERE type='table' AND name='{table_name}';", 
-                                        fetch="one")
-            ddl_commands[table_name] = create_prompt[0] if create_prompt else ""
-        return ddl_commands
+        if self.db_id not in DatabaseSchemaGenerator.CACHED_DDL_COMMANDS:
+            create_prompts = execute_sql(db_path=self.db_path, 
+                                         sql="SELECT name, sql FROM sqlite_master WHERE type='table';", 
+                                         fetch="all")
+            DatabaseSchemaGenerator.CACHED_DDL_COMMANDS[self.db_id] = {name: sql or "" for name, sql in create_prompts}
+        cached_ddl_commands = DatabaseSchemaGenerator.CACHED_DDL_COMMANDS[self.db_id]
+        return {table_name: cached_ddl_commands.get(table_name, "") for table_name in self.schema_structure.tables.keys()}
     
     @staticmethod
     def _separate_column_definitions(column_definitions: str) -> List[str]:
@@ -212,6 +306,23 @@ class DatabaseSchemaGenerator:
         definitions.append(column_definitions[start_position:].strip())
         return definitions
     
+    @classmethod
+    def get_join_graph(cls, db_id: str) -> JoinGraph:
+        """
+        Retrieves the join graph of a database, building it from the cached schema on first use.
+        
+        Args:
+            db_id (str): The database identifier.
+            
+        Returns:
+            JoinGraph: The join graph of the database.
+        """
+        join_graph = cls.CACHED_JOIN_GRAPHS.get(db_id)
+        if join_graph is None:
+            join_graph = JoinGraph(cls.CACHED_DB_SCHEMA[db_id])
+            cls.CACHED_JOIN_GRAPHS[db_id] = join_graph
+        return join_graph
+
     def _is_connection(self, table_name: str, column_name: str) -> bool:
         """
         Checks if a column is a connection (primary key or foreign key).
@@ -223,24 +334,10 @@ class DatabaseSchemaGenerator:
         Returns:
             bool: True if the column is a connection, False otherwise.
         """
-        column_info = self.CACHED_DB_SCHEMA[self.db_id].get_column_info(table_name, column_name)
-        if column_info is None:
-            return False
-        if column_info.primary_key:
-            return True
-        for target_table, _ in column_info.foreign_keys:
-            if self.schema_structure.get_table_info(target_table):
-                return True
-        for target_table, _ in column_info.referenced_by:
-            if self.schema_structure.get_table_info(target_table):
-                return True
-        for target_table_name, table_schema in self.schema_structure.tables.items():
-            if table_name.lower() == target_table_name.lower():
-                continue
-            for target_column_name, target_column_info in table_schema.columns.items():
-                if target_column_name.lower() == column_name.lower() and target_column_info.primary_key:
-                    return True
-        return False
+        connections = self._get_connections()
+        join_graph = self.get_join_graph(self.db_id)
+        actual_table_name = join_graph.get_actual_table_name(table_name)
+        return actual_table_name is not None and column_name in connections.get(actual_table_name, [])
     
     def _get_connections(self) -> Dict[str, List[str]]:
         """
@@ -249,30 +346,40 @@ class DatabaseSchemaGenerator:
         Returns:
             Dict[str, List[str]]: A dictionary mapping table names to lists of connected columns.
         """
-        connections = {}
-        for table_name, table_schema in self.schema_structure.tables.items():
-            connections[table_name] = []
-            for column_name, column_info in self.CACHED_DB_SCHEMA[self.db_id].tables[table_name].columns.items():
-                if self._is_connection(table_name, column_name):
-                    connections[table_name].append(column_name)
-        return connections
+        if self._connections is None:
+            join_graph = self.get_join_graph(self.db_id)
+            self._connections = join_graph.get_connection_columns(self.schema_structure.tables.keys())
+        return self._connections
     
-    def get_schema_with_connections(self) -> Dict[str, List[str]]:
+    def get_schema_with_connections(self, add_join_path_tables: bool = False) -> Dict[str, List[str]]:
         """
         Gets schema with connections included.
         
+        Args:
+            add_join_path_tables (bool): Flag to also add the bridge tables (and their join columns) needed to connect the selected tables.
+        
         Returns:
             Dict[str, List[str]]: The schema with connections included.
         """
         schema_structure_dict = self.schema_structure.to_dict()
-        connections = self._get_connections()
+        join_graph = self.get_join_graph(self.db_id)
+        table_names = list(schema_structure_dict.keys())
+        if add_join_path_tables:
+            table_names, _ = join_graph.get_join_path(table_names)
+            connections = join_graph.get_connection_columns(table_names)
+        else:
+            connections = self._get_connections()
         for table_name, connected_columns in connections.items():
+            selected_columns = schema_structure_dict.setdefault(table_name, [])
+            selected_columns_lower = {col.lower() for col in selected_columns}
             for column_name in connected_columns:
-                if column_name.lower() not in [col.lower() for col in schema_structure_dict[table_name]]:
-                    schema_structure_dict[table_name].append(column_name)
+                if column_name.lower() not in selected_columns_lower:
+                    selected_columns.append(column_name)
+                    selected_columns_lower.add(column_name.lower())
         return schema_structure_dict
     
-    def _get_example_column_name_description(self, table_name: str, column_name: str, include_value_description: bool = True) -> str:
+    def _get_example_column_name_description(self, table_name: str, column_name: str, include_value_description: bool = True,
+                                             detail_level: ColumnDetail = ColumnDetail.FULL) -> str:
         """
         Retrieves example values and descriptions for a column.
         
@@ -280,10 +387,13 @@ class DatabaseSchemaGenerator:
             table_name (str): The name of the table.
             column_name (str): The name of the column.
             include_value_description (bool): Flag to include value description.
+            detail_level (ColumnDetail): The level of detail to render the column with.
             
         Returns:
             str: The example values and descriptions for the column.
         """
+        if detail_level <= ColumnDetail.BARE:
+            return ""
         example_part = ""
         name_string = ""
         description_string = ""
@@ -292,16 +402,16 @@ class DatabaseSchemaGenerator:
         
         column_info = self.schema_structure.get_column_info(table_name, column_name)
         if column_info:
-            if column_info.examples:
+            if column_info.examples and detail_level > ColumnDetail.NO_EXAMPLES:
                 example_part = f" Example Values: {', '.join([f'`{str(x)}`' for x in column_info.examples])}"
-            if column_info.value_statics:
+            if column_info.value_statics and detail_level > ColumnDetail.NO_EXAMPLES:
                 value_statics_string = f" Value Statics: {column_info.value_statics}"
             if column_info.column_name:
                 if (column_info.column_name.lower() != column_name.lower()) and (column_info.column_name.strip() != ""):
                     name_string = f"| Column Name Meaning: {column_info.column_name}"
             if column_info.column_description:
                 description_string = f"| Column Description: {column_info.column_description}"
-            if column_info.value_description and include_value_description:
+            if column_info.value_description and include_value_description and detail_level > ColumnDetail.NO_VALUE_DESCRIPTION:
                 value_description_string = f"| Value Description: {column_info.value_description}"
         
         description_part = f"{name_string} {description_string} {value_description_string}"
@@ -310,20 +420,27 @@ class DatabaseSchemaGenerator:
             joint_string = ""
         return joint_string.replace("\n", " ") if joint_string else ""
 
-    def generate_schema_string(self, include_value_description: bool = True, shuffle_cols: bool = True, shuffle_tables: bool = True) -> str:
+    def generate_schema_string(self, include_value_description: bool = True, shuffle_cols: bool = True, shuffle_tables: bool = True,
+                               shuffle_seed: Optional[int] = None,
+                               column_detail_levels: Optional[Dict[Tuple[str, str], ColumnDetail]] = None) -> str:
         """
         Generates a schema string with descriptions and examples.
         
         Args:
             include_value_description (bool): Flag to include value descriptions.
+            shuffle_cols (bool): Flag to shuffle the column definitions of each table.
+            shuffle_tables (bool): Flag to shuffle the order of the tables.
+            shuffle_seed (Optional[int]): Seed making the shuffles reproducible. Defaults to a fresh shuffle on each call.
+            column_detail_levels (Optional[Dict[Tuple[str, str], ColumnDetail]]): Level of detail per (table, column). Defaults to full detail.
         
         Returns:
             str: The generated schema string.
         """
+        rng = random.Random(shuffle_seed) if shuffle_seed is not None else random
         ddl_commands = self._extract_create_ddl_commands()
         if shuffle_tables:
             ddl_tables = list(ddl_commands.keys())
-            random.shuffle(ddl_tables)
+            rng.shuffle(ddl_tables)
             ddl_commands = {table_name: ddl_commands[table_name] for table_name in ddl_tables}
             # ddl_commands = dict(random.sample(ddl_commands.items(), len(ddl_commands)))
         for table_name, ddl_command in ddl_commands.items():
@@ -337,7 +454,7 @@ class DatabaseSchemaGenerator:
             schema_lines = [f"CREATE TABLE {table_name}", "("]
             definitions = DatabaseSchemaGenerator._separate_column_definitions(column_definitions)
             if shuffle_cols:
-                definitions = random.sample(definitions, len(definitions))
+                definitions = rng.sample(definitions, len(definitions))
             for column_def in definitions:
                 column_def = column_def.strip()
                 if any(keyword in column_def.lower() for keyword in ["foreign key", "primary key"]):
@@ -360,8 +477,11 @@ class DatabaseSchemaGenerator:
                         column_name = column_def.split(' ')[0]
                         
                     if (column_name in targeted_columns) or self._is_connection(table_name, column_name):
+                        detail_level = column_detail_levels.get((table_name, column_name), ColumnDetail.FULL) if column_detail_levels else ColumnDetail.FULL
+                        if detail_level == ColumnDetail.DROPPED:
+                            continue
                         new_column_def = f"\t{column_def},"
-                        new_column_def += self._get_example_column_name_description(table_name, column_name, include_value_description)
+                        new_column_def += self._get_example_column_name_description(table_name, column_name, include_value_description, detail_level)
                         schema_lines.append(new_column_def)
                     elif column_def.lower().startswith("unique"):
                         new_column_def = f"\t{column_def},"
@@ -386,28 +506,86 @@ class DatabaseSchemaGenerator:
         for table_name, table_schema in self.schema_structure.tables.items():
             column_profiles[table_name] = {}
             for column_name, column_info in table_schema.columns.items():
-                if with_keys or not (column_info.primary_key or column_info.foreign_keys or column_info.referenced_by):
-                    column_profile = f"Table name: `{table_name}`\nOriginal column name: `{column_name}`\n"
-                    if (column_info.column_name.lower().strip() != column_name.lower().strip()) and (column_info.column_name.strip() != ""):
-                        column_profile += f"Expanded column name: `{column_info.column_name}`\n"
-                    if column_info.type:
-                        column_profile += f"Data type: {column_info.type}\n"
-                    if column_info.column_description:
-                        column_profile += f"Description: {column_info.column_description}\n"
-                    if column_info.value_description:
-                        column_profile += f"Value description: {column_info.value_description}\n"
-                    if column_info.examples:
-                        column_profile += f"Example of values in the column: {', '.join([f'`{str(x)}`' for x in column_info.examples])}\n"
-                    if column_info.primary_key:
-                        column_profile += "This column is a primary key.\n"
-                    if with_references:
-                        if column_info.foreign_keys:
-                            column_profile += "This column references the following columns:\n"
-                            for target_table, target_column in column_info.foreign_keys:
-                                column_profile += f"    Table: `{target_table}`, Column: `{target_column}`\n"
-                        if column_info.referenced_by:
-                            column_profile += "This column is referenced by the following columns:\n"
-                            for source_table, source_column in column_info.referenced_by:
-                                column_profile += f"    Table: `{source_table}`, Column: `{source_column}`\n"
-                    column_profiles[table_name][column_name] = column_profile
+                profile_parts = self.get_column_profile_parts(table_name, column_name, column_info)
+                if with_keys or not profile_parts["is_key"]:
+                    column_profiles[table_name][column_name] = self.join_column_profile(profile_parts, profile_parts["examples"], with_references)
         return column_profiles
+
+    @staticmethod
+    def get_column_profile_parts(table_name: str, column_name: str, column_info: ColumnInfo) -> Dict[str, Any]:
+        """
+        Splits the profile of a column into its static parts and its example values, 
+        so that profiles can be precomputed and only the examples replaced for a question.
+        
+        Args:
+            table_name (str): The name of the table.
+            column_name (str): The name of the column.
+            column_info (ColumnInfo): The information of the column.
+            
+        Returns:
+            Dict[str, Any]: The profile parts: "header", "examples", "key", "references" and "is_key".
+        """
+        header = f"Table name: `{table_name}`\nOriginal column name: `{column_name}`\n"
+        if (column_info.column_name.lower().strip() != column_name.lower().strip()) and (column_info.column_name.strip() != ""):
+            header += f"Expanded column name: `{column_info.column_name}`\n"
+        if column_info.type:
+            header += f"Data type: {column_info.type}\n"
+        if column_info.column_description:
+            header += f"Description: {column_info.column_description}\n"
+        if column_info.value_description:
+            header += f"Value description: {column_info.value_description}\n"
+        key = "This column is a primary key.\n" if column_info.primary_key else ""
+        references = ""
+        if column_info.foreign_keys:
+            references += "This column references the following columns:\n"
+            for target_table, target_column in column_info.foreign_keys:
+                references += f"    Table: `{target_table}`, Column: `{target_column}`\n"
+        if column_info.referenced_by:
+            references += "This column is referenced by the following columns:\n"
+            for source_table, source_column in column_info.referenced_by:
+                references += f"    Table: `{source_table}`, Column: `{source_column}`\n"
+        return {
+            "header": header,
+            "examples": list(column_info.examples),
+            "key": key,
+            "references": references,
+            "is_key": bool(column_info.primary_key or column_info.foreign_keys or column_info.referenced_by),
+        }
+
+    @staticmethod
+    def join_column_profile(profile_parts: Dict[str, Any], examples: List[Any], with_references: bool) -> str:
+        """
+        Builds a column profile from its parts.
+        
+        Args:
+            profile_parts (Dict[str, Any]): The profile parts returned by get_column_profile_parts.
+            examples (List[Any]): The example values to show.
+            with_references (bool): Flag to include referenced columns.
+            
+        Returns:
+            str: The column profile.
+        """
+        column_profile = profile_parts["header"]
+        if examples:
+            column_profile += f"Example of values in the column: {', '.join([f'`{str(x)}`' for x in examples])}\n"
+        column_profile += profile_parts["key"]
+        if with_references:
+            column_profile += profile_parts["references"]
+        return column_profile
+
+    def is_example_sampled(self, table_name: str, column_name: str) -> bool:
+        """
+        Checks if the examples of a column come from the database sample regardless of the retrieved values, which is the case for dates.
+        
+        Args:
+            table_name (str): The name of the table.
+            column_name (str): The name of the column.
+            
+        Returns:
+            bool: True if the examples shown for the column are always sampled from the database.
+        """
+        column_info = self.schema_structure.get_column_info(table_name, column_name)
+        if column_info is None or not ((column_info.type.lower()) == "date" or ("date" in column_name.lower())):
+            return False
+        example = DatabaseSchemaGenerator.CACHED_COLUMN_EXAMPLES.get(self.db_id, {}).get((table_name, column_name))
+        return bool(example) and len(str(example[0])) < 50
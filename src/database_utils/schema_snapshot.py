@@ -0,0 +1,180 @@
+import os
+import fcntl
+import pickle
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from database_utils.schema import DatabaseSchema
+
+SCHEMA_SNAPSHOT_VERSION = 2
+
+def get_schema_snapshot_path(db_path: str) -> Path:
+    """
+    Returns the path of the schema snapshot stored next to the database file.
+    
+    Args:
+        db_path (str): The path to the database file.
+        
+    Returns:
+        Path: The path to the schema snapshot file.
+    """
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}_schema_snapshot.pkl")
+
+def _get_db_file_signature(db_path: str) -> Dict[str, int]:
+    """
+    Returns the modification time and size of the database file, used to validate snapshots.
+    
+    Args:
+        db_path (str): The path to the database file.
+        
+    Returns:
+        Dict[str, int]: The modification time in nanoseconds and the size in bytes.
+    """
+    stat = os.stat(db_path)
+    return {"db_mtime_ns": stat.st_mtime_ns, "db_size": stat.st_size}
+
+def get_description_signature(db_directory_path: str) -> Dict[str, Any]:
+    """
+    Returns the modification time and size of every description CSV of a database, used to validate precomputed profiles.
+    
+    Args:
+        db_directory_path (str): The path to the database directory.
+        
+    Returns:
+        Dict[str, Any]: The (modification time in nanoseconds, size in bytes) of each description file.
+    """
+    description_path = Path(db_directory_path) / "database_description"
+    signature = {}
+    for csv_file in sorted(description_path.glob("*.csv")):
+        stat = csv_file.stat()
+        signature[csv_file.name] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+def _read_schema_snapshot(db_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Reads the raw schema snapshot of a database if it exists and matches the current database file.
+    
+    Args:
+        db_path (str): The path to the database file.
+        
+    Returns:
+        Optional[Dict[str, Any]]: The raw snapshot, or None if it is missing or stale.
+    """
+    snapshot_path = get_schema_snapshot_path(db_path)
+    if not snapshot_path.exists():
+        return None
+    with snapshot_path.open("rb") as file:
+        snapshot = pickle.load(file)
+    if snapshot.get("version") != SCHEMA_SNAPSHOT_VERSION:
+        logging.info(f"Schema snapshot version mismatch for {db_path}")
+        return None
+    signature = _get_db_file_signature(db_path)
+    if any(snapshot.get(key) != value for key, value in signature.items()):
+        logging.info(f"Schema snapshot is stale for {db_path}")
+        return None
+    return snapshot
+
+def _write_schema_snapshot(db_path: str, snapshot: Dict[str, Any]) -> None:
+    """
+    Writes a raw schema snapshot atomically so concurrent workers never read a partial snapshot.
+    
+    Args:
+        db_path (str): The path to the database file.
+        snapshot (Dict[str, Any]): The raw snapshot to write.
+    """
+    snapshot_path = get_schema_snapshot_path(db_path)
+    # Named by process and thread, since threads of one process can write the same snapshot concurrently.
+    temporary_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with temporary_path.open("wb") as file:
+            pickle.dump(snapshot, file)
+        os.replace(temporary_path, snapshot_path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+@contextmanager
+def _lock_schema_snapshot(db_path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on the schema snapshot of a database, across processes and threads.
+    
+    Args:
+        db_path (str): The path to the database file.
+    """
+    snapshot_path = get_schema_snapshot_path(db_path)
+    with snapshot_path.with_name(f"{snapshot_path.name}.lock").open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_schema_snapshot(db_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads the schema snapshot of a database if it exists and matches the current database file.
+    
+    Args:
+        db_path (str): The path to the database file.
+        
+    Returns:
+        Optional[Dict[str, Any]]: The snapshot with the DatabaseSchema under "schema", or None if it is missing or stale.
+    """
+    try:
+        snapshot = _read_schema_snapshot(db_path)
+        if snapshot is None:
+            return None
+        snapshot["schema"] = DatabaseSchema.from_schema_dict_with_descriptions(snapshot["schema"])
+        return snapshot
+    except Exception as e:
+        logging.warning(f"Error loading schema snapshot for {db_path}: {e}")
+        return None
+
+def save_schema_snapshot(db_path: str, database_schema: DatabaseSchema, **extra: Any) -> None:
+    """
+    Saves the schema of a database to a versioned snapshot next to the database file.
+    The file is written atomically so concurrent workers never read a partial snapshot.
+    
+    Args:
+        db_path (str): The path to the database file.
+        database_schema (DatabaseSchema): The profiled database schema to save.
+        **extra (Any): Additional precomputed entries to store in the snapshot.
+    """
+    try:
+        snapshot = {
+            "version": SCHEMA_SNAPSHOT_VERSION,
+            **_get_db_file_signature(db_path),
+            "schema": database_schema.to_schema_dict_with_info(),
+            **extra,
+        }
+        with _lock_schema_snapshot(db_path):
+            _write_schema_snapshot(db_path, snapshot)
+    except Exception as e:
+        logging.warning(f"Error saving schema snapshot for {db_path}: {e}")
+
+def update_schema_snapshot(db_path: str, **entries: Any) -> None:
+    """
+    Adds precomputed entries to the existing schema snapshot of a database.
+    The read and the write happen under the snapshot lock, and dictionary entries are merged into the stored ones,
+    so workers adding different keys of an entry (e.g. profile variants) keep each other's keys.
+    Nothing is written if the snapshot is missing or stale.
+    
+    Args:
+        db_path (str): The path to the database file.
+        **entries (Any): The entries to add to the snapshot.
+    """
+    try:
+        with _lock_schema_snapshot(db_path):
+            snapshot = _read_schema_snapshot(db_path)
+            if snapshot is None:
+                return
+            for key, value in entries.items():
+                if isinstance(value, dict) and isinstance(snapshot.get(key), dict):
+                    value = {**snapshot[key], **value}
+                snapshot[key] = value
+            _write_schema_snapshot(db_path, snapshot)
+    except Exception as e:
+        logging.warning(f"Error updating schema snapshot for {db_path}: {e}")
@@ -1,40 +1,24 @@
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_vertexai import VertexAI
-from google.oauth2 import service_account
-from google.cloud import aiplatform
 from typing import Dict, Any
-import vertexai
-from langchain_google_vertexai import HarmBlockThreshold, HarmCategory
-import os
+from llm.fake_engine import FAKE_ENGINE_NAME, FakeChatModel
+from llm.providers import LazyConstructor, initialize_vertex_ai, get_vertex_safety_settings
 
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-}
-
-
-GCP_PROJECT = os.getenv("GCP_PROJECT")
-GCP_REGION = os.getenv("GCP_REGION")
-GCP_CREDENTIALS = os.getenv("GCP_CREDENTIALS")
-
-if GCP_CREDENTIALS and GCP_PROJECT and GCP_REGION:
-    aiplatform.init(
-    project=GCP_PROJECT,
-    location=GCP_REGION,
-    credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS)
-    )
-    vertexai.init(project=GCP_PROJECT, location=GCP_REGION, credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS))
+# Provider model classes, imported when the first engine of the provider is constructed.
+ChatOpenAI = LazyConstructor("langchain_openai", "ChatOpenAI")
+ChatGoogleGenerativeAI = LazyConstructor("langchain_google_genai", "ChatGoogleGenerativeAI")
+ChatAnthropic = LazyConstructor("langchain_anthropic", "ChatAnthropic")
+VertexAI = LazyConstructor("langchain_google_vertexai", "VertexAI", initialize=initialize_vertex_ai,
+                           default_params=lambda: {"safety_settings": get_vertex_safety_settings()})
 
 """
 This module defines configurations for various language models using the langchain library.
 Each configuration includes a constructor, parameters, and an optional preprocessing function.
+Optional entries: "rate_limits" (the scheduler limits of the engine), "fallbacks" (the engines tried when it fails)
+and "multi_sample" (the request parameter drawing several samples from one prompt, and the maximum samples per request).
 """
 
+OPENAI_MULTI_SAMPLE = {"param": "n", "max_samples": 128}
+GEMINI_MULTI_SAMPLE = {"param": "candidate_count", "max_samples": 8}
+
 ENGINE_CONFIGS: Dict[str, Dict[str, Any]] = {
     "gemini-pro": {
         "constructor": ChatGoogleGenerativeAI,
@@ -43,15 +27,18 @@ ENGINE_CONFIGS: Dict[str, Dict[str, Any]] = {
     },
     "gemini-1.5-pro": {
         "constructor": VertexAI,
-        "params": {"model": "gemini-1.5-pro", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "gemini-1.5-pro", "temperature": 0},
+        "multi_sample": GEMINI_MULTI_SAMPLE
     },
     "gemini-1.5-pro-002": {
         "constructor": VertexAI,
-        "params": {"model": "gemini-1.5-pro-002", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "gemini-1.5-pro-002", "temperature": 0},
+        "multi_sample": GEMINI_MULTI_SAMPLE
     },
     "gemini-1.5-flash":{
         "constructor": VertexAI,
-        "params": {"model": "gemini-1.5-flash", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "gemini-1.5-flash", "temperature": 0},
+        "multi_sample": GEMINI_MULTI_SAMPLE
     },
     "gemini-2.0-flash-exp":{
         "constructor": ChatGoogleGenerativeAI,
@@ -59,19 +46,20 @@ ENGINE_CONFIGS: Dict[str, Dict[str, Any]] = {
     },
     "picker_gemini_model": {
         "constructor": VertexAI,
-        "params": {"model": "projects/613565144741/locations/us-central1/endpoints/7618015791069265920", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "projects/613565144741/locations/us-central1/endpoints/7618015791069265920", "temperature": 0}
     },
     "gemini-1.5-pro-text2sql": {
         "constructor": VertexAI,
-        "params": {"model": "projects/618488765595/locations/us-central1/endpoints/1743594544210903040", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "projects/618488765595/locations/us-central1/endpoints/1743594544210903040", "temperature": 0}
     },
     "cot_picker": {
         "constructor": VertexAI,
-        "params": {"model": "projects/243839366443/locations/us-central1/endpoints/2772315215344173056", "temperature": 0, "safety_settings": safety_settings}
+        "params": {"model": "projects/243839366443/locations/us-central1/endpoints/2772315215344173056", "temperature": 0}
     },
     "gpt-3.5-turbo-0125": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4o-mini", "temperature": 0}
+        "params": {"model": "gpt-4o-mini", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "gpt-3.5-turbo-instruct": {
         "constructor": ChatOpenAI,
@@ -79,23 +67,33 @@ ENGINE_CONFIGS: Dict[str, Dict[str, Any]] = {
     },
     "gpt-4-1106-preview": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4-1106-preview", "temperature": 0}
+        "params": {"model": "gpt-4-1106-preview", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "gpt-4-0125-preview": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4-0125-preview", "temperature": 0}
+        "params": {"model": "gpt-4-0125-preview", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "gpt-4-turbo": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4-turbo", "temperature": 0}
+        "params": {"model": "gpt-4-turbo", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "gpt-4o": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4o", "temperature": 0}
+        "params": {"model": "gpt-4o", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "gpt-4o-mini": {
         "constructor": ChatOpenAI,
-        "params": {"model": "gpt-4o-mini", "temperature": 0}
+        "params": {"model": "gpt-4o-mini", "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
+    },
+    FAKE_ENGINE_NAME: {
+        "constructor": FakeChatModel,
+        "params": {"model": FAKE_ENGINE_NAME, "temperature": 0},
+        "multi_sample": OPENAI_MULTI_SAMPLE
     },
     "claude-3-5-sonnet-20241022": {
         "constructor": ChatAnthropic,
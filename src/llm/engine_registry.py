@@ -0,0 +1,160 @@
+import os
+import logging
+from threading import Lock
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from llm.engine_configs import ENGINE_CONFIGS, ChatOpenAI
+from llm.fake_engine import FAKE_ENGINE_NAME, LLM_FAKE_ALL_ENGINES
+
+load_dotenv(override=True)
+
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 100))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 60))
+
+def _freeze(value: Any) -> Hashable:
+    """
+    Converts a parameter value into a hashable equivalent, so that parameter dictionaries can be used as keys.
+
+    Args:
+        value (Any): The parameter value.
+
+    Returns:
+        Hashable: The hashable equivalent of the value.
+    """
+    if isinstance(value, Mapping):
+        return tuple(sorted(((repr(key), _freeze(item)) for key, item in value.items())))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_freeze(item) for item in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+class EngineRegistry:
+    """
+    Registry of constructed LLM chains, keyed by engine name and effective parameters.
+    Chains are built once and shared between threads, so their HTTP clients (and the pooled, kept-alive connections)
+    are reused across requests. OpenAI compatible engines additionally share one pooled HTTP client.
+    The engine configurations are never modified: per call overrides are merged into a fresh parameter dictionary.
+    With fake_all_engines, every engine (including the fallback and empty output engines) is served by the fake engine.
+    """
+
+    def __init__(self, engine_configs: Dict[str, Dict[str, Any]] = ENGINE_CONFIGS, fake_all_engines: bool = LLM_FAKE_ALL_ENGINES):
+        self.engine_configs = engine_configs
+        self.fake_all_engines = fake_all_engines
+        self._chains: Dict[Tuple[str, Hashable], Any] = {}
+        self._engine_names: Dict[int, str] = {}
+        self._http_client = None
+        self._lock = Lock()
+        self._stats = {"created": 0, "reused": 0}
+
+    def _get_http_client(self) -> httpx.Client:
+        """
+        Creates the shared HTTP client on first use. Must be called with the lock held.
+
+        Returns:
+            httpx.Client: The HTTP client with connection pooling and keep-alive.
+        """
+        if self._http_client is None:
+            limits = httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                                  max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                                  keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY)
+            self._http_client = httpx.Client(limits=limits, timeout=httpx.Timeout(600, connect=10))
+        return self._http_client
+
+    def get_params(self, engine_name: str, overrides: Optional[Mapping[str, Any]] = None) -> Mapping[str, Any]:
+        """
+        Merges the configured parameters of an engine with per call overrides.
+
+        Args:
+            engine_name (str): The name of the engine.
+            overrides (Optional[Mapping[str, Any]]): The parameters to override.
+
+        Returns:
+            Mapping[str, Any]: A read-only view of the effective parameters.
+
+        Raises:
+            ValueError: If the engine is not supported.
+        """
+        if engine_name not in self.engine_configs:
+            raise ValueError(f"Engine {engine_name} not supported")
+        params = dict(self.engine_configs[engine_name]["params"])
+        params.update(overrides or {})
+        return MappingProxyType(params)
+
+    def get_chain(self, engine_name: str, overrides: Optional[Mapping[str, Any]] = None) -> Any:
+        """
+        Retrieves the chain of an engine with the given parameter overrides, constructing it on first use.
+
+        Args:
+            engine_name (str): The name of the engine.
+            overrides (Optional[Mapping[str, Any]]): The parameters to override.
+
+        Returns:
+            Any: The LLM chain instance.
+        """
+        if self.fake_all_engines and engine_name in self.engine_configs:
+            engine_name = FAKE_ENGINE_NAME
+            # Provider specific overrides do not apply to the fake engine.
+            overrides = {key: value for key, value in (overrides or {}).items() if key == "temperature"}
+        params = self.get_params(engine_name, overrides)
+        key = (engine_name, _freeze(params))
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is not None:
+                self._stats["reused"] += 1
+                return chain
+            config = self.engine_configs[engine_name]
+            constructor_params = dict(params)
+            if config["constructor"] is ChatOpenAI and "http_client" not in constructor_params:
+                constructor_params["http_client"] = self._get_http_client()
+            model = config["constructor"](**constructor_params)
+            chain = config["preprocess"] | model if "preprocess" in config else model
+            self._chains[key] = chain
+            self._engine_names[id(chain)] = engine_name
+            self._stats["created"] += 1
+        logging.info(f"Created LLM chain for engine {engine_name}")
+        return chain
+
+    def get_engine_name(self, chain: Any) -> Optional[str]:
+        """
+        Retrieves the name of the engine a chain was constructed for.
+
+        Args:
+            chain (Any): The LLM chain.
+
+        Returns:
+            Optional[str]: The engine name, or None if the chain was not constructed by the registry.
+        """
+        with self._lock:
+            return self._engine_names.get(id(chain))
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the number of chains created and reused.
+
+        Returns:
+            Dict[str, int]: The registry statistics.
+        """
+        with self._lock:
+            return {**self._stats, "instances": len(self._chains)}
+
+    def clear(self) -> None:
+        """
+        Forgets every constructed chain and closes the shared HTTP client.
+        """
+        with self._lock:
+            self._chains.clear()
+            self._engine_names.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+ENGINE_REGISTRY = EngineRegistry()
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from functools import lru_cache
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+from llm.prompts import TEMPLATES_ROOT_PATH
+
+load_dotenv(override=True)
+
+FAKE_ENGINE_NAME = "fake"
+LLM_FAKE_SCRIPT_PATH = os.getenv("LLM_FAKE_SCRIPT_PATH", "./run/fake_llm_responses.json")
+# Routes every engine of a configuration to the fake engine, so the whole pipeline runs without provider keys.
+LLM_FAKE_ALL_ENGINES = os.getenv("LLM_FAKE_ALL_ENGINES", "false").lower() == "true"
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+LLM_FAKE_LATENCY_DISTRIBUTION = os.getenv("LLM_FAKE_LATENCY_DISTRIBUTION", "fixed").lower()
+LLM_FAKE_LATENCY_SECONDS = float(os.getenv("LLM_FAKE_LATENCY_SECONDS", 0))
+LLM_FAKE_LATENCY_SPREAD = float(os.getenv("LLM_FAKE_LATENCY_SPREAD", 0))
+LLM_FAKE_ERROR_RATE = float(os.getenv("LLM_FAKE_ERROR_RATE", 0))
+LLM_FAKE_SEED = int(os.getenv("LLM_FAKE_SEED", 0))
+
+PLACEHOLDER_PATTERN = re.compile(r"(?<!\{)\{[A-Za-z_][A-Za-z0-9_]*\}(?!\})")
+MIN_SEGMENT_LENGTH = 30
+MIN_TEMPLATE_MATCH = 0.5
+
+class FakeEngineError(Exception):
+    """Injected provider error. The status code makes the resilience layer treat it like the real one."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Injected fake engine error with status code {status_code}")
+        self.status_code = status_code
+
+def get_prompt_hash(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+
+@lru_cache(maxsize=None)
+def _load_template_segments() -> Dict[str, Tuple[str, ...]]:
+    """
+    Loads the static text segments (the text between placeholders) of every template.
+
+    Returns:
+        Dict[str, Tuple[str, ...]]: The segments long enough to identify a template, per template name.
+    """
+    template_segments = {}
+    for template_path in sorted(Path(TEMPLATES_ROOT_PATH).glob("template_*.txt")):
+        template_name = template_path.stem[len("template_"):]
+        template = template_path.read_text()
+        segments = [segment.replace("{{", "{").replace("}}", "}").strip() for segment in PLACEHOLDER_PATTERN.split(template)]
+        template_segments[template_name] = tuple(segment for segment in segments if len(segment) >= MIN_SEGMENT_LENGTH)
+    return template_segments
+
+@lru_cache(maxsize=4096)
+def detect_template_name(prompt_text: str) -> Optional[str]:
+    """
+    Finds the template a prompt was rendered from: the template with the largest share of its static text in the prompt.
+
+    Args:
+        prompt_text (str): The rendered prompt.
+
+    Returns:
+        Optional[str]: The template name, or None if no template matches.
+    """
+    best_name, best_score = None, MIN_TEMPLATE_MATCH
+    for template_name, segments in _load_template_segments().items():
+        total_length = sum(len(segment) for segment in segments)
+        if not total_length:
+            continue
+        score = sum(len(segment) for segment in segments if segment in prompt_text) / total_length
+        if score > best_score:
+            best_name, best_score = template_name, score
+    return best_name
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic local chat model for offline load and regression testing.
+    Responses come from a JSON script with, in order of precedence, "prompts" keyed by the SHA-256 of the rendered prompt,
+    "templates" keyed by template name (detected from the prompt text) and a "default" response. An entry is a response
+    or a list of responses served in turn. Latency follows a configurable distribution, and a share of the calls fails
+    with an injected provider error. Random draws are seeded per prompt and call, so a run is reproducible.
+    """
+
+    model: str = FAKE_ENGINE_NAME
+    temperature: float = 0
+    script_path: str = LLM_FAKE_SCRIPT_PATH
+    latency_distribution: str = LLM_FAKE_LATENCY_DISTRIBUTION
+    latency_seconds: float = LLM_FAKE_LATENCY_SECONDS
+    latency_spread: float = LLM_FAKE_LATENCY_SPREAD
+    error_rate: float = LLM_FAKE_ERROR_RATE
+    error_status_codes: List[int] = [429, 503]
+    seed: int = LLM_FAKE_SEED
+
+    _script: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    _call_counts: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model, "temperature": self.temperature, "script_path": self.script_path}
+
+    def _get_script(self) -> Dict[str, Any]:
+        """
+        Loads the response script on first use. Must be called with the lock held.
+
+        Returns:
+            Dict[str, Any]: The response script, empty if the file does not exist.
+        """
+        if self._script is None:
+            script_path = Path(self.script_path)
+            self._script = json.loads(script_path.read_text()) if script_path.exists() else {}
+            logging.info(f"Fake engine script loaded from {script_path}")
+        return self._script
+
+    def _draw(self, prompt_text: str) -> Tuple[str, float, Optional[int]]:
+        """
+        Draws the response, the latency and the injected error of a call.
+
+        Args:
+            prompt_text (str): The rendered prompt.
+
+        Returns:
+            Tuple[str, float, Optional[int]]: The response, the latency in seconds, and the status code of the injected error, if any.
+
+        Raises:
+            ValueError: If the script has no response for the prompt.
+        """
+        prompt_hash = get_prompt_hash(prompt_text)
+        with self._lock:
+            script = self._get_script()
+            call_index = self._call_counts.get(prompt_hash, 0)
+            self._call_counts[prompt_hash] = call_index + 1
+        template_name = None
+        responses = script.get("prompts", {}).get(prompt_hash)
+        if responses is None:
+            template_name = detect_template_name(prompt_text)
+            responses = script.get("templates", {}).get(template_name, script.get("default"))
+        if responses is None:
+            raise ValueError(f"No fake response for template {template_name} and prompt hash {prompt_hash} in {self.script_path}")
+        if isinstance(responses, list):
+            responses = responses[call_index % len(responses)]
+        generator = random.Random(f"{self.seed}:{prompt_hash}:{call_index}")
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {self.latency_distribution}, expected one of {LATENCY_DISTRIBUTIONS}")
+        if self.latency_distribution == "uniform":
+            latency = generator.uniform(self.latency_seconds - self.latency_spread, self.latency_seconds + self.latency_spread)
+        elif self.latency_distribution == "lognormal":
+            # Heavy tailed: the median is latency_seconds and latency_spread is the sigma of the underlying normal.
+            latency = self.latency_seconds * generator.lognormvariate(0, self.latency_spread)
+        else:
+            latency = self.latency_seconds
+        error_status_code = generator.choice(self.error_status_codes) if generator.random() < self.error_rate else None
+        return str(responses), max(latency, 0.0), error_status_code
+
+    def _draw_result(self, messages: List[BaseMessage], **kwargs: Any) -> Tuple[ChatResult, float, Optional[int]]:
+        prompt_text = "\n".join(str(message.content) for message in messages)
+        draws = [self._draw(prompt_text) for _ in range(kwargs.get("n", 1))]
+        result = ChatResult(generations=[ChatGeneration(message=AIMessage(content=response)) for response, _, _ in draws])
+        error_status_code = next((status_code for _, _, status_code in draws if status_code is not None), None)
+        return result, max(latency for _, latency, _ in draws), error_status_code
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result, latency, error_status_code = self._draw_result(messages, **kwargs)
+        time.sleep(latency)
+        if error_status_code is not None:
+            raise FakeEngineError(error_status_code)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result, latency, error_status_code = self._draw_result(messages, **kwargs)
+        await asyncio.sleep(latency)
+        if error_status_code is not None:
+            raise FakeEngineError(error_status_code)
+        return result
@@ -1,15 +1,41 @@
-from typing import Any, Dict, List
+import os
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
 
 from langchain_core.exceptions import OutputParserException
-from langchain.output_parsers import OutputFixingParser
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.runnables import RunnableLambda
 
 from llm.engine_configs import ENGINE_CONFIGS
+from llm.engine_registry import ENGINE_REGISTRY
+from llm.prompt_prefix import PROMPT_PREFIX_TRACKING, PROMPT_PREFIX_TRACKER
+from llm.response_cache import LLM_RESPONSE_CACHE, LLM_CACHE_MODE_REPLAY_ONLY, LLMCacheMissError, describe_engine
+from llm.resilience import LLM_RESILIENCE
+from llm.single_flight import LLM_SINGLE_FLIGHT, LLM_SINGLE_FLIGHT_GROUP
+from llm.scheduler import LLM_REQUEST_SCHEDULER, PRIORITY_BATCH
+from llm.tokens import count_tokens
 from runner.logger import Logger
-from threading_utils import ordered_concurrent_function_calls
+from threading_utils import get_background_event_loop
+
+load_dotenv(override=True)
+
+LLM_CALL_BACKEND_THREADS = "threads"
+LLM_CALL_BACKEND_ASYNCIO = "asyncio"
+# With the asyncio backend, async_llm_chain_call runs its requests as coroutines on a shared event loop instead of scheduler threads.
+LLM_CALL_BACKEND = os.getenv("LLM_CALL_BACKEND", LLM_CALL_BACKEND_THREADS).lower()
+# Streams the responses of parsers that can detect the end of their answer, see `detect_answer_end` in llm/parsers.py.
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() == "true"
+# Stops reading a streamed response once its answer is complete, which cancels the rest of the generation.
+LLM_STREAMING_CANCEL = os.getenv("LLM_STREAMING_CANCEL", "true").lower() == "true"
 
 def get_llm_chain(engine_name: str, temperature: float = 0, base_uri: str = None) -> Any:
     """
     Returns the appropriate LLM chain based on the provided engine name and temperature.
+    Chains are shared through the engine registry, and the engine configurations are never modified.
 
     Args:
         engine (str): The name of the engine.
@@ -25,26 +51,308 @@ def get_llm_chain(engine_name: str, temperature: float = 0, base_uri: str = None
     if engine_name not in ENGINE_CONFIGS:
         raise ValueError(f"Engine {engine_name} not supported")
     
-    config = ENGINE_CONFIGS[engine_name]
-    constructor = config["constructor"]
-    params = config["params"]
+    overrides = {}
     if temperature:
-        params["temperature"] = temperature
+        overrides["temperature"] = temperature
     
     # Adjust base_uri if provided
-    if base_uri and "openai_api_base" in params:
-        params["openai_api_base"] = f"{base_uri}/v1"
+    if base_uri and "openai_api_base" in ENGINE_CONFIGS[engine_name]["params"]:
+        overrides["openai_api_base"] = f"{base_uri}/v1"
     
-    model = constructor(**params)
-    if "preprocess" in config:
-        llm_chain = config["preprocess"] | model
-    else:
-        llm_chain = model
-    return llm_chain
+    return ENGINE_REGISTRY.get_chain(engine_name, overrides)
+
+def get_multi_sample_config(engine: Any) -> Optional[Dict[str, Any]]:
+    """
+    Retrieves the native multi-sample support an engine declares in its configuration.
+
+    Args:
+        engine (Any): The LLM chain.
+
+    Returns:
+        Optional[Dict[str, Any]]: The request parameter setting the number of samples ("param") and the maximum samples
+            per request ("max_samples"), or None if the engine draws one sample per request.
+    """
+    engine_name = ENGINE_REGISTRY.get_engine_name(engine)
+    if engine_name is None:
+        return None
+    return ENGINE_CONFIGS.get(engine_name, {}).get("multi_sample")
+
+def _get_generation_outputs(result: LLMResult) -> List[Any]:
+    return [generation.message if isinstance(generation, ChatGeneration) else generation.text for generation in result.generations[0]]
+
+def _build_multi_sample_runnable(prompt: Any, engine: Any, sample_count: int) -> Any:
+    """
+    Builds the runnable drawing several raw outputs from one rendering of the prompt.
+
+    Args:
+        prompt (Any): The prompt.
+        engine (Any): The engine the request is sent to.
+        sample_count (int): The number of samples.
+
+    Returns:
+        Any: The runnable, returning the list of raw outputs.
+    """
+    multi_sample = get_multi_sample_config(engine)
+    if multi_sample is None:
+        # Engines without native support, e.g. fallback engines, answer with parallel single calls.
+        return prompt | RunnableLambda(lambda prompt_value: engine.batch([prompt_value] * sample_count),
+                                       afunc=lambda prompt_value: engine.abatch([prompt_value] * sample_count))
+    model = getattr(engine, "last", engine)
+    sample_kwargs = {multi_sample["param"]: sample_count}
+
+    def generate(prompt_value: Any) -> List[Any]:
+        return _get_generation_outputs(model.generate_prompt([prompt_value], **sample_kwargs))
+
+    async def agenerate(prompt_value: Any) -> List[Any]:
+        return _get_generation_outputs(await model.agenerate_prompt([prompt_value], **sample_kwargs))
+
+    return prompt | RunnableLambda(generate, afunc=agenerate)
 
-def call_llm_chain(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, max_attempts: int = 12, backoff_base: int = 2, jitter_max: int = 60) -> Any:
+def _get_chunk_text(chunk: Any) -> str:
+    return chunk if isinstance(chunk, str) else chunk.content
+
+def _build_streaming_runnable(prompt: Any, engine: Any, parser: Any) -> Any:
     """
-    Calls the LLM chain with exponential backoff and jitter on failure.
+    Builds the runnable streaming the response of an engine until the parser has its answer.
+
+    Args:
+        prompt (Any): The prompt.
+        engine (Any): The engine the request is sent to.
+        parser (Any): The parser, with a `detect_answer_end` method.
+
+    Returns:
+        Any: The runnable, returning the response text (cut after the answer when the generation is cancelled).
+    """
+    def stream(prompt_value: Any) -> str:
+        text = ""
+        chunks = engine.stream(prompt_value)
+        try:
+            for chunk in chunks:
+                text += _get_chunk_text(chunk)
+                answer_end = parser.detect_answer_end(text)
+                if answer_end is not None and LLM_STREAMING_CANCEL:
+                    return text[:answer_end]
+        finally:
+            # Closing the stream closes the provider connection, which stops the generation.
+            chunks.close()
+        return text
+
+    async def astream(prompt_value: Any) -> str:
+        text = ""
+        chunks = engine.astream(prompt_value)
+        try:
+            async for chunk in chunks:
+                text += _get_chunk_text(chunk)
+                answer_end = parser.detect_answer_end(text)
+                if answer_end is not None and LLM_STREAMING_CANCEL:
+                    return text[:answer_end]
+        finally:
+            await chunks.aclose()
+        return text
+
+    return prompt | RunnableLambda(stream, afunc=astream)
+
+def _get_build_runnable(prompt: Any, parser: Any) -> Callable[[Any], Any]:
+    """
+    Selects how a request is sent: streamed when streaming is enabled and the parser detects the end of its answer,
+    invoked otherwise.
+
+    Args:
+        prompt (Any): The prompt.
+        parser (Any): The parser of the response.
+
+    Returns:
+        Callable[[Any], Any]: Builds the runnable of the request around an engine.
+    """
+    if LLM_STREAMING and hasattr(parser, "detect_answer_end"):
+        return lambda candidate: _build_streaming_runnable(prompt, candidate, parser)
+    return lambda candidate: prompt | candidate
+
+def _track_prompt_prefix(logger: Logger, step: str, prompt_text: str) -> None:
+    if PROMPT_PREFIX_TRACKING:
+        prefix_measurement = PROMPT_PREFIX_TRACKER.record((logger.db_id, logger.question_id), step, prompt_text)
+        logger.log(f"Prompt prefix at step {step}: {prefix_measurement['shared_prefix_tokens']} of {prefix_measurement['prompt_tokens']} tokens shared", "debug")
+
+def _get_cache_entry(engine: Any, prompt_text: str, sample_index: int, cache_bypassed: bool) -> Optional[Dict[str, Any]]:
+    """
+    Describes the response cache entry of a request.
+
+    Args:
+        engine (Any): The engine the request is sent to.
+        prompt_text (str): The rendered prompt.
+        sample_index (int): The index of the sample.
+        cache_bypassed (bool): Whether the cache was bypassed after a cached response failed to parse.
+
+    Returns:
+        Optional[Dict[str, Any]]: The cache key, the engine description and whether the request is looked up,
+            or None if the request does not go through the cache.
+    """
+    if cache_bypassed or not LLM_RESPONSE_CACHE.enabled:
+        return None
+    engine_name, engine_params, temperature = describe_engine(engine)
+    return {
+        "key": LLM_RESPONSE_CACHE.make_key(engine_name, engine_params, prompt_text, sample_index),
+        "engine_name": engine_name,
+        "params": engine_params,
+        "temperature": temperature,
+        "sample_index": sample_index,
+        "lookup": LLM_RESPONSE_CACHE.should_lookup(temperature),
+    }
+
+def _get_cached_output(cache_entry: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Looks up the response of a request in the response cache.
+
+    Args:
+        cache_entry (Optional[Dict[str, Any]]): The cache entry of the request.
+
+    Returns:
+        Optional[str]: The cached response, or None if the request is not looked up or has no cached response.
+
+    Raises:
+        LLMCacheMissError: On a miss in replay-only mode.
+    """
+    if cache_entry is None or not cache_entry["lookup"]:
+        return None
+    return LLM_RESPONSE_CACHE.get(cache_entry["key"])
+
+def _get_single_flight_key(engine: Any, prompt_text: str, parser: Any) -> Optional[str]:
+    """
+    Builds the key under which concurrent identical requests are coalesced into one provider call.
+    Only deterministic (temperature 0) requests are coalesced, sampled requests are independent by design.
+    Streamed requests are not coalesced either, since their response is cut where their own parser has its answer.
+
+    Args:
+        engine (Any): The engine the request is sent to.
+        prompt_text (str): The rendered prompt.
+        parser (Any): The parser of the response.
+
+    Returns:
+        Optional[str]: The key, or None if the request must not be coalesced.
+    """
+    if not LLM_SINGLE_FLIGHT or (LLM_STREAMING and hasattr(parser, "detect_answer_end")):
+        return None
+    engine_name, engine_params, temperature = describe_engine(engine)
+    if temperature != 0:
+        return None
+    return LLM_RESPONSE_CACHE.make_key(engine_name, engine_params, prompt_text, 0)
+
+def _is_empty_output(output: Any) -> bool:
+    return (output if isinstance(output, str) else output.content).strip() == ""
+
+def _finish_call(logger: Logger, parser: Any, output: Any, cache_entry: Optional[Dict[str, Any]], from_cache: bool, prompt_text: str, step: str) -> Any:
+    """
+    Parses a response, stores it in the response cache and logs the conversation.
+
+    Args:
+        logger (Logger): The logger.
+        parser (Any): The parser to parse the output.
+        output (Any): The raw output of the chain.
+        cache_entry (Optional[Dict[str, Any]]): The cache entry of the request, if it goes through the cache.
+        from_cache (bool): Whether the output was read from the cache.
+        prompt_text (str): The rendered prompt.
+        step (str): The current step in the process.
+
+    Returns:
+        Any: The parsed output.
+    """
+    response_text = output if isinstance(output, str) else output.content
+    output = parser.invoke(output)
+    # Only responses that parse are stored, so replayed responses behave like the recorded ones.
+    if cache_entry is not None and not from_cache:
+        LLM_RESPONSE_CACHE.put(cache_entry["key"], cache_entry["engine_name"], cache_entry["params"], cache_entry["temperature"],
+                               cache_entry["sample_index"], response_text)
+    logger.log_conversation(
+        [
+            {
+                "text": prompt_text,
+                "from": "Human",
+                "step": step
+            },
+            {
+                "text": output,
+                "from": "AI",
+                "step": step
+            }
+        ]
+    )
+    return output
+
+def _get_cached_samples(engine: Any, prompt_text: str, sample_indices: List[int]) -> Tuple[List[Optional[Dict[str, Any]]], List[Any]]:
+    """
+    Looks up the samples of a request in the response cache.
+
+    Args:
+        engine (Any): The engine the request is sent to.
+        prompt_text (str): The rendered prompt.
+        sample_indices (List[int]): The indices of the samples.
+
+    Returns:
+        Tuple[List[Optional[Dict[str, Any]]], List[Any]]: The cache entry and the cached output (None on a miss) of every sample.
+    """
+    cache_entries = [_get_cache_entry(engine, prompt_text, sample_index, False) for sample_index in sample_indices]
+    outputs = [_get_cached_output(cache_entry) for cache_entry in cache_entries]
+    return cache_entries, outputs
+
+def _finish_samples(logger: Logger, parser: Any, outputs: List[Any], cache_entries: List[Optional[Dict[str, Any]]], from_cache: List[bool],
+                    prompt_text: str, step: str) -> Tuple[List[Any], List[int]]:
+    """
+    Parses the samples of a multi-sample request.
+
+    Args:
+        logger (Logger): The logger.
+        parser (Any): The parser to parse the outputs.
+        outputs (List[Any]): The raw output of every sample, None if the provider returned fewer samples.
+        cache_entries (List[Optional[Dict[str, Any]]]): The cache entry of every sample.
+        from_cache (List[bool]): Whether every output was read from the cache.
+        prompt_text (str): The rendered prompt.
+        step (str): The current step in the process.
+
+    Returns:
+        Tuple[List[Any], List[int]]: The parsed samples (None for failed ones), and the positions of the failed samples.
+    """
+    results = []
+    failed_positions = []
+    for position, output in enumerate(outputs):
+        try:
+            if output is None or _is_empty_output(output):
+                raise OutputParserException("Empty output")
+            results.append(_finish_call(logger, parser, output, cache_entries[position], from_cache[position], prompt_text, step))
+        except OutputParserException as e:
+            logger.log(f"OutputParserException in sample {position}: {e}", "warning")
+            results.append(None)
+            failed_positions.append(position)
+    return results, failed_positions
+
+def _should_bypass_cache(logger: Logger, from_cache: bool, error: OutputParserException) -> bool:
+    """
+    Decides what to do when a cached response does not parse: bypass the cache, or fail in replay-only mode.
+
+    Args:
+        logger (Logger): The logger.
+        from_cache (bool): Whether the response came from the cache.
+        error (OutputParserException): The parsing error.
+
+    Returns:
+        bool: True if the cache must be bypassed for the next attempts.
+
+    Raises:
+        OutputParserException: If the response came from the cache in replay-only mode.
+    """
+    if not from_cache:
+        return False
+    if LLM_RESPONSE_CACHE.mode == LLM_CACHE_MODE_REPLAY_ONLY:
+        logger.log(f"call_chain: cached response does not parse: {error}", "error")
+        raise error
+    return True
+
+def call_llm_chain(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, max_attempts: int = 12, backoff_base: int = 2, jitter_max: int = 60,
+                   sample_index: int = 0) -> Any:
+    """
+    Calls the LLM chain, retrying when the output does not parse.
+    Provider calls go through the resilience layer (jittered backoff, hedging, fallback engines and circuit breaking),
+    and responses go through the LLM response cache when it is enabled for the engine temperature.
+    In streaming mode, the response is read until the parser detects the end of its answer.
 
     Args:
         prompt (Any): The prompt to be passed to the chain.
@@ -53,8 +361,9 @@ def call_llm_chain(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[s
         request_kwargs (Dict[str, Any]): The request arguments.
         step (int): The current step in the process.
         max_attempts (int, optional): The maximum number of attempts. Defaults to 12.
-        backoff_base (int, optional): The base for exponential backoff. Defaults to 2.
-        jitter_max (int, optional): The maximum jitter in seconds. Defaults to 60.
+        backoff_base (int, optional): Unused, the backoff of transient errors is configured in the resilience layer.
+        jitter_max (int, optional): Unused, the backoff of transient errors is configured in the resilience layer.
+        sample_index (int, optional): The index of the sample among the samples of the same request. Defaults to 0.
 
     Returns:
         Any: The output from the chain.
@@ -63,62 +372,287 @@ def call_llm_chain(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[s
         Exception: If all attempts fail.
     """
     logger = Logger()
+    cache_bypassed = False
     for attempt in range(max_attempts):
+        from_cache = False
         try:
-            # chain = prompt | engine | parser
-            chain = prompt | engine
             prompt_text = prompt.invoke(request_kwargs).messages[0].content
-            output = chain.invoke(request_kwargs)
-            if isinstance(output, str):
-                if output.strip() == "":
-                    engine = get_llm_chain("gemini-1.5-flash")
+            if attempt == 0:
+                _track_prompt_prefix(logger, step, prompt_text)
+            cache_entry = _get_cache_entry(engine, prompt_text, sample_index, cache_bypassed)
+            output = _get_cached_output(cache_entry)
+            from_cache = output is not None
+            if output is None:
+                invoke = lambda: LLM_RESILIENCE.invoke(engine, _get_build_runnable(prompt, parser), request_kwargs, latency_class=str(step))
+                single_flight_key = _get_single_flight_key(engine, prompt_text, parser)
+                if single_flight_key is not None:
+                    (output, answering_engine), _ = LLM_SINGLE_FLIGHT_GROUP.do(single_flight_key, invoke)
+                else:
+                    output, answering_engine = invoke()
+                if answering_engine is not engine:
+                    # Responses of fallback engines are not cached under the key of the requested engine.
+                    cache_entry = None
+                if _is_empty_output(output):
+                    engine = LLM_RESILIENCE.get_empty_output_engine(answering_engine)
                     raise OutputParserException("Empty output")
-            else:
-                if output.content.strip() == "":    
-                    engine = get_llm_chain("gemini-1.5-flash")
-                    raise OutputParserException("Empty output")
-            output = parser.invoke(output)
-            logger.log_conversation(
-                [
-                    {
-                        "text": prompt_text,
-                        "from": "Human",
-                        "step": step
-                    },
-                    {
-                        "text": output,
-                        "from": "AI",
-                        "step": step
-                    }
-                ]
-            )
-            return output
+            return _finish_call(logger, parser, output, cache_entry, from_cache, prompt_text, step)
         except OutputParserException as e:
             logger.log(f"OutputParserException: {e}", "warning")
-            new_parser = OutputFixingParser.from_llm(parser=parser, llm=engine)
-            chain = prompt | engine | new_parser
+            cache_bypassed = cache_bypassed or _should_bypass_cache(logger, from_cache, e)
             if attempt == max_attempts - 1:
                 logger.log(f"call_chain: {e}", "error")
                 raise e
         except Exception as e:
-            # if attempt < max_attempts - 1:
-            #     logger.log(f"Failed to invoke the chain {attempt + 1} times.\n{type(e)}\n{e}", "warning")
-            #     sleep_time = (backoff_base ** attempt) + random.uniform(0, jitter_max)
-            #     time.sleep(sleep_time)
-            # else:
             logger.log(f"Failed to invoke the chain {attempt + 1} times.\n{type(e)} <{e}>\n", "error")
             raise e
 
+async def acall_llm_chain(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, max_attempts: int = 12,
+                          sample_index: int = 0, priority: int = PRIORITY_BATCH, estimated_tokens: Optional[int] = None) -> Any:
+    """
+    Calls the LLM chain with `ainvoke`, the coroutine counterpart of `call_llm_chain`.
+    The call waits for its admission by the process-wide request scheduler, under the same engine limits and budgets
+    as the scheduled threads.
+
+    Args:
+        prompt (Any): The prompt to be passed to the chain.
+        engine (Any): The engine to be used in the chain.
+        parser (Any): The parser to parse the output.
+        request_kwargs (Dict[str, Any]): The request arguments.
+        step (int): The current step in the process.
+        max_attempts (int, optional): The maximum number of attempts. Defaults to 12.
+        sample_index (int, optional): The index of the sample among the samples of the same request. Defaults to 0.
+        priority (int, optional): The scheduling priority class of the request.
+        estimated_tokens (Optional[int], optional): The estimated prompt tokens, estimated here when not given.
+
+    Returns:
+        Any: The output from the chain.
+
+    Raises:
+        Exception: If all attempts fail.
+    """
+    logger = Logger()
+    engine_name = ENGINE_REGISTRY.get_engine_name(engine) or describe_engine(engine)[0]
+    if estimated_tokens is None:
+        estimated_tokens = _estimate_tokens(prompt, request_kwargs, engine_name)
+    cache_bypassed = False
+    async with LLM_REQUEST_SCHEDULER.admit(engine_name, priority, estimated_tokens):
+        for attempt in range(max_attempts):
+            from_cache = False
+            try:
+                prompt_text = (await prompt.ainvoke(request_kwargs)).messages[0].content
+                if attempt == 0:
+                    _track_prompt_prefix(logger, step, prompt_text)
+                cache_entry = _get_cache_entry(engine, prompt_text, sample_index, cache_bypassed)
+                output = _get_cached_output(cache_entry)
+                from_cache = output is not None
+                if output is None:
+                    ainvoke = lambda: LLM_RESILIENCE.ainvoke(engine, _get_build_runnable(prompt, parser), request_kwargs, latency_class=str(step))
+                    single_flight_key = _get_single_flight_key(engine, prompt_text, parser)
+                    if single_flight_key is not None:
+                        (output, answering_engine), _ = await LLM_SINGLE_FLIGHT_GROUP.ado(single_flight_key, ainvoke)
+                    else:
+                        output, answering_engine = await ainvoke()
+                    if answering_engine is not engine:
+                        cache_entry = None
+                    if _is_empty_output(output):
+                        engine = LLM_RESILIENCE.get_empty_output_engine(answering_engine)
+                        raise OutputParserException("Empty output")
+                return _finish_call(logger, parser, output, cache_entry, from_cache, prompt_text, step)
+            except OutputParserException as e:
+                logger.log(f"OutputParserException: {e}", "warning")
+                cache_bypassed = cache_bypassed or _should_bypass_cache(logger, from_cache, e)
+                if attempt == max_attempts - 1:
+                    logger.log(f"call_chain: {e}", "error")
+                    raise e
+            except Exception as e:
+                logger.log(f"Failed to invoke the chain {attempt + 1} times.\n{type(e)} <{e}>\n", "error")
+                raise e
+
+def call_llm_chain_samples(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, sample_count: int,
+                           first_sample_index: int = 0) -> List[Any]:
+    """
+    Draws several samples of one request, uploading the prompt once with the multi-sample parameter of the engine.
+    Samples found in the response cache are not requested again, and samples that are missing, empty or do not parse
+    are retried one by one with `call_llm_chain`.
+
+    Args:
+        prompt (Any): The prompt to be passed to the chain.
+        engine (Any): The engine to be used in the chain.
+        parser (Any): The parser to parse the outputs.
+        request_kwargs (Dict[str, Any]): The request arguments.
+        step (int): The current step in the process.
+        sample_count (int): The number of samples.
+        first_sample_index (int, optional): The index of the first sample among the samples of the request. Defaults to 0.
+
+    Returns:
+        List[Any]: The parsed samples, None for the samples that failed.
+    """
+    logger = Logger()
+    prompt_text = prompt.invoke(request_kwargs).messages[0].content
+    _track_prompt_prefix(logger, step, prompt_text)
+    sample_indices = list(range(first_sample_index, first_sample_index + sample_count))
+    cache_entries, outputs = _get_cached_samples(engine, prompt_text, sample_indices)
+    from_cache = [output is not None for output in outputs]
+    missing_positions = [position for position, output in enumerate(outputs) if output is None]
+    if missing_positions:
+        build_runnable = lambda candidate: _build_multi_sample_runnable(prompt, candidate, len(missing_positions))
+        try:
+            sampled_outputs, answering_engine = LLM_RESILIENCE.invoke(engine, build_runnable, request_kwargs, latency_class=f"{step}_samples")
+        except Exception as e:
+            logger.log(f"Failed to invoke the chain for {len(missing_positions)} samples.\n{type(e)} <{e}>\n", "error")
+            raise e
+        for position, output in zip(missing_positions, sampled_outputs):
+            outputs[position] = output
+            if answering_engine is not engine:
+                cache_entries[position] = None
+    results, failed_positions = _finish_samples(logger, parser, outputs, cache_entries, from_cache, prompt_text, step)
+    for position in failed_positions:
+        try:
+            results[position] = call_llm_chain(prompt, engine, parser, request_kwargs, step, sample_index=sample_indices[position])
+        except Exception as e:
+            logger.log(f"Sample {sample_indices[position]} failed: {e}", "error")
+    return results
+
+async def acall_llm_chain_samples(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, sample_count: int,
+                                  first_sample_index: int = 0, priority: int = PRIORITY_BATCH) -> List[Any]:
+    """
+    Coroutine counterpart of `call_llm_chain_samples`.
+
+    Args:
+        prompt (Any): The prompt to be passed to the chain.
+        engine (Any): The engine to be used in the chain.
+        parser (Any): The parser to parse the outputs.
+        request_kwargs (Dict[str, Any]): The request arguments.
+        step (int): The current step in the process.
+        sample_count (int): The number of samples.
+        first_sample_index (int, optional): The index of the first sample among the samples of the request. Defaults to 0.
+        priority (int, optional): The scheduling priority class of the request.
+
+    Returns:
+        List[Any]: The parsed samples, None for the samples that failed.
+    """
+    logger = Logger()
+    engine_name = ENGINE_REGISTRY.get_engine_name(engine) or describe_engine(engine)[0]
+    estimated_tokens = _estimate_tokens(prompt, request_kwargs, engine_name)
+    prompt_text = (await prompt.ainvoke(request_kwargs)).messages[0].content
+    _track_prompt_prefix(logger, step, prompt_text)
+    sample_indices = list(range(first_sample_index, first_sample_index + sample_count))
+    cache_entries, outputs = _get_cached_samples(engine, prompt_text, sample_indices)
+    from_cache = [output is not None for output in outputs]
+    missing_positions = [position for position, output in enumerate(outputs) if output is None]
+    if missing_positions:
+        build_runnable = lambda candidate: _build_multi_sample_runnable(prompt, candidate, len(missing_positions))
+        try:
+            async with LLM_REQUEST_SCHEDULER.admit(engine_name, priority, estimated_tokens):
+                sampled_outputs, answering_engine = await LLM_RESILIENCE.ainvoke(engine, build_runnable, request_kwargs, latency_class=f"{step}_samples")
+        except Exception as e:
+            logger.log(f"Failed to invoke the chain for {len(missing_positions)} samples.\n{type(e)} <{e}>\n", "error")
+            raise e
+        for position, output in zip(missing_positions, sampled_outputs):
+            outputs[position] = output
+            if answering_engine is not engine:
+                cache_entries[position] = None
+    results, failed_positions = _finish_samples(logger, parser, outputs, cache_entries, from_cache, prompt_text, step)
+    retries = [acall_llm_chain(prompt, engine, parser, request_kwargs, step, sample_index=sample_indices[position],
+                               priority=priority, estimated_tokens=estimated_tokens) for position in failed_positions]
+    for position, result in zip(failed_positions, await asyncio.gather(*retries, return_exceptions=True)):
+        if isinstance(result, LLMCacheMissError):
+            raise result
+        if isinstance(result, Exception):
+            logger.log(f"Sample {sample_indices[position]} failed: {result}", "error")
+            continue
+        results[position] = result
+    return results
+
+def _estimate_tokens(prompt: Any, request_kwargs: Dict[str, Any], engine_name: str) -> int:
+    """
+    Estimates the prompt tokens of a request for the tokens-per-minute budget of its engine.
+
+    Args:
+        prompt (Any): The prompt.
+        request_kwargs (Dict[str, Any]): The request arguments.
+        engine_name (str): The name of the engine.
+
+    Returns:
+        int: The estimated prompt tokens, 0 if the engine has no tokens-per-minute budget.
+    """
+    if not LLM_REQUEST_SCHEDULER.needs_token_estimate(engine_name):
+        return 0
+    try:
+        return count_tokens(prompt.invoke(request_kwargs).messages[0].content)
+    except Exception:
+        return 0
+
+def _get_sample_chunks(engine: Any, sampling_count: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Splits the samples of a request into native multi-sample requests.
+
+    Args:
+        engine (Any): The engine, or the list of engines the samples rotate over.
+        sampling_count (int): The number of samples per request.
+
+    Returns:
+        Optional[List[Tuple[int, int]]]: The first sample index and the sample count of every multi-sample request,
+            or None if the samples are drawn with single calls.
+    """
+    if sampling_count < 2 or isinstance(engine, list):
+        return None
+    multi_sample = get_multi_sample_config(engine)
+    if multi_sample is None:
+        return None
+    max_samples = multi_sample["max_samples"]
+    return [(first, min(max_samples, sampling_count - first)) for first in range(0, sampling_count, max_samples)]
+
+def submit_llm_chain_call(prompt: Any, engine: Any, parser: Any, request_kwargs: Dict[str, Any], step: int, sample_index: int = 0,
+                          priority: int = PRIORITY_BATCH, estimated_tokens: Optional[int] = None) -> Future:
+    """
+    Queues one `call_llm_chain` call on the process-wide request scheduler, for callers consuming results as they arrive.
+    A request cancelled before it starts is never sent.
+
+    Args:
+        prompt (Any): The prompt to be passed to the chain.
+        engine (Any): The engine to be used in the chain.
+        parser (Any): The parser to parse the output.
+        request_kwargs (Dict[str, Any]): The request arguments.
+        step (int): The current step in the process.
+        sample_index (int, optional): The index of the sample among the samples of the same request. Defaults to 0.
+        priority (int, optional): The scheduling priority class of the request.
+        estimated_tokens (Optional[int], optional): The estimated prompt tokens, estimated here when not given.
+
+    Returns:
+        Future: The future of the parsed output.
+    """
+    engine_name = ENGINE_REGISTRY.get_engine_name(engine) or describe_engine(engine)[0]
+    if estimated_tokens is None:
+        estimated_tokens = _estimate_tokens(prompt, request_kwargs, engine_name)
+    return LLM_REQUEST_SCHEDULER.submit(
+        engine_name,
+        call_llm_chain,
+        {
+            'prompt': prompt,
+            'engine': engine,
+            'parser': parser,
+            'request_kwargs': request_kwargs,
+            'step': step,
+            'sample_index': sample_index
+        },
+        priority=priority,
+        estimated_tokens=estimated_tokens
+    )
+
 def async_llm_chain_call(
     prompt: Any, 
     engine: Any, 
     parser: Any, 
     request_list: List[Dict[str, Any]], 
     step: int, 
-    sampling_count: int = 1
+    sampling_count: int = 1,
+    priority: int = PRIORITY_BATCH
 ) -> List[List[Any]]:
     """
-    Asynchronously calls the LLM chain using multiple threads.
+    Asynchronously calls the LLM chain through the process-wide request scheduler.
+    When the engine supports native multi-sample requests, the samples of a request are drawn from one prompt upload.
+    Results of failed calls are None, except for replay-only cache misses, which are raised.
 
     Args:
         prompt (Any): The prompt to be passed to the chain.
@@ -127,29 +661,58 @@ def async_llm_chain_call(
         request_list (List[Dict[str, Any]]): The list of request arguments.
         step (int): The current step in the process.
         sampling_count (int): The number of samples to be taken.
+        priority (int): The scheduling priority class of the requests.
 
     Returns:
         List[List[Any]]: A list of lists containing the results for each request.
     """
 
-    call_list = []
+    if LLM_CALL_BACKEND == LLM_CALL_BACKEND_ASYNCIO:
+        coroutine = abatch_llm_chain_call(prompt, engine, parser, request_list, step, sampling_count, priority)
+        return asyncio.run_coroutine_threadsafe(coroutine, get_background_event_loop()).result()
+
+    futures = []
     engine_id = 0
+    sample_chunks = _get_sample_chunks(engine, sampling_count)
     for request_id, request_kwargs in enumerate(request_list):
-        for _ in range(sampling_count):
-            call_list.append({
-                'function': call_llm_chain,
-                'kwargs': {
-                    'prompt': prompt,
-                    'engine': engine[engine_id % len(engine)] if isinstance(engine,list) else engine,
-                    'parser': parser,
-                    'request_kwargs': request_kwargs,
-                    'step': step
-                }
-            })
+        estimated_tokens = None
+        if sample_chunks is not None:
+            engine_name = ENGINE_REGISTRY.get_engine_name(engine)
+            estimated_tokens = _estimate_tokens(prompt, request_kwargs, engine_name)
+            for first_sample_index, sample_count in sample_chunks:
+                futures.append((sample_count, LLM_REQUEST_SCHEDULER.submit(
+                    engine_name,
+                    call_llm_chain_samples,
+                    {
+                        'prompt': prompt,
+                        'engine': engine,
+                        'parser': parser,
+                        'request_kwargs': request_kwargs,
+                        'step': step,
+                        'sample_count': sample_count,
+                        'first_sample_index': first_sample_index
+                    },
+                    priority=priority,
+                    estimated_tokens=estimated_tokens
+                )))
+            continue
+        for sample_index in range(sampling_count):
+            request_engine = engine[engine_id % len(engine)] if isinstance(engine,list) else engine
+            if estimated_tokens is None:
+                engine_name = ENGINE_REGISTRY.get_engine_name(request_engine) or describe_engine(request_engine)[0]
+                estimated_tokens = _estimate_tokens(prompt, request_kwargs, engine_name)
+            futures.append((None, submit_llm_chain_call(prompt, request_engine, parser, request_kwargs, step, sample_index,
+                                                        priority=priority, estimated_tokens=estimated_tokens)))
             engine_id += 1
 
-    # Execute the functions concurrently
-    results = ordered_concurrent_function_calls(call_list)
+    results = []
+    for sample_count, future in futures:
+        try:
+            result = future.result()
+            results.extend(result if sample_count is not None else [result])
+        except Exception as e:
+            logging.error(f"Exception in LLM call at step {step}: {e}")
+            results.extend([None] * (sample_count or 1))
 
     # Group results by sampling_count
     grouped_results = [
@@ -159,16 +722,79 @@ def async_llm_chain_call(
 
     return grouped_results
 
+async def abatch_llm_chain_call(
+    prompt: Any, 
+    engine: Any, 
+    parser: Any, 
+    request_list: List[Dict[str, Any]], 
+    step: int, 
+    sampling_count: int = 1,
+    priority: int = PRIORITY_BATCH
+) -> List[List[Any]]:
+    """
+    Calls the LLM chain for every request concurrently as coroutines on the running event loop,
+    admitted by the process-wide request scheduler.
+    Results of failed calls are None, except for replay-only cache misses, which are raised.
+
+    Args:
+        prompt (Any): The prompt to be passed to the chain.
+        engine (Any): The engine to be used in the chain.
+        parser (Any): The parser to parse the output.
+        request_list (List[Dict[str, Any]]): The list of request arguments.
+        step (int): The current step in the process.
+        sampling_count (int): The number of samples to be taken.
+        priority (int): The scheduling priority class of the requests.
+
+    Returns:
+        List[List[Any]]: A list of lists containing the results for each request.
+    """
+    coroutines = []
+    sample_counts = []
+    engine_id = 0
+    sample_chunks = _get_sample_chunks(engine, sampling_count)
+    for request_kwargs in request_list:
+        if sample_chunks is not None:
+            for first_sample_index, sample_count in sample_chunks:
+                coroutines.append(acall_llm_chain_samples(prompt, engine, parser, request_kwargs, step, sample_count, first_sample_index, priority))
+                sample_counts.append(sample_count)
+            continue
+        for sample_index in range(sampling_count):
+            sample_counts.append(None)
+            coroutines.append(acall_llm_chain(
+                prompt=prompt,
+                engine=engine[engine_id % len(engine)] if isinstance(engine,list) else engine,
+                parser=parser,
+                request_kwargs=request_kwargs,
+                step=step,
+                sample_index=sample_index,
+                priority=priority
+            ))
+            engine_id += 1
+
+    results = []
+    for sample_count, result in zip(sample_counts, await asyncio.gather(*coroutines, return_exceptions=True)):
+        if isinstance(result, LLMCacheMissError):
+            raise result
+        if isinstance(result, Exception):
+            logging.error(f"Exception in LLM call at step {step}: {result}")
+            result = [None] * sample_count if sample_count is not None else None
+        results.extend(result if sample_count is not None else [result])
+
+    return [
+        results[i * sampling_count: (i + 1) * sampling_count]
+        for i in range(len(request_list))
+    ]
+
 def call_engine(message: str, engine: Any, max_attempts: int = 12, backoff_base: int = 2, jitter_max: int = 60) -> Any:
     """
-    Calls the LLM chain with exponential backoff and jitter on failure.
+    Calls the LLM chain through the resilience layer (jittered backoff, hedging, fallback engines and circuit breaking).
 
     Args:
         message (str): The message to be passed to the chain.
         engine (Any): The engine to be used in the chain.
-        max_attempts (int, optional): The maximum number of attempts. Defaults to 12.
-        backoff_base (int, optional): The base for exponential backoff. Defaults to 2.
-        jitter_max (int, optional): The maximum jitter in seconds. Defaults to 60.
+        max_attempts (int, optional): Unused, the retries of transient errors are configured in the resilience layer.
+        backoff_base (int, optional): Unused, the backoff of transient errors is configured in the resilience layer.
+        jitter_max (int, optional): Unused, the backoff of transient errors is configured in the resilience layer.
 
     Returns:
         Any: The output from the chain.
@@ -177,15 +803,9 @@ def call_engine(message: str, engine: Any, max_attempts: int = 12, backoff_base:
         Exception: If all attempts fail.
     """
     logger = Logger()
-    for attempt in range(max_attempts):
-        try:
-            output = engine.invoke(message)
-            return output.content
-        except Exception as e:
-            # if attempt < max_attempts - 1:
-            #     logger.log(f"Failed to invoke the chain {attempt + 1} times.\n{type(e)}\n{e}", "warning")
-            #     sleep_time = (backoff_base ** attempt) + random.uniform(0, jitter_max)
-            #     time.sleep(sleep_time)
-            # else:
-            logger.log(f"Failed to invoke the chain {attempt + 1} times.\n{type(e)} <{e}>\n", "error")
-            raise e
\ No newline at end of file
+    try:
+        output, _ = LLM_RESILIENCE.invoke(engine, lambda candidate: candidate, message)
+        return output.content
+    except Exception as e:
+        logger.log(f"Failed to invoke the chain.\n{type(e)} <{e}>\n", "error")
+        raise e
@@ -2,7 +2,7 @@ import json
 import re
 import logging
 from ast import literal_eval
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 import threading
 
 from langchain_core.output_parsers.base import BaseOutputParser
@@ -13,6 +13,27 @@ from langchain_core.exceptions import OutputParserException
 _parser_cache = {}
 _parser_lock = threading.Lock()
 
+def _find_block_end(output: str, opening: str, closing: str, start: int = 0) -> Optional[int]:
+    """
+    Finds the end of the first block delimited by an opening and a closing marker, in a possibly partial output.
+
+    Args:
+        output (str): The output received so far.
+        opening (str): The opening marker.
+        closing (str): The closing marker.
+        start (int): The offset the opening marker is searched from.
+
+    Returns:
+        Optional[int]: The offset right after the closing marker, or None if the block is not closed yet.
+    """
+    opening_index = output.find(opening, start)
+    if opening_index == -1:
+        return None
+    closing_index = output.find(closing, opening_index + len(opening))
+    if closing_index == -1:
+        return None
+    return closing_index + len(closing)
+
 class PythonListOutputParser(BaseOutputParser):
     """Parses output embedded in markdown code blocks containing Python lists."""
     
@@ -40,6 +61,57 @@ class FilterColumnOutput(BaseModel):
     chain_of_thought_reasoning: str = Field(description="One line explanation of why or why not the column information is relevant to the question and the hint.")
     is_column_information_relevant: str = Field(description="Yes or No")
 
+class FilterColumnBatchOutputParser(BaseOutputParser):
+    """Parses batched filter column outputs embedded in markdown code blocks containing a JSON list of verdicts."""
+    
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+
+    def parse(self, output: str) -> List[Dict[str, Any]]:
+        """
+        Parses the output to extract the per column verdicts from markdown.
+        The parsing is lenient: verdicts that cannot be read are left out instead of raising,
+        so that the caller can fall back to single column requests for them.
+
+        Args:
+            output (str): The output string containing a JSON list of verdicts.
+
+        Returns:
+            List[Dict[str, Any]]: The verdicts that could be parsed, each with a column number and a relevance answer
+                normalised to lower case without surrounding whitespace.
+        """
+        logging.debug(f"Parsing output with FilterColumnBatchOutputParser: {output}")
+        if "```json" in output:
+            output = output.split("```json")[1].split("```")[0]
+        output = output.strip()
+        try:
+            parsed_output = json.loads(output)
+        except json.JSONDecodeError:
+            match = re.search(r"\[.*\]", output, re.DOTALL)
+            if match is None:
+                logging.warning(f"Could not parse batched filter column output: {output}")
+                return []
+            try:
+                parsed_output = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                logging.warning(f"Could not parse batched filter column output: {output}")
+                return []
+        if isinstance(parsed_output, dict):
+            parsed_output = parsed_output.get("columns", [])
+        if not isinstance(parsed_output, list):
+            return []
+        verdicts = []
+        for verdict in parsed_output:
+            try:
+                verdicts.append({
+                    "column_number": int(verdict["column_number"]),
+                    "chain_of_thought_reasoning": str(verdict.get("chain_of_thought_reasoning", "")),
+                    "is_column_information_relevant": str(verdict["is_column_information_relevant"]).strip().lower(),
+                })
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+        return verdicts
+
 class SelectTablesOutputParser(BaseOutputParser):
     """Parses select tables outputs embedded in markdown code blocks containing JSON."""
     
@@ -93,6 +165,18 @@ class GenerateCandidateFinetunedMarkDownParser(BaseOutputParser):
             output = output.split("```sql")[1].split("```")[0]
         output = re.sub(r"^\s+", "", output)
         return {"SQL": output}
+
+    def detect_answer_end(self, output: str) -> Optional[int]:
+        """
+        Detects, while the output streams in, whether the part the parser extracts is complete.
+
+        Args:
+            output (str): The output received so far.
+
+        Returns:
+            Optional[int]: The offset after which the output is not needed, or None if the answer is not complete yet.
+        """
+        return _find_block_end(output, "```sql", "```")
     
 class ReviseOutput(BaseModel):
     """Model for SQL revision output."""
@@ -125,6 +209,18 @@ class GenerateCandidateGeminiMarkDownParserCOT(BaseOutputParser):
             )[0]
         query = output.replace("```sql", "").replace("```", "").replace("\n", " ")
         return {"SQL": query, "plan": plan}
+
+    def detect_answer_end(self, output: str) -> Optional[int]:
+        """
+        Detects, while the output streams in, whether the part the parser extracts is complete.
+
+        Args:
+            output (str): The output received so far.
+
+        Returns:
+            Optional[int]: The offset after which the output is not needed, or None if the answer is not complete yet.
+        """
+        return _find_block_end(output, "<FINAL_ANSWER>", "</FINAL_ANSWER>")
     
 class GeminiMarkDownOutputParserCOT(BaseOutputParser):
     """Parses output embedded in markdown code blocks containing SQL queries."""
@@ -152,6 +248,21 @@ class GeminiMarkDownOutputParserCOT(BaseOutputParser):
         query = re.sub(r"^\s+", "", query)
         return {"SQL": query, "plan": plan}
 
+    def detect_answer_end(self, output: str) -> Optional[int]:
+        """
+        Detects, while the output streams in, whether the part the parser extracts is complete.
+
+        Args:
+            output (str): The output received so far.
+
+        Returns:
+            Optional[int]: The offset after which the output is not needed, or None if the answer is not complete yet.
+        """
+        final_answer_index = output.find("My final answer is:")
+        if final_answer_index == -1:
+            return None
+        return _find_block_end(output, "```sql", "```", start=final_answer_index)
+
 class ReviseGeminiOutputParser(BaseOutputParser):
     """Parses output embedded in markdown code blocks containing SQL queries."""
     
@@ -178,6 +289,18 @@ class ReviseGeminiOutputParser(BaseOutputParser):
         query = output.replace("```sql", "").replace("```", "").replace("\n", " ")
         return {"refined_sql_query": query}
 
+    def detect_answer_end(self, output: str) -> Optional[int]:
+        """
+        Detects, while the output streams in, whether the part the parser extracts is complete.
+
+        Args:
+            output (str): The output received so far.
+
+        Returns:
+            Optional[int]: The offset after which the output is not needed, or None if the answer is not complete yet.
+        """
+        return _find_block_end(output, "<FINAL_ANSWER>", "</FINAL_ANSWER>")
+
    
 class ListOutputParser(BaseOutputParser):
     """Parses output embedded in markdown code blocks containing SQL queries."""
@@ -338,6 +461,7 @@ def get_parser(parser_name: str) -> BaseOutputParser:
                 parser_configs = {
                     "python_list_output_parser": PythonListOutputParser,
                     "filter_column": lambda: JsonOutputParser(pydantic_object=FilterColumnOutput),
+                    "filter_column_batch": FilterColumnBatchOutputParser,
                     "select_tables": lambda: JsonOutputParser(pydantic_object=SelectTablesOutputParser),
                     "select_columns": lambda: JsonOutputParser(pydantic_object=ColumnSelectionOutput),
                     "generate_candidate": lambda: JsonOutputParser(pydantic_object=GenerateCandidateOutput),
@@ -0,0 +1,119 @@
+import os
+from collections import OrderedDict, deque
+from threading import Lock
+from typing import Any, Dict, Hashable
+
+from dotenv import load_dotenv
+
+from llm.tokens import count_tokens
+
+load_dotenv(override=True)
+
+PROMPT_PREFIX_TRACKING = os.getenv("PROMPT_PREFIX_TRACKING", "false").lower() == "true"
+# Providers only cache prompt prefixes longer than about 1024 tokens.
+MIN_CACHEABLE_PREFIX_TOKENS = int(os.getenv("MIN_CACHEABLE_PREFIX_TOKENS", 1024))
+
+def common_prefix_length(first: str, second: str) -> int:
+    """
+    Computes the length of the longest common prefix of two strings with a binary search over slice comparisons.
+
+    Args:
+        first (str): The first string.
+        second (str): The second string.
+
+    Returns:
+        int: The number of leading characters the strings share.
+    """
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+class PromptPrefixTracker:
+    """
+    Measures how long a prefix each prompt shares with the previous prompts of the same group (usually a question),
+    which is the part a provider side prompt cache could serve.
+
+    Attributes:
+        window_size (int): The number of previous prompts of a group each prompt is compared with.
+        max_groups (int): The number of groups kept, the least recently used ones are forgotten.
+        min_cacheable_tokens (int): The shared prefix length from which a prompt counts as cache eligible.
+    """
+
+    def __init__(self, window_size: int = 32, max_groups: int = 64, min_cacheable_tokens: int = MIN_CACHEABLE_PREFIX_TOKENS):
+        self.window_size = window_size
+        self.max_groups = max_groups
+        self.min_cacheable_tokens = min_cacheable_tokens
+        self._prompts = OrderedDict()
+        self._stats = {}
+        self._lock = Lock()
+
+    def record(self, group: Hashable, step: str, prompt_text: str) -> Dict[str, int]:
+        """
+        Records a prompt and measures the prefix it shares with the previous prompts of its group.
+
+        Args:
+            group (Hashable): The group the prompt belongs to, e.g. (db_id, question_id).
+            step (str): The step sending the prompt.
+            prompt_text (str): The rendered prompt.
+
+        Returns:
+            Dict[str, int]: The prompt length and its shared prefix length, in characters and tokens.
+        """
+        with self._lock:
+            previous_prompts = list(self._prompts.get(group, ()))
+        shared_chars = max((common_prefix_length(prompt_text, previous) for previous in previous_prompts), default=0)
+        measurement = {
+            "prompt_chars": len(prompt_text),
+            "shared_prefix_chars": shared_chars,
+            "prompt_tokens": count_tokens(prompt_text),
+            "shared_prefix_tokens": count_tokens(prompt_text[:shared_chars]),
+        }
+        with self._lock:
+            if group not in self._prompts:
+                self._prompts[group] = deque(maxlen=self.window_size)
+            self._prompts.move_to_end(group)
+            self._prompts[group].append(prompt_text)
+            while len(self._prompts) > self.max_groups:
+                self._prompts.popitem(last=False)
+
+            step_stats = self._stats.setdefault(step, {
+                "requests": 0,
+                "prompt_tokens": 0,
+                "shared_prefix_tokens": 0,
+                "cache_eligible_requests": 0,
+            })
+            step_stats["requests"] += 1
+            step_stats["prompt_tokens"] += measurement["prompt_tokens"]
+            step_stats["shared_prefix_tokens"] += measurement["shared_prefix_tokens"]
+            if measurement["shared_prefix_tokens"] >= self.min_cacheable_tokens:
+                step_stats["cache_eligible_requests"] += 1
+        return measurement
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the prefix statistics of every step.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per step, the request count, token totals, the share of prompt tokens in a shared prefix
+                and the number of cache eligible requests.
+        """
+        with self._lock:
+            stats = {step: dict(step_stats) for step, step_stats in self._stats.items()}
+        for step_stats in stats.values():
+            step_stats["shared_prefix_ratio"] = step_stats["shared_prefix_tokens"] / step_stats["prompt_tokens"] if step_stats["prompt_tokens"] else 0.0
+        return stats
+
+    def reset(self) -> None:
+        """
+        Forgets every recorded prompt and statistic.
+        """
+        with self._lock:
+            self._prompts.clear()
+            self._stats.clear()
+
+PROMPT_PREFIX_TRACKER = PromptPrefixTracker()
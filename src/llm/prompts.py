@@ -1,29 +1,49 @@
 import os
 import logging
-from typing import Any
-import re
+from functools import lru_cache
+from pathlib import Path
+from string import Formatter
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
 
+from dotenv import load_dotenv
 from langchain.prompts import (
     PromptTemplate,
     HumanMessagePromptTemplate,
     ChatPromptTemplate,
 )
+from langchain_core.pydantic_v1 import PrivateAttr
+
+load_dotenv(override=True)
 
 TEMPLATES_ROOT_PATH = "templates"
+# In dev mode, a template is reloaded when its file changes, so template edits apply without a restart.
+PROMPT_TEMPLATES_DEV_MODE = os.getenv("PROMPT_TEMPLATES_DEV_MODE", "false").lower() == "true"
+
+PROMPT_LAYOUT_SHUFFLED = "shuffled"
+PROMPT_LAYOUT_PREFIX_STABLE = "prefix_stable"
+PROMPT_LAYOUTS = [PROMPT_LAYOUT_SHUFFLED, PROMPT_LAYOUT_PREFIX_STABLE]
+
+# In the prefix stable layout the schema opens the prompt, so every prompt about the same question starts with the same tokens,
+# and the per-sample diversity hint closes it.
+SCHEMA_PREFIX = "【Database Schema】\n{DATABASE_SCHEMA}\n\n**************************\n"
+SCHEMA_REFERENCE = "(The database schema is given at the beginning of this prompt.)"
+DIVERSITY_SUFFIX = "\n{DIVERSITY_HINT}"
 
-def _load_template(template_name: str) -> str:
+def _load_template(template_name: str, root_path: str = TEMPLATES_ROOT_PATH) -> str:
     """
     Loads a template from a file.
 
     Args:
         template_name (str): The name of the template to load.
+        root_path (str): The directory of the template files.
 
     Returns:
         str: The content of the template.
     """
     
     file_name = f"template_{template_name}.txt"
-    template_path = os.path.join(TEMPLATES_ROOT_PATH, file_name)
+    template_path = os.path.join(root_path, file_name)
     
     try:
         with open(template_path, "r") as file:
@@ -37,30 +57,181 @@ def _load_template(template_name: str) -> str:
         logging.error(f"Error loading template {template_name}: {e}")
         raise
 
-def _extract_input_variables(template: str) -> Any:
-        pattern = r'\{(.*?)\}'
-        placeholders = re.findall(pattern, template)
-        return placeholders
+class CompiledTemplate:
+    """
+    Template text split once into literals and placeholders, rendered by joining the pieces.
+    Templates with format specs, conversions or attribute access fall back to `str.format`.
+
+    Attributes:
+        template (str): The template text.
+        input_variables (List[str]): The placeholder names, in order of first appearance.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self._pieces: List[Tuple[str, Optional[str]]] = []
+        self._simple = True
+        input_variables = {}
+        for literal, field_name, format_spec, conversion in Formatter().parse(template):
+            if field_name is not None:
+                if format_spec or conversion or not field_name.isidentifier():
+                    self._simple = False
+                input_variables[field_name] = None
+            self._pieces.append((literal, field_name))
+        self.input_variables = list(input_variables)
+
+    def format(self, **kwargs: Any) -> str:
+        """
+        Renders the template.
+
+        Args:
+            **kwargs: The placeholder values.
+
+        Returns:
+            str: The rendered text.
+
+        Raises:
+            KeyError: If a placeholder has no value.
+        """
+        if not self._simple:
+            return self.template.format(**kwargs)
+        pieces = []
+        for literal, field_name in self._pieces:
+            pieces.append(literal)
+            if field_name is not None:
+                pieces.append(str(kwargs[field_name]))
+        return "".join(pieces)
+
+class CompiledPromptTemplate(PromptTemplate):
+    """PromptTemplate rendering through a CompiledTemplate instead of parsing the template on every call."""
 
-def get_prompt(template_name: str = None, template: str = None) -> ChatPromptTemplate:
+    _compiled: CompiledTemplate = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._compiled = CompiledTemplate(self.template)
+
+    def format(self, **kwargs: Any) -> str:
+        kwargs = self._merge_partial_and_user_variables(**kwargs)
+        return self._compiled.format(**kwargs)
+
+class PromptTemplateRegistry:
+    """
+    In-memory registry of the template files. Templates are read once, and in dev mode reloaded when their file changes.
+    """
+
+    def __init__(self, root_path: str = TEMPLATES_ROOT_PATH, dev_mode: bool = PROMPT_TEMPLATES_DEV_MODE):
+        self.root_path = root_path
+        self.dev_mode = dev_mode
+        self._templates: Dict[str, Tuple[float, str]] = {}
+        self._lock = Lock()
+        self._stats = {"loads": 0, "reloads": 0}
+
+    def _get_path(self, template_name: str) -> str:
+        return os.path.join(self.root_path, f"template_{template_name}.txt")
+
+    def load_all(self) -> None:
+        """
+        Loads every template file of the templates directory.
+        """
+        for template_path in sorted(Path(self.root_path).glob("template_*.txt")):
+            self.get_template(template_path.stem[len("template_"):])
+
+    def get_template(self, template_name: str) -> str:
+        """
+        Retrieves the text of a template, reading its file on first use (and after a change in dev mode).
+
+        Args:
+            template_name (str): The name of the template.
+
+        Returns:
+            str: The content of the template.
+        """
+        entry = self._templates.get(template_name)
+        if entry is not None and not self.dev_mode:
+            return entry[1]
+        template_path = self._get_path(template_name)
+        modified_time = os.path.getmtime(template_path) if self.dev_mode else 0.0
+        if entry is not None and entry[0] == modified_time:
+            return entry[1]
+        template = _load_template(template_name, self.root_path)
+        with self._lock:
+            self._stats["reloads" if entry is not None else "loads"] += 1
+            self._templates[template_name] = (modified_time, template)
+        return template
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the number of template files read.
+
+        Returns:
+            Dict[str, int]: The first loads and the dev mode reloads.
+        """
+        with self._lock:
+            return {**self._stats, "templates": len(self._templates)}
+
+PROMPT_TEMPLATE_REGISTRY = PromptTemplateRegistry()
+
+def apply_prompt_layout(template: str, prompt_layout: str) -> str:
+    """
+    Rearranges a template for a prompt layout.
+    The prefix stable layout moves the database schema to the beginning of the prompt and adds a DIVERSITY_HINT variable at its end.
+    
+    Args:
+        template (str): The content of the template.
+        prompt_layout (str): The prompt layout, one of PROMPT_LAYOUTS.
+        
+    Returns:
+        str: The rearranged template.
+        
+    Raises:
+        ValueError: If the prompt layout is unknown.
+    """
+    if prompt_layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout: {prompt_layout}")
+    if prompt_layout == PROMPT_LAYOUT_SHUFFLED:
+        return template
+    if "{DATABASE_SCHEMA}" in template:
+        template = SCHEMA_PREFIX + template.replace("{DATABASE_SCHEMA}", SCHEMA_REFERENCE)
+    return template + DIVERSITY_SUFFIX
+
+def get_prompt(template_name: str = None, template: str = None, prompt_layout: str = PROMPT_LAYOUT_SHUFFLED) -> ChatPromptTemplate:
     """
     Creates a ChatPromptTemplate from a template.
+    Named templates come from the template registry, and prompts are built once per template text and layout
+    and shared, so they must not be modified.
     
     Args:
         template_name (str): The name of the template to load.
         template (str): The content of the template.
+        prompt_layout (str): The prompt layout, one of PROMPT_LAYOUTS.
         
     Returns:
         ChatPromptTemplate: The prompt
     """
     if template_name: # If template_name is provided, load the template
-        template = _load_template(template_name)
-    input_variables = _extract_input_variables(template)
+        template = PROMPT_TEMPLATE_REGISTRY.get_template(template_name)
+    return _build_prompt(template, prompt_layout)
+
+@lru_cache(maxsize=256)
+def _build_prompt(template: str, prompt_layout: str) -> ChatPromptTemplate:
+    """
+    Builds the prompt of a template text in a layout.
+
+    Args:
+        template (str): The content of the template.
+        prompt_layout (str): The prompt layout, one of PROMPT_LAYOUTS.
+
+    Returns:
+        ChatPromptTemplate: The prompt
+    """
+    template = apply_prompt_layout(template, prompt_layout)
+    compiled_template = CompiledTemplate(template)
     
     human_message_prompt_template = HumanMessagePromptTemplate(
-        prompt=PromptTemplate(
+        prompt=CompiledPromptTemplate(
             template=template,
-            input_variables=input_variables,
+            input_variables=compiled_template.input_variables,
         )
     )
     
@@ -0,0 +1,104 @@
+import os
+import logging
+import importlib
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+GCP_PROJECT = os.getenv("GCP_PROJECT")
+GCP_REGION = os.getenv("GCP_REGION")
+GCP_CREDENTIALS = os.getenv("GCP_CREDENTIALS")
+
+_vertex_ai_initialized = False
+_vertex_ai_lock = Lock()
+
+def initialize_vertex_ai() -> None:
+    """
+    Initializes the Vertex AI SDK with the GCP_* credentials, once per process.
+    Does nothing if the credentials are not configured.
+    """
+    global _vertex_ai_initialized
+    with _vertex_ai_lock:
+        if _vertex_ai_initialized:
+            return
+        _vertex_ai_initialized = True
+        if not (GCP_CREDENTIALS and GCP_PROJECT and GCP_REGION):
+            return
+        from google.oauth2 import service_account
+        from google.cloud import aiplatform
+        import vertexai
+
+        credentials = service_account.Credentials.from_service_account_file(GCP_CREDENTIALS)
+        aiplatform.init(project=GCP_PROJECT, location=GCP_REGION, credentials=credentials)
+        vertexai.init(project=GCP_PROJECT, location=GCP_REGION, credentials=credentials)
+        logging.info(f"Initialized Vertex AI for project {GCP_PROJECT} in {GCP_REGION}")
+
+def get_vertex_safety_settings() -> Dict[Any, Any]:
+    """
+    Builds the Vertex AI safety settings disabling every content filter.
+
+    Returns:
+        Dict[Any, Any]: The block threshold per harm category.
+    """
+    from langchain_google_vertexai import HarmBlockThreshold, HarmCategory
+
+    return {
+        HarmCategory.HARM_CATEGORY_UNSPECIFIED: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    }
+
+class LazyConstructor:
+    """
+    Stand-in for a provider model class in the engine configurations. The provider SDK is imported, and initialized,
+    when the first engine of the provider is constructed, so importing the engine configurations stays cheap.
+
+    Attributes:
+        module_name (str): The module defining the model class.
+        class_name (str): The name of the model class.
+    """
+
+    def __init__(self, module_name: str, class_name: str, initialize: Optional[Callable[[], None]] = None,
+                 default_params: Optional[Callable[[], Dict[str, Any]]] = None):
+        """
+        Args:
+            module_name (str): The module defining the model class.
+            class_name (str): The name of the model class.
+            initialize (Optional[Callable[[], None]]): Initializes the provider SDK before the first construction.
+            default_params (Optional[Callable[[], Dict[str, Any]]]): Builds the parameters passed unless overridden.
+        """
+        self.module_name = module_name
+        self.class_name = class_name
+        self._initialize = initialize
+        self._default_params = default_params
+        self._model_class = None
+        self._lock = Lock()
+
+    def load(self) -> type:
+        """
+        Imports the model class and initializes the provider SDK on first use.
+
+        Returns:
+            type: The model class.
+        """
+        with self._lock:
+            if self._model_class is None:
+                model_class = getattr(importlib.import_module(self.module_name), self.class_name)
+                if self._initialize is not None:
+                    self._initialize()
+                self._model_class = model_class
+            return self._model_class
+
+    def __call__(self, **params: Any) -> Any:
+        model_class = self.load()
+        if self._default_params is not None:
+            params = {**self._default_params(), **params}
+        return model_class(**params)
+
+    def __repr__(self) -> str:
+        return f"LazyConstructor({self.module_name}.{self.class_name})"
@@ -0,0 +1,431 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from llm.engine_configs import ENGINE_CONFIGS
+from llm.engine_registry import ENGINE_REGISTRY
+from llm.response_cache import describe_engine
+
+load_dotenv(override=True)
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 1))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", 60))
+# Hedging duplicates slow requests, so it costs tokens and rate limit budget; it is off unless enabled.
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_HEDGE_MAX_WORKERS = int(os.getenv("LLM_HEDGE_MAX_WORKERS", 128))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", 5))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", 30))
+# Engines tried, in order, when an engine fails. An engine configuration can declare its own `fallbacks` list instead.
+LLM_FALLBACK_ENGINES = [name.strip() for name in os.getenv("LLM_FALLBACK_ENGINES", "").split(",") if name.strip()]
+# Engine used after an empty output when no fallback is configured.
+LLM_EMPTY_OUTPUT_ENGINE = os.getenv("LLM_EMPTY_OUTPUT_ENGINE", "gemini-1.5-flash")
+
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError", "ServiceUnavailable",
+    "ResourceExhausted", "DeadlineExceeded", "TooManyRequests", "TimeoutException", "TimeoutError", "ConnectionError",
+}
+
+class CircuitOpenError(Exception):
+    """Raised when the circuits of an engine and of all its fallback engines are open."""
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Checks whether an error is transient: rate limits, timeouts, connection errors and server errors.
+
+    Args:
+        error (Exception): The error raised by a provider call.
+
+    Returns:
+        bool: True if the call can be retried.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in (408, 429) or status_code >= 500
+    return any(error_class.__name__ in RETRYABLE_ERROR_NAMES for error_class in type(error).__mro__)
+
+def get_backoff_delay(retry: int, base_seconds: float = LLM_BACKOFF_BASE_SECONDS, max_seconds: float = LLM_BACKOFF_MAX_SECONDS) -> float:
+    """
+    Computes an exponential backoff delay with full jitter.
+
+    Args:
+        retry (int): The number of retries already made.
+        base_seconds (float): The delay scale.
+        max_seconds (float): The maximum delay.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** retry)))
+
+class CircuitBreaker:
+    """
+    Circuit breaker of an engine. After `failure_threshold` consecutive transient failures the circuit opens and
+    requests are refused for `cooldown_seconds`; then a single trial request is let through (half-open), whose
+    outcome closes or reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD, cooldown_seconds: float = LLM_CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self._trial_in_flight = False
+        self._lock = Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.OPEN:
+                return False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """
+        Records a transient failure.
+
+        Returns:
+            bool: True if the failure opened the circuit.
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.open_count += 1
+                return True
+            return False
+
+class LLMResilience:
+    """
+    Resilience layer of the provider calls: latency tracking per engine and latency class, hedged duplicate requests
+    for calls slower than the latency percentile observed for their engine and class, jittered exponential backoff for transient errors, a fallback engine chain
+    and a circuit breaker per engine.
+    """
+
+    def __init__(self, engine_configs: Dict[str, Dict[str, Any]] = ENGINE_CONFIGS, max_retries: int = LLM_MAX_RETRIES,
+                 hedging: bool = LLM_HEDGING, hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES, latency_window: int = 200):
+        self.engine_configs = engine_configs
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self._latencies: Dict[Tuple[str, Optional[str]], deque] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._executor = None
+        self._lock = Lock()
+
+    def _get_engine_stats(self, engine_name: str) -> Dict[str, int]:
+        return self._stats.setdefault(engine_name, {
+            "calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "circuit_rejections": 0,
+        })
+
+    def _count(self, engine_name: str, counter: str) -> None:
+        with self._lock:
+            self._get_engine_stats(engine_name)[counter] += 1
+
+    def _get_breaker(self, engine_name: str) -> CircuitBreaker:
+        with self._lock:
+            if engine_name not in self._breakers:
+                self._breakers[engine_name] = CircuitBreaker()
+            return self._breakers[engine_name]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_MAX_WORKERS, thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def record_latency(self, engine_name: str, seconds: float, latency_class: Optional[str] = None) -> None:
+        with self._lock:
+            self._latencies.setdefault((engine_name, latency_class), deque(maxlen=self.latency_window)).append(seconds)
+
+    def get_latency_percentile(self, engine_name: str, percentile: float, latency_class: Optional[str] = None,
+                               all_classes: bool = False) -> Optional[float]:
+        """
+        Computes a percentile of the recent successful call latencies of an engine and latency class.
+
+        Args:
+            engine_name (str): The name of the engine.
+            percentile (float): The percentile, between 0 and 1.
+            latency_class (Optional[str]): The latency class of the calls, e.g. the pipeline step.
+            all_classes (bool): Whether to compute the percentile over the calls of every latency class.
+
+        Returns:
+            Optional[float]: The latency in seconds, or None while fewer than `hedge_min_samples` calls were observed.
+        """
+        with self._lock:
+            latencies = sorted(
+                seconds for (name, call_class), window in self._latencies.items()
+                if name == engine_name and (all_classes or call_class == latency_class) for seconds in window
+            )
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(percentile * len(latencies)))]
+
+    def get_engine_name(self, engine: Any) -> str:
+        return ENGINE_REGISTRY.get_engine_name(engine) or describe_engine(engine)[0]
+
+    def get_fallback_engines(self, engine_name: str) -> List[str]:
+        """
+        Retrieves the engines tried, in order, after an engine fails.
+
+        Args:
+            engine_name (str): The name of the engine.
+
+        Returns:
+            List[str]: The fallback engine names.
+        """
+        fallbacks = self.engine_configs.get(engine_name, {}).get("fallbacks", LLM_FALLBACK_ENGINES)
+        return [name for name in fallbacks if name != engine_name and name in self.engine_configs]
+
+    def get_empty_output_engine(self, engine: Any) -> Any:
+        """
+        Retrieves the engine to use after an engine returned an empty output.
+
+        Args:
+            engine (Any): The engine that returned an empty output.
+
+        Returns:
+            Any: The first fallback engine, or the empty output engine if there is none.
+        """
+        fallbacks = self.get_fallback_engines(self.get_engine_name(engine))
+        return ENGINE_REGISTRY.get_chain(fallbacks[0] if fallbacks else LLM_EMPTY_OUTPUT_ENGINE)
+
+    def _get_candidates(self, engine: Any) -> List[Tuple[str, Optional[Any]]]:
+        engine_name = self.get_engine_name(engine)
+        return [(engine_name, engine)] + [(name, None) for name in self.get_fallback_engines(engine_name)]
+
+    def _invoke_hedged(self, engine_name: str, runnable: Any, runnable_input: Any, latency_class: Optional[str] = None) -> Any:
+        """
+        Invokes a runnable, sending a duplicate request if the first one is slower than the latency percentile
+        of the engine and latency class. Calls of different classes (e.g. short keyword extractions and full schema
+        generations on the same engine) have separate percentiles, so long calls are not hedged against short ones.
+
+        Args:
+            engine_name (str): The name of the engine.
+            runnable (Any): The runnable to invoke.
+            runnable_input (Any): The input of the runnable.
+            latency_class (Optional[str]): The latency class of the call.
+
+        Returns:
+            Any: The output of the first request that succeeds.
+        """
+        threshold = self.get_latency_percentile(engine_name, self.hedge_percentile, latency_class) if self.hedging else None
+        start_time = time.time()
+        if threshold is None:
+            output = runnable.invoke(runnable_input)
+            self.record_latency(engine_name, time.time() - start_time, latency_class)
+            return output
+
+        executor = self._get_executor()
+        primary = executor.submit(runnable.invoke, runnable_input)
+        done, _ = wait([primary], timeout=threshold)
+        if not done:
+            self._count(engine_name, "hedges")
+            logging.info(f"Hedging a request to {engine_name} after {threshold:.1f}s")
+            hedge = executor.submit(runnable.invoke, runnable_input)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count(engine_name, "hedge_wins")
+                        self.record_latency(engine_name, time.time() - start_time, latency_class)
+                        return future.result()
+        output = primary.result()
+        self.record_latency(engine_name, time.time() - start_time, latency_class)
+        return output
+
+    async def _ainvoke_hedged(self, engine_name: str, runnable: Any, runnable_input: Any, latency_class: Optional[str] = None) -> Any:
+        """
+        Coroutine counterpart of `_invoke_hedged`, the slower request is cancelled.
+        """
+        threshold = self.get_latency_percentile(engine_name, self.hedge_percentile, latency_class) if self.hedging else None
+        start_time = time.time()
+        if threshold is None:
+            output = await runnable.ainvoke(runnable_input)
+            self.record_latency(engine_name, time.time() - start_time, latency_class)
+            return output
+
+        primary = asyncio.ensure_future(runnable.ainvoke(runnable_input))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if not done:
+            self._count(engine_name, "hedges")
+            logging.info(f"Hedging a request to {engine_name} after {threshold:.1f}s")
+            hedge = asyncio.ensure_future(runnable.ainvoke(runnable_input))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        for other in pending:
+                            other.cancel()
+                        if task is hedge:
+                            self._count(engine_name, "hedge_wins")
+                        self.record_latency(engine_name, time.time() - start_time, latency_class)
+                        return task.result()
+        output = primary.result()
+        self.record_latency(engine_name, time.time() - start_time, latency_class)
+        return output
+
+    def _handle_failure(self, engine_name: str, breaker: CircuitBreaker, error: Exception, retry: int) -> Optional[float]:
+        """
+        Records a failed call and decides whether to retry it.
+
+        Args:
+            engine_name (str): The name of the engine.
+            breaker (CircuitBreaker): The circuit breaker of the engine.
+            error (Exception): The error of the call.
+            retry (int): The number of retries already made.
+
+        Returns:
+            Optional[float]: The backoff delay before the retry, or None to move on to the next fallback engine.
+
+        Raises:
+            Exception: The error itself if it is not transient.
+        """
+        self._count(engine_name, "failures")
+        if not is_retryable_error(error):
+            # The provider answered, so the engine is healthy even though the request is not.
+            breaker.record_success()
+            raise error
+        if breaker.record_failure():
+            logging.warning(f"Circuit of {engine_name} opened after {breaker.consecutive_failures} consecutive failures")
+        if retry >= self.max_retries or not breaker.allow_request():
+            return None
+        self._count(engine_name, "retries")
+        delay = get_backoff_delay(retry)
+        logging.warning(f"Retrying a request to {engine_name} in {delay:.1f}s after {type(error).__name__}: {error}")
+        return delay
+
+    def invoke(self, engine: Any, build_runnable: Callable[[Any], Any], runnable_input: Any, latency_class: Optional[str] = None) -> Tuple[Any, Any]:
+        """
+        Invokes a runnable built around an engine, with hedging, retries, fallback engines and circuit breaking.
+
+        Args:
+            engine (Any): The engine to call first.
+            build_runnable (Callable[[Any], Any]): Builds the runnable to invoke around an engine, e.g. `prompt | engine`.
+            runnable_input (Any): The input of the runnable.
+            latency_class (Optional[str]): The latency class of the call, e.g. the pipeline step, for the hedging percentile.
+
+        Returns:
+            Tuple[Any, Any]: The output, and the engine that produced it.
+
+        Raises:
+            CircuitOpenError: If the circuits of the engine and of all its fallbacks are open.
+            Exception: The last error if every engine failed, or the first non transient error.
+        """
+        last_error = None
+        for index, (engine_name, candidate) in enumerate(self._get_candidates(engine)):
+            breaker = self._get_breaker(engine_name)
+            if not breaker.allow_request():
+                self._count(engine_name, "circuit_rejections")
+                continue
+            if index > 0:
+                self._count(engine_name, "fallbacks")
+                logging.warning(f"Falling back to {engine_name}")
+            candidate = candidate if candidate is not None else ENGINE_REGISTRY.get_chain(engine_name)
+            runnable = build_runnable(candidate)
+            for retry in range(self.max_retries + 1):
+                self._count(engine_name, "calls")
+                try:
+                    output = self._invoke_hedged(engine_name, runnable, runnable_input, latency_class)
+                    breaker.record_success()
+                    return output, candidate
+                except Exception as e:
+                    last_error = e
+                    delay = self._handle_failure(engine_name, breaker, e, retry)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"The circuits of {self.get_engine_name(engine)} and its fallback engines are open")
+
+    async def ainvoke(self, engine: Any, build_runnable: Callable[[Any], Any], runnable_input: Any, latency_class: Optional[str] = None) -> Tuple[Any, Any]:
+        """
+        Coroutine counterpart of `invoke`.
+        """
+        last_error = None
+        for index, (engine_name, candidate) in enumerate(self._get_candidates(engine)):
+            breaker = self._get_breaker(engine_name)
+            if not breaker.allow_request():
+                self._count(engine_name, "circuit_rejections")
+                continue
+            if index > 0:
+                self._count(engine_name, "fallbacks")
+                logging.warning(f"Falling back to {engine_name}")
+            candidate = candidate if candidate is not None else ENGINE_REGISTRY.get_chain(engine_name)
+            runnable = build_runnable(candidate)
+            for retry in range(self.max_retries + 1):
+                self._count(engine_name, "calls")
+                try:
+                    output = await self._ainvoke_hedged(engine_name, runnable, runnable_input, latency_class)
+                    breaker.record_success()
+                    return output, candidate
+                except Exception as e:
+                    last_error = e
+                    delay = self._handle_failure(engine_name, breaker, e, retry)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"The circuits of {self.get_engine_name(engine)} and its fallback engines are open")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the resilience metrics of every engine.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per engine, the call, failure, retry, hedge and fallback counts,
+                the latency percentiles over all latency classes and the circuit state.
+        """
+        with self._lock:
+            stats = {engine_name: dict(engine_stats) for engine_name, engine_stats in self._stats.items()}
+            breakers = dict(self._breakers)
+        for engine_name, engine_stats in stats.items():
+            engine_stats["p50_seconds"] = self.get_latency_percentile(engine_name, 0.5, all_classes=True)
+            engine_stats["p95_seconds"] = self.get_latency_percentile(engine_name, 0.95, all_classes=True)
+            if engine_name in breakers:
+                engine_stats["circuit_state"] = breakers[engine_name].state
+                engine_stats["circuit_opens"] = breakers[engine_name].open_count
+        return stats
+
+LLM_RESILIENCE = LLMResilience()
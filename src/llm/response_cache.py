@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+LLM_CACHE_MODE_OFF = "off"
+LLM_CACHE_MODE_READ_WRITE = "read-write"
+LLM_CACHE_MODE_REPLAY_ONLY = "replay-only"
+LLM_CACHE_MODES = (LLM_CACHE_MODE_OFF, LLM_CACHE_MODE_READ_WRITE, LLM_CACHE_MODE_REPLAY_ONLY)
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", LLM_CACHE_MODE_OFF).lower()
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./results/llm_response_cache.sqlite")
+# Sampled (temperature > 0) responses are only served from the cache in read-write mode when explicitly asked for,
+# since serving them removes the sampling diversity. They are always recorded, so a replay covers the whole run.
+LLM_CACHE_ALL_TEMPERATURES = os.getenv("LLM_CACHE_ALL_TEMPERATURES", "false").lower() == "true"
+
+class LLMCacheMissError(BaseException):
+    """
+    Raised in replay-only mode when a request has no cached response.
+    Derives from BaseException, like KeyboardInterrupt, so the `except Exception` handlers of the tools
+    do not turn a miss into a failed step and the replay aborts instead.
+    """
+
+def describe_engine(engine: Any) -> Tuple[str, Dict[str, Any], float]:
+    """
+    Describes the model at the end of an LLM chain for the response cache.
+
+    Args:
+        engine (Any): The LLM chain, either a model or a sequence ending with a model.
+
+    Returns:
+        Tuple[str, Dict[str, Any], float]: The model name, the model parameters and the temperature.
+    """
+    model = getattr(engine, "last", engine)
+    try:
+        params = dict(model._identifying_params)
+    except Exception:
+        params = {}
+    engine_name = str(params.get("model_name") or params.get("model") or type(model).__name__)
+    temperature = params.get("temperature", getattr(model, "temperature", 0)) or 0
+    return engine_name, params, float(temperature)
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of raw LLM responses stored in a SQLite file.
+    Responses are keyed by the model name, the model parameters (including the temperature),
+    the hash of the rendered prompt and the sample index.
+
+    Modes:
+        off: The cache is neither read nor written.
+        read-write: Cached responses are returned and new responses of every temperature are stored.
+            Sampled responses are only returned from the cache with cache_all_temperatures.
+        replay-only: Cached responses of every temperature are returned and a miss raises LLMCacheMissError.
+
+    Attributes:
+        path (Path): The path of the SQLite file, created on first use.
+        mode (str): The cache mode.
+        cache_all_temperatures (bool): Whether responses sampled with a non-zero temperature are served from the cache in read-write mode.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, mode: str = LLM_CACHE_MODE, cache_all_temperatures: bool = LLM_CACHE_ALL_TEMPERATURES):
+        if mode not in LLM_CACHE_MODES:
+            raise ValueError(f"Invalid LLM cache mode: {mode}, expected one of {LLM_CACHE_MODES}")
+        self.path = Path(path)
+        self.mode = mode
+        self.cache_all_temperatures = cache_all_temperatures
+        self._connection = None
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != LLM_CACHE_MODE_OFF
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Opens the SQLite file on first use. Must be called with the lock held.
+
+        Returns:
+            sqlite3.Connection: The connection shared by all threads.
+        """
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path), check_same_thread=False, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, engine_name TEXT, params TEXT, temperature REAL, "
+                "sample_index INTEGER, response TEXT, created_at REAL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def should_lookup(self, temperature: float) -> bool:
+        """
+        Checks whether requests at a temperature are looked up in the cache. Every response is recorded in read-write mode.
+
+        Args:
+            temperature (float): The sampling temperature.
+
+        Returns:
+            bool: True if cached responses are served for the temperature.
+        """
+        if not self.enabled:
+            return False
+        # Replay runs never reach the provider, so every request is looked up.
+        return temperature == 0 or self.cache_all_temperatures or self.mode == LLM_CACHE_MODE_REPLAY_ONLY
+
+    @staticmethod
+    def make_key(engine_name: str, params: Dict[str, Any], prompt_text: str, sample_index: int) -> str:
+        """
+        Builds the cache key of a request.
+
+        Args:
+            engine_name (str): The model name.
+            params (Dict[str, Any]): The model parameters, including the temperature.
+            prompt_text (str): The rendered prompt.
+            sample_index (int): The index of the sample among the samples of the same request.
+
+        Returns:
+            str: The cache key.
+        """
+        prompt_hash = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+        key_material = json.dumps([engine_name, params, prompt_hash, sample_index], sort_keys=True, default=str)
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieves a cached response.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss in read-write mode.
+
+        Raises:
+            LLMCacheMissError: On a miss in replay-only mode.
+        """
+        with self._lock:
+            row = self._get_connection().execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            self._stats["hits" if row is not None else "misses"] += 1
+        if row is not None:
+            return row[0]
+        if self.mode == LLM_CACHE_MODE_REPLAY_ONLY:
+            raise LLMCacheMissError(f"No cached response for key {key} in {self.path}")
+        return None
+
+    def put(self, key: str, engine_name: str, params: Dict[str, Any], temperature: float, sample_index: int, response: str) -> None:
+        """
+        Stores a response, in read-write mode only.
+
+        Args:
+            key (str): The cache key.
+            engine_name (str): The model name.
+            params (Dict[str, Any]): The model parameters.
+            temperature (float): The sampling temperature.
+            sample_index (int): The index of the sample.
+            response (str): The raw response text.
+        """
+        if self.mode != LLM_CACHE_MODE_READ_WRITE:
+            return
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, engine_name, json.dumps(params, sort_keys=True, default=str), temperature, sample_index, response, time.time())
+            )
+            connection.commit()
+            self._stats["writes"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and write counts.
+
+        Returns:
+            Dict[str, int]: The cache statistics.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        """
+        Closes the SQLite connection.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+LLM_RESPONSE_CACHE = LLMResponseCache()
+if LLM_RESPONSE_CACHE.enabled:
+    logging.info(f"LLM response cache in {LLM_RESPONSE_CACHE.mode} mode at {LLM_RESPONSE_CACHE.path}")
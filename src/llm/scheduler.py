@@ -0,0 +1,321 @@
+import os
+import time
+import asyncio
+import heapq
+import logging
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Thread
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from llm.engine_configs import ENGINE_CONFIGS
+
+load_dotenv(override=True)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+LLM_SCHEDULER_MAX_WORKERS = int(os.getenv("LLM_SCHEDULER_MAX_WORKERS", 64))
+LLM_MAX_CONCURRENCY_PER_ENGINE = int(os.getenv("LLM_MAX_CONCURRENCY_PER_ENGINE", 16))
+# Zero disables the corresponding budget.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+
+RATE_WINDOW_SECONDS = 60.0
+
+@dataclass
+class EngineLimits:
+    """
+    Request limits of an engine. Zero disables a budget.
+
+    Attributes:
+        max_concurrency (int): The maximum number of requests in flight.
+        requests_per_minute (int): The maximum number of requests started per minute.
+        tokens_per_minute (int): The maximum number of prompt tokens sent per minute.
+    """
+    max_concurrency: int = LLM_MAX_CONCURRENCY_PER_ENGINE
+    requests_per_minute: int = LLM_REQUESTS_PER_MINUTE
+    tokens_per_minute: int = LLM_TOKENS_PER_MINUTE
+
+@dataclass
+class _ScheduledRequest:
+    engine_name: str
+    # None for a coroutine request, which only waits for its admission
+    function: Optional[Callable[..., Any]]
+    kwargs: Dict[str, Any]
+    estimated_tokens: int
+    future: Future
+    submitted_at: float
+
+class LLMRequestScheduler:
+    """
+    Process-wide scheduler of LLM requests.
+    Requests are queued by priority class (interactive before batch, first in first out within a class), and are
+    started on a shared bounded thread pool once their engine is below its concurrency limit and its requests-per-minute
+    and tokens-per-minute budgets. Coroutine requests wait in the same queue with `admit` and run on their own event loop,
+    so threads and coroutines share the limits of an engine. An engine's limits come from the `rate_limits` entry of its engine configuration,
+    falling back to the LLM_* environment defaults.
+    """
+
+    def __init__(self, max_workers: int = LLM_SCHEDULER_MAX_WORKERS, engine_configs: Dict[str, Dict[str, Any]] = ENGINE_CONFIGS):
+        self.max_workers = max_workers
+        self.engine_configs = engine_configs
+        self._engine_limits: Dict[str, EngineLimits] = {}
+        self._pending: List[Tuple[int, int, _ScheduledRequest]] = []
+        self._sequence = itertools.count()
+        self._running: Dict[str, int] = {}
+        self._running_threads = 0
+        self._usage: Dict[str, deque] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._condition = Condition()
+        self._executor = None
+        self._dispatcher = None
+
+    def get_limits(self, engine_name: str) -> EngineLimits:
+        """
+        Retrieves the limits of an engine.
+
+        Args:
+            engine_name (str): The name of the engine.
+
+        Returns:
+            EngineLimits: The limits of the engine.
+        """
+        limits = self._engine_limits.get(engine_name)
+        if limits is None:
+            rate_limits = self.engine_configs.get(engine_name, {}).get("rate_limits", {})
+            limits = EngineLimits(**rate_limits)
+            self._engine_limits[engine_name] = limits
+        return limits
+
+    def set_limits(self, engine_name: str, limits: EngineLimits) -> None:
+        """
+        Overrides the limits of an engine.
+
+        Args:
+            engine_name (str): The name of the engine.
+            limits (EngineLimits): The new limits.
+        """
+        with self._condition:
+            self._engine_limits[engine_name] = limits
+            self._condition.notify_all()
+
+    def needs_token_estimate(self, engine_name: str) -> bool:
+        """
+        Checks whether the requests of an engine need a token estimate, i.e. whether it has a tokens-per-minute budget.
+
+        Args:
+            engine_name (str): The name of the engine.
+
+        Returns:
+            bool: True if the engine has a tokens-per-minute budget.
+        """
+        return self.get_limits(engine_name).tokens_per_minute > 0
+
+    def submit(self, engine_name: str, function: Callable[..., Any], kwargs: Dict[str, Any],
+               priority: int = PRIORITY_BATCH, estimated_tokens: int = 0) -> Future:
+        """
+        Queues a request.
+
+        Args:
+            engine_name (str): The name of the engine the request is sent to.
+            function (Callable[..., Any]): The function sending the request.
+            kwargs (Dict[str, Any]): The keyword arguments of the function.
+            priority (int): The priority class, lower runs first.
+            estimated_tokens (int): The estimated prompt tokens, counted against the tokens-per-minute budget.
+
+        Returns:
+            Future: The future of the function result.
+        """
+        future = Future()
+        self._enqueue(_ScheduledRequest(engine_name, function, kwargs, estimated_tokens, future, time.time()), priority)
+        return future
+
+    @asynccontextmanager
+    async def admit(self, engine_name: str, priority: int = PRIORITY_BATCH, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Waits until a coroutine request is admitted under the limits and budgets of its engine, and holds its slot
+        while the context is open. The request is queued with the submitted requests, by priority class.
+
+        Args:
+            engine_name (str): The name of the engine the request is sent to.
+            priority (int): The priority class, lower runs first.
+            estimated_tokens (int): The estimated prompt tokens, counted against the tokens-per-minute budget.
+        """
+        future = Future()
+        self._enqueue(_ScheduledRequest(engine_name, None, {}, estimated_tokens, future, time.time()), priority)
+        try:
+            await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A request that could not be withdrawn was admitted, so its slot is released.
+            if not future.cancel():
+                self._finish(engine_name, failed=True, thread=False)
+            raise
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._finish(engine_name, failed, thread=False)
+
+    def _enqueue(self, request: _ScheduledRequest, priority: int) -> None:
+        with self._condition:
+            self._start()
+            heapq.heappush(self._pending, (priority, next(self._sequence), request))
+            stats = self._get_engine_stats(request.engine_name)
+            stats["submitted"] += 1
+            queued = sum(1 for _, _, pending in self._pending if pending.engine_name == request.engine_name)
+            stats["max_queue_depth"] = max(stats["max_queue_depth"], queued)
+            self._condition.notify_all()
+
+    def _start(self) -> None:
+        """
+        Starts the thread pool and the dispatcher thread on first use. Must be called with the condition held.
+        """
+        if self._dispatcher is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm")
+            self._dispatcher = Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True)
+            self._dispatcher.start()
+
+    def _get_engine_stats(self, engine_name: str) -> Dict[str, float]:
+        return self._stats.setdefault(engine_name, {
+            "submitted": 0,
+            "started": 0,
+            "completed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+        })
+
+    def _get_admission_delay(self, engine_name: str, estimated_tokens: int, now: float) -> Optional[float]:
+        """
+        Checks whether a request of an engine can start now. Must be called with the condition held.
+
+        Args:
+            engine_name (str): The name of the engine.
+            estimated_tokens (int): The estimated prompt tokens of the request.
+            now (float): The current time.
+
+        Returns:
+            Optional[float]: 0 if the request can start, the seconds until a rate budget frees up,
+                or None if the engine is at its concurrency limit.
+        """
+        limits = self.get_limits(engine_name)
+        if limits.max_concurrency > 0 and self._running.get(engine_name, 0) >= limits.max_concurrency:
+            return None
+        usage = self._usage.setdefault(engine_name, deque())
+        while usage and usage[0][0] <= now - RATE_WINDOW_SECONDS:
+            usage.popleft()
+        if not usage:
+            return 0.0
+        next_expiry = usage[0][0] + RATE_WINDOW_SECONDS - now
+        if limits.requests_per_minute > 0 and len(usage) >= limits.requests_per_minute:
+            return max(next_expiry, 0.001)
+        if limits.tokens_per_minute > 0 and sum(tokens for _, tokens in usage) + estimated_tokens > limits.tokens_per_minute:
+            return max(next_expiry, 0.001)
+        return 0.0
+
+    def _pop_ready_request(self) -> Tuple[Optional[_ScheduledRequest], Optional[float]]:
+        """
+        Removes the first queued request that can start. Must be called with the condition held.
+
+        Returns:
+            Tuple[Optional[_ScheduledRequest], Optional[float]]: The request, or None with the seconds to wait
+                before checking again (None to wait for a notification).
+        """
+        # Coroutine requests do not take a thread, so they are still admitted when every thread is busy.
+        threads_available = self._running_threads < self.max_workers
+        now = time.time()
+        blocked_engines = set()
+        wait = None
+        for entry in sorted(self._pending):
+            request = entry[2]
+            if request.engine_name in blocked_engines or (request.function is not None and not threads_available):
+                continue
+            delay = self._get_admission_delay(request.engine_name, request.estimated_tokens, now)
+            if delay == 0.0:
+                self._pending.remove(entry)
+                heapq.heapify(self._pending)
+                return request, None
+            blocked_engines.add(request.engine_name)
+            if delay is not None:
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._condition:
+                request, wait = self._pop_ready_request()
+                while request is None:
+                    self._condition.wait(timeout=wait)
+                    request, wait = self._pop_ready_request()
+                if request.function is None and not request.future.set_running_or_notify_cancel():
+                    # The coroutine waiting for the admission was cancelled.
+                    continue
+                now = time.time()
+                self._running[request.engine_name] = self._running.get(request.engine_name, 0) + 1
+                self._usage.setdefault(request.engine_name, deque()).append((now, request.estimated_tokens))
+                stats = self._get_engine_stats(request.engine_name)
+                stats["started"] += 1
+                stats["total_wait_seconds"] += now - request.submitted_at
+                if request.function is None:
+                    request.future.set_result(None)
+                    continue
+                self._running_threads += 1
+            self._executor.submit(self._execute, request)
+
+    def _execute(self, request: _ScheduledRequest) -> None:
+        failed = False
+        try:
+            if request.future.set_running_or_notify_cancel():
+                try:
+                    request.future.set_result(request.function(**request.kwargs))
+                except BaseException as e:
+                    failed = True
+                    request.future.set_exception(e)
+        finally:
+            self._finish(request.engine_name, failed, thread=True)
+
+    def _finish(self, engine_name: str, failed: bool, thread: bool) -> None:
+        """
+        Releases the slot of a finished request.
+
+        Args:
+            engine_name (str): The name of the engine.
+            failed (bool): Whether the request failed.
+            thread (bool): Whether the request ran on the thread pool.
+        """
+        with self._condition:
+            self._running[engine_name] -= 1
+            if thread:
+                self._running_threads -= 1
+            stats = self._get_engine_stats(engine_name)
+            stats["failed" if failed else "completed"] += 1
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the queue metrics of every engine.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per engine, the queued and running requests, the request counts,
+                the maximum queue depth and the average queue wait in seconds.
+        """
+        with self._condition:
+            stats = {engine_name: dict(engine_stats) for engine_name, engine_stats in self._stats.items()}
+            for engine_name, engine_stats in stats.items():
+                engine_stats["queued"] = sum(1 for _, _, pending in self._pending if pending.engine_name == engine_name)
+                engine_stats["running"] = self._running.get(engine_name, 0)
+                engine_stats["average_wait_seconds"] = engine_stats["total_wait_seconds"] / engine_stats["started"] if engine_stats["started"] else 0.0
+        return stats
+
+LLM_REQUEST_SCHEDULER = LLMRequestScheduler()
+if LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE:
+    logging.info(f"LLM request budgets per engine: {LLM_REQUESTS_PER_MINUTE} requests and {LLM_TOKENS_PER_MINUTE} tokens per minute")
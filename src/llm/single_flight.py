@@ -0,0 +1,107 @@
+import os
+import asyncio
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader) runs the call,
+    and the callers arriving while it is in flight (the followers) wait for and share its result or error.
+    Threads and coroutines can be leaders and followers of the same call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = Lock()
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Joins the in-flight call of a key, or registers a new one.
+
+        Args:
+            key (Hashable): The key of the call.
+
+        Returns:
+            Tuple[Future, bool]: The future of the call, and whether the caller is its leader.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["followers"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def _leave(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Runs a call, or waits for the identical call already in flight.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            function (Callable[[], Any]): The call.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = function()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    async def ado(self, key: Hashable, coroutine_function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Coroutine counterpart of `do`.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            coroutine_function (Callable[[], Awaitable[Any]]): Creates the coroutine of the call.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await coroutine_function()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._leave(key)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the number of calls run and of calls coalesced into them.
+
+        Returns:
+            Dict[str, int]: The single-flight statistics.
+        """
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls)}
+
+LLM_SINGLE_FLIGHT_GROUP = SingleFlight()
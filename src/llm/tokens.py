@@ -0,0 +1,48 @@
+import logging
+from threading import Lock
+from typing import Optional
+
+TOKEN_ENCODING_NAME = "cl100k_base"
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = Lock()
+
+def _get_encoding() -> Optional[object]:
+    """
+    Loads the tiktoken encoding once per process.
+
+    Returns:
+        Optional[object]: The encoding, or None if tiktoken or its encoding files are not available.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING_NAME)
+            except Exception as e:
+                logging.warning(f"Could not load the {TOKEN_ENCODING_NAME} encoding, estimating token counts from characters: {e}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text with the tiktoken encoding, falling back to a character based estimate.
+
+    Args:
+        text (str): The text to count the tokens of.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 import logging
 
 from database_utils.db_values.preprocess import make_db_lsh
-from database_utils.db_catalog.preprocess import make_db_context_vec_db
+from database_utils.db_catalog.preprocess import make_db_context_vec_db, export_context_flat_index
 
 load_dotenv(override=True)
 NUM_WORKERS = 1
@@ -22,6 +22,10 @@ def worker_initializer(db_id: str, args: argparse.Namespace):
         args (argparse.Namespace): The command line arguments.
     """
     db_directory_path = f"{args.db_root_directory}/{db_id}"
+    if args.context_index_only:
+        logging.info(f"Exporting context flat index for {db_id}")
+        export_context_flat_index(db_directory_path)
+        return
     logging.info(f"Creating LSH for {db_id}")
     make_db_lsh(db_directory_path, 
                 signature_size=args.signature_size, 
@@ -44,6 +48,7 @@ if __name__ == '__main__':
     args_parser.add_argument('--db_id', type=str, default='all', help="Database ID or 'all' to process all databases")
     args_parser.add_argument('--verbose', type=bool, default=True, help="Enable verbose logging")
     args_parser.add_argument('--use_value_description', type=bool, default=True, help="Include value descriptions")
+    args_parser.add_argument('--context_index_only', action='store_true', help="Only export the context flat index from an existing context vector database")
 
     args = args_parser.parse_args()
 
@@ -1,22 +1,29 @@
 import os
+import copy
+import json
+import hashlib
 import socket
 import pickle
 from threading import Lock
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
-from typing import Callable, Dict, List, Any
+from typing import Callable, Dict, List, Any, Set, Optional, Tuple
 import time
 
 from database_utils.schema import DatabaseSchema
 from database_utils.schema_generator import DatabaseSchemaGenerator
+from database_utils.schema_compressor import SchemaCompressor
+from database_utils.schema_snapshot import get_description_signature, update_schema_snapshot
 from database_utils.execution import execute_sql, compare_sqls, validate_sql_query, aggregate_sqls, get_execution_status, subprocess_sql_executor
 from database_utils.db_info import get_db_all_tables, get_table_all_columns, get_db_schema
 from database_utils.sql_parser import get_sql_tables, get_sql_columns_dict, get_sql_condition_literals
-from database_utils.db_values.search import query_lsh
-from database_utils.db_catalog.search import query_vector_db
+from database_utils.db_values.search import query_lsh, build_value_ngram_index
+from database_utils.db_catalog.search import query_vector_db, query_flat_index
 from database_utils.db_catalog.preprocess import EMBEDDING_FUNCTION
 from database_utils.db_catalog.csv_utils import load_tables_description
+from runner.retrieval_cache import RetrievalCache
+from llm.tokens import count_tokens
 
 load_dotenv(override=True)
 DB_ROOT_PATH = Path(os.getenv("DB_ROOT_PATH"))
@@ -24,6 +31,9 @@ DB_ROOT_PATH = Path(os.getenv("DB_ROOT_PATH"))
 INDEX_SERVER_HOST = os.getenv("INDEX_SERVER_HOST")
 INDEX_SERVER_PORT = int(os.getenv("INDEX_SERVER_PORT"))
 
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", 4096))
+SCHEMA_STRING_CACHE_SIZE = int(os.getenv("SCHEMA_STRING_CACHE_SIZE", 256))
+
 class DatabaseManager:
     """
     A singleton class to manage database operations including schema generation, 
@@ -31,6 +41,9 @@ class DatabaseManager:
     """
     _instance = None
     _lock = Lock()
+    # Shared by every session of the process and kept across database switches
+    retrieval_cache = RetrievalCache(max_size=RETRIEVAL_CACHE_SIZE)
+    schema_string_cache = RetrievalCache(max_size=SCHEMA_STRING_CACHE_SIZE)
 
     def __new__(cls, db_mode=None, db_id=None):
         if (db_mode is not None) and (db_id is not None):
@@ -59,13 +72,60 @@ class DatabaseManager:
         self._set_paths()
         self.lsh = None
         self.minhashes = None
+        self.value_ngram_index = {}
         self.vector_db = None
+        self.context_index = None
+        self.index_versions = {}
 
     def _set_paths(self):
         """Sets the paths for the database files and directories."""
         self.db_path = DB_ROOT_PATH / f"{self.db_mode}_databases" / self.db_id / f"{self.db_id}.sqlite"
         self.db_directory_path = DB_ROOT_PATH / f"{self.db_mode}_databases" / self.db_id
 
+    def _get_index_path(self, index_name: str) -> Path:
+        """Returns the file whose modification identifies a rebuild of the given preprocessed index."""
+        if index_name == "lsh":
+            return self.db_directory_path / "preprocessed" / f"{self.db_id}_lsh.pkl"
+        elif index_name == "context_index":
+            return self.db_directory_path / "preprocessed" / f"{self.db_id}_context_index.pkl"
+        elif index_name == "vector_db":
+            return self.db_directory_path / "context_vector_db" / "chroma.sqlite3"
+        elif index_name == "database":
+            return self.db_path
+        raise ValueError(f"Unknown index: {index_name}")
+
+    def get_index_version(self, index_name: str) -> str:
+        """
+        Returns the current version of a preprocessed index, unloading it and invalidating its cached
+        retrieval results if the index has been rebuilt since it was last seen.
+
+        Args:
+            index_name (str): The index name ('lsh', 'context_index' or 'vector_db').
+
+        Returns:
+            str: The index version, derived from the file's modification time and size.
+        """
+        try:
+            stat = self._get_index_path(index_name).stat()
+            version = f"{stat.st_mtime_ns}-{stat.st_size}"
+        except OSError:
+            version = "missing"
+        with self._lock:
+            previous_version = self.index_versions.get(index_name)
+            if previous_version is not None and previous_version != version:
+                if index_name == "lsh":
+                    self.lsh = None
+                    self.minhashes = None
+                    self.value_ngram_index = {}
+                elif index_name == "context_index":
+                    self.context_index = None
+                elif index_name == "vector_db":
+                    self.vector_db = None
+                self.retrieval_cache.invalidate(self.db_id, index_name)
+                self.schema_string_cache.invalidate(self.db_id, index_name)
+            self.index_versions[index_name] = version
+        return version
+
     def set_lsh(self) -> str:
         """Sets the LSH and minhashes attributes by loading from pickle files."""
         with self._lock:
@@ -88,6 +148,23 @@ class DatabaseManager:
             else:
                 return "success"
 
+    def get_value_ngram_index(self, n_gram: int = 3) -> Set[str]:
+        """
+        Returns the set of character n-grams present in the LSH-indexed values, building it on first use.
+
+        Args:
+            n_gram (int, optional): The n-gram size. Defaults to 3.
+
+        Returns:
+            Set[str]: The set of n-grams present in at least one indexed value.
+        """
+        if self.set_lsh() != "success":
+            raise Exception(f"Error loading LSH for {self.db_id}")
+        with self._lock:
+            if n_gram not in self.value_ngram_index:
+                self.value_ngram_index[n_gram] = build_value_ngram_index(self.minhashes, n_gram)
+            return self.value_ngram_index[n_gram]
+
     def set_vector_db(self) -> str:
         """Sets the vector_db attribute by loading from the context vector database."""
         if self.vector_db is None:
@@ -104,6 +181,23 @@ class DatabaseManager:
         else:
             return "success"
 
+    def set_context_index(self) -> str:
+        """Sets the context_index attribute by loading the flat index exported from the context vector database."""
+        with self._lock:
+            if self.context_index is None:
+                try:
+                    with (self.db_directory_path / "preprocessed" / f"{self.db_id}_context_index.pkl").open("rb") as file:
+                        self.context_index = pickle.load(file)
+                    return "success"
+                except Exception as e:
+                    self.context_index = "error"
+                    print(f"Error loading context index for {self.db_id}: {e}")
+                    return "error"
+            elif self.context_index == "error":
+                return "error"
+            else:
+                return "success"
+
     def query_lsh(self, keyword: str, signature_size: int = 100, n_gram: int = 3, top_n: int = 10) -> Dict[str, List[str]]:
         """
         Queries the LSH for similar values to the given keyword.
@@ -130,9 +224,15 @@ class DatabaseManager:
         #         return receive_data_in_chunks(s)
         # except ConnectionRefusedError:
         #     print(f"Connection refused for {self.db_id}")
+        cache_key = (self.db_id, "lsh", self.get_index_version("lsh"), keyword, signature_size, n_gram, top_n)
+        cached_result = self.retrieval_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
         lsh_status = self.set_lsh()
         if lsh_status == "success":
-            return query_lsh(self.lsh, self.minhashes, keyword, signature_size, n_gram, top_n)
+            result = query_lsh(self.lsh, self.minhashes, keyword, signature_size, n_gram, top_n)
+            self.retrieval_cache.put(cache_key, result)
+            return result
         else:
             raise Exception(f"Error loading LSH for {self.db_id}")
         # except Exception as e:
@@ -163,20 +263,58 @@ class DatabaseManager:
         #         }))
         #         return receive_data_in_chunks(s)
         # except ConnectionRefusedError:
+        cache_key = (self.db_id, "vector_db", self.get_index_version("vector_db"), keyword, top_k)
+        cached_result = self.retrieval_cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
         vector_db_status = self.set_vector_db()
         if vector_db_status == "success":
-            return query_vector_db(self.vector_db, keyword, top_k)
+            result = query_vector_db(self.vector_db, keyword, top_k)
+            self.retrieval_cache.put(cache_key, result)
+            return result
         else:
             raise Exception(f"Error loading Vector DB for {self.db_id}")
         # except Exception as e:
         #     raise Exception(f"Error querying Vector DB for {self.db_id}: {e}")
 
+    def query_vector_db_batch(self, queries: List[str], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Queries the context catalog for a batch of queries with a single embedding call.
+        Falls back to one vector database query per string if the flat index has not been exported.
+
+        Args:
+            queries (List[str]): The query strings to search for.
+            top_k (int): The number of top results to return per query.
+
+        Returns:
+            List[Dict[str, Any]]: The dictionaries of similar values, in the order of the queries.
+        """
+        if not queries:
+            return []
+        index_version = self.get_index_version("context_index")
+        if self.set_context_index() != "success":
+            return [self.query_vector_db(query, top_k) for query in queries]
+        
+        cache_keys = [(self.db_id, "context_index", index_version, query, top_k) for query in queries]
+        results = [self.retrieval_cache.get(cache_key) for cache_key in cache_keys]
+        missing_queries = list(dict.fromkeys(query for query, result in zip(queries, results) if result is None))
+        if missing_queries:
+            query_embeddings = EMBEDDING_FUNCTION.embed_documents(missing_queries)
+            missing_results = dict(zip(missing_queries, query_flat_index(self.context_index["matrix"], self.context_index["metadatas"], query_embeddings, top_k)))
+            for i, (query, cache_key) in enumerate(zip(queries, cache_keys)):
+                if results[i] is None:
+                    self.retrieval_cache.put(cache_key, missing_results[query])
+                    results[i] = copy.deepcopy(missing_results[query])
+        return results
+
     def get_column_profiles(self, schema_with_examples: Dict[str, Dict[str, List[str]]],
                             use_value_description: bool, with_keys: bool, 
                             with_references: bool,
                             tentative_schema: Dict[str, List[str]] = None) -> Dict[str, Dict[str, str]]:
         """
         Generates column profiles for the schema.
+        The question independent parts of the profiles are precomputed once per database and stored in the schema snapshot, 
+        only the retrieved example values are merged in for each question.
 
         Args:
             schema_with_examples (Dict[str, List[str]]): Schema with example values.
@@ -187,61 +325,190 @@ class DatabaseManager:
         Returns:
             Dict[str, Dict[str, str]]: The dictionary of column profiles.
         """
+        cached_profiles = self._get_cached_column_profiles(use_value_description)
+        full_schema = DatabaseSchemaGenerator.CACHED_DB_SCHEMA[self.db_id]
+        selected_schema = full_schema.subselect_schema(DatabaseSchema.from_schema_dict(tentative_schema if tentative_schema else self.get_db_schema()))
+        retrieved_examples = DatabaseSchema.from_schema_dict_with_examples(schema_with_examples)
+
+        column_profiles = {}
+        for table_name, table_schema in selected_schema.tables.items():
+            column_profiles[table_name] = {}
+            for column_name in table_schema.columns:
+                profile_parts = cached_profiles[(table_name, column_name)]
+                if not with_keys and profile_parts["is_key"]:
+                    continue
+                examples = profile_parts["examples"]
+                retrieved_column_info = retrieved_examples.get_column_info(table_name, column_name)
+                if retrieved_column_info and retrieved_column_info.examples and not profile_parts["sampled_examples"]:
+                    examples = retrieved_column_info.examples
+                column_profiles[table_name][column_name] = DatabaseSchemaGenerator.join_column_profile(profile_parts, examples, with_references)
+        return column_profiles
+
+    def _get_cached_column_profiles(self, use_value_description: bool) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Retrieves the precomputed column profile parts of the database, computing them and saving them 
+        to the schema snapshot if they are missing or the description files changed.
+
+        Args:
+            use_value_description (bool): Whether to use value descriptions.
+
+        Returns:
+            Dict[tuple, Dict[str, Any]]: The profile parts of each (table, column).
+        """
+        if self.db_id not in DatabaseSchemaGenerator.CACHED_DB_SCHEMA:
+            DatabaseSchemaGenerator._load_schema_into_cache(db_id=self.db_id, db_path=self.db_path)
+        db_profiles = DatabaseSchemaGenerator.CACHED_COLUMN_PROFILES.setdefault(self.db_id, {})
+        description_signature = get_description_signature(self.db_directory_path)
+        cached_profiles = db_profiles.get(use_value_description)
+        if cached_profiles is not None and cached_profiles["description_signature"] == description_signature:
+            return cached_profiles["profiles"]
+
         schema_with_descriptions = load_tables_description(self.db_directory_path, use_value_description)
         database_schema_generator = DatabaseSchemaGenerator(
-            tentative_schema=DatabaseSchema.from_schema_dict(tentative_schema if tentative_schema else self.get_db_schema()),
-            schema_with_examples=DatabaseSchema.from_schema_dict_with_examples(schema_with_examples),
+            tentative_schema=DatabaseSchema.from_schema_dict(self.get_db_schema()),
             schema_with_descriptions=DatabaseSchema.from_schema_dict_with_descriptions(schema_with_descriptions),
             db_id=self.db_id,
             db_path=self.db_path,
             add_examples=True,
         )
-        
-        column_profiles = database_schema_generator.get_column_profiles(with_keys, with_references)
-        return column_profiles
+        profiles = {}
+        for table_name, table_schema in database_schema_generator.schema_structure.tables.items():
+            for column_name, column_info in table_schema.columns.items():
+                profile_parts = database_schema_generator.get_column_profile_parts(table_name, column_name, column_info)
+                profile_parts["sampled_examples"] = database_schema_generator.is_example_sampled(table_name, column_name)
+                profiles[(table_name, column_name)] = profile_parts
+        db_profiles[use_value_description] = {"description_signature": description_signature, "profiles": profiles}
+        update_schema_snapshot(self.db_path, column_profiles={use_value_description: db_profiles[use_value_description]})
+        return profiles
 
     def get_database_schema_string(self, tentative_schema: Dict[str, List[str]], 
                                    schema_with_examples: Dict[str, List[str]], 
                                    schema_with_descriptions: Dict[str, Dict[str, Dict[str, Any]]], 
-                                   include_value_description: bool) -> str:
+                                   include_value_description: bool,
+                                   shuffle_seed: Optional[int] = None,
+                                   shuffle: bool = True) -> str:
         """
         Generates a schema string for the database.
+        Strings rendered with a shuffle seed, or without shuffling, are deterministic and memoized in an LRU cache.
 
         Args:
             tentative_schema (Dict[str, List[str]]): The tentative schema.
             schema_with_examples (Dict[str, List[str]]): Schema with example values.
             schema_with_descriptions (Dict[str, Dict[str, Dict[str, Any]]]): Schema with descriptions.
             include_value_description (bool): Whether to include value descriptions.
+            shuffle_seed (Optional[int]): Seed for the table and column shuffles. Defaults to a fresh, uncached shuffle.
+            shuffle (bool): Whether to shuffle the tables and columns. Without shuffling, tables and columns keep the database order.
 
         Returns:
             str: The generated schema string.
         """
-        schema_generator = DatabaseSchemaGenerator(
+        shuffle_seed = shuffle_seed if shuffle else None
+        cache_key = None
+        if shuffle_seed is not None or not shuffle:
+            cache_key = (self.db_id, "database", self.get_index_version("database"),
+                         _hash_schema_input(tentative_schema), _hash_schema_input(schema_with_examples),
+                         _hash_schema_input(schema_with_descriptions), include_value_description, shuffle, shuffle_seed)
+            cached_schema_string = self.schema_string_cache.get(cache_key)
+            if cached_schema_string is not None:
+                return cached_schema_string
+
+        schema_generator = self._get_schema_generator(tentative_schema, schema_with_examples, schema_with_descriptions)
+        schema_string = schema_generator.generate_schema_string(include_value_description=include_value_description, shuffle_cols=shuffle,
+                                                                shuffle_tables=shuffle, shuffle_seed=shuffle_seed)
+        if cache_key is not None:
+            self.schema_string_cache.put(cache_key, schema_string)
+        return schema_string
+
+    def get_compressed_database_schema_string(self, tentative_schema: Dict[str, List[str]], 
+                                              schema_with_examples: Dict[str, List[str]], 
+                                              schema_with_descriptions: Dict[str, Dict[str, Dict[str, Any]]], 
+                                              column_relevance: Dict[str, Dict[str, float]],
+                                              protected_columns: Dict[str, List[str]],
+                                              token_budget: Optional[int],
+                                              include_value_description: bool,
+                                              shuffle_seed: Optional[int] = None,
+                                              shuffle: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """
+        Generates a schema string for the database that fits a token budget, trimming and dropping the least relevant columns first.
+        Like get_database_schema_string, strings rendered with a shuffle seed are memoized.
+
+        Args:
+            tentative_schema (Dict[str, List[str]]): The tentative schema.
+            schema_with_examples (Dict[str, List[str]]): Schema with example values.
+            schema_with_descriptions (Dict[str, Dict[str, Dict[str, Any]]]): Schema with descriptions.
+            column_relevance (Dict[str, Dict[str, float]]): Relevance scores of the columns, higher is more relevant.
+            protected_columns (Dict[str, List[str]]): Columns that must not be dropped, in addition to keys and join columns.
+            token_budget (Optional[int]): The maximum number of tokens of the schema string. None disables the compression.
+            include_value_description (bool): Whether to include value descriptions.
+            shuffle_seed (Optional[int]): Seed for the table and column shuffles. Defaults to a fresh, uncached shuffle.
+            shuffle (bool): Whether to shuffle the tables and columns. Without shuffling, tables and columns keep the database order.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: The generated schema string and its token report.
+        """
+        shuffle_seed = shuffle_seed if shuffle else None
+        cache_key = None
+        if shuffle_seed is not None or not shuffle:
+            cache_key = (self.db_id, "database", self.get_index_version("database"),
+                         _hash_schema_input(tentative_schema), _hash_schema_input(schema_with_examples),
+                         _hash_schema_input(schema_with_descriptions), _hash_schema_input(column_relevance),
+                         _hash_schema_input(protected_columns), token_budget, include_value_description, shuffle, shuffle_seed)
+            cached_result = self.schema_string_cache.get(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        schema_generator = self._get_schema_generator(tentative_schema, schema_with_examples, schema_with_descriptions)
+        schema_compressor = SchemaCompressor(
+            schema_generator=schema_generator,
+            column_relevance=column_relevance,
+            protected_columns=protected_columns,
+            token_counter=count_tokens,
+            include_value_description=include_value_description,
+        )
+        result = schema_compressor.compress(token_budget=token_budget, shuffle_seed=shuffle_seed, shuffle=shuffle)
+        if cache_key is not None:
+            self.schema_string_cache.put(cache_key, result)
+        return result
+
+    def _get_schema_generator(self, tentative_schema: Dict[str, List[str]], 
+                              schema_with_examples: Dict[str, List[str]], 
+                              schema_with_descriptions: Dict[str, Dict[str, Dict[str, Any]]]) -> DatabaseSchemaGenerator:
+        return DatabaseSchemaGenerator(
             tentative_schema=DatabaseSchema.from_schema_dict(tentative_schema),
             schema_with_examples=DatabaseSchema.from_schema_dict_with_examples(schema_with_examples) if schema_with_examples else None,
             schema_with_descriptions=DatabaseSchema.from_schema_dict_with_descriptions(schema_with_descriptions) if schema_with_descriptions else None,
             db_id=self.db_id,
             db_path=self.db_path,
         )
-        schema_string = schema_generator.generate_schema_string(include_value_description=include_value_description)
-        return schema_string
     
-    def add_connections_to_tentative_schema(self, tentative_schema: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    def add_connections_to_tentative_schema(self, tentative_schema: Dict[str, List[str]], add_join_path_tables: bool = False) -> Dict[str, List[str]]:
         """
         Adds connections to the tentative schema.
+        Connections are looked up in the join graph of the database, which is built once per database.
 
         Args:
             tentative_schema (Dict[str, List[str]]): The tentative schema.
+            add_join_path_tables (bool): Flag to also add the bridge tables needed to join the selected tables.
 
         Returns:
             Dict[str, List[str]]: The updated schema with connections.
         """
-        schema_generator = DatabaseSchemaGenerator(
-            tentative_schema=DatabaseSchema.from_schema_dict(tentative_schema),
-            db_id=self.db_id,
-            db_path=self.db_path,
-        )
-        tentative_schema = schema_generator.get_schema_with_connections()
+        if self.db_id not in DatabaseSchemaGenerator.CACHED_DB_SCHEMA:
+            DatabaseSchemaGenerator._load_schema_into_cache(db_id=self.db_id, db_path=self.db_path)
+        join_graph = DatabaseSchemaGenerator.get_join_graph(self.db_id)
+        table_names = list(tentative_schema.keys())
+        if add_join_path_tables:
+            table_names, _ = join_graph.get_join_path(table_names)
+        connections = join_graph.get_connection_columns(table_names)
+
+        full_schema = DatabaseSchemaGenerator.CACHED_DB_SCHEMA[self.db_id]
+        schema_with_connections = full_schema.subselect_schema(DatabaseSchema.from_schema_dict(tentative_schema)).to_dict()
+        for table_name, connected_columns in connections.items():
+            selected_columns = schema_with_connections.setdefault(table_name, [])
+            for column_name in connected_columns:
+                if column_name not in selected_columns:
+                    selected_columns.append(column_name)
+        return schema_with_connections
 
     def get_union_schema_dict(self, schema_dict_list: List[Dict[str, List[str]]]) -> Dict[str, List[str]]:
         """
@@ -309,6 +576,13 @@ functions_to_add = [
 # Adding methods to the class
 DatabaseManager.add_methods_to_class(functions_to_add)
 
+def _hash_schema_input(schema_input: Any) -> str:
+    """
+    Computes a stable hash of a schema dictionary, used to key the rendered schema cache.
+    """
+    serialized = json.dumps(schema_input, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
 # Auxiliary function for interacting with the index server
 def receive_data_in_chunks(conn, chunk_size=1024):
             length_bytes = conn.recv(4)
@@ -0,0 +1,84 @@
+import copy
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Tuple
+
+class RetrievalCache:
+    """
+    A thread-safe, size-bounded LRU cache for LSH and vector database retrieval results.
+    Keys start with (db_id, index_name, index_version) so results computed against a rebuilt index are never served.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size: int = 4096):
+        """
+        Initializes the RetrievalCache.
+
+        Args:
+            max_size (int): The maximum number of entries kept before evicting the least recently used one.
+        """
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Hashable, ...], default: Any = None) -> Any:
+        """
+        Retrieves a copy of the cached value for the key, marking it as recently used.
+
+        Args:
+            key (Tuple[Hashable, ...]): The cache key.
+            default (Any, optional): The value returned on a miss.
+
+        Returns:
+            Any: A deep copy of the cached value, or the default on a miss.
+        """
+        with self._lock:
+            value = self._entries.get(key, self._MISSING)
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: Tuple[Hashable, ...], value: Any) -> None:
+        """
+        Stores a copy of the value, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (Tuple[Hashable, ...]): The cache key.
+            value (Any): The value to cache.
+        """
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, db_id: str, index_name: str = None) -> None:
+        """
+        Removes all entries of a database, or only those computed against one of its indexes.
+
+        Args:
+            db_id (str): The database identifier.
+            index_name (str, optional): The index whose entries should be removed. Defaults to all indexes.
+        """
+        with self._lock:
+            stale_keys = [key for key in self._entries 
+                          if key[0] == db_id and (index_name is None or key[1] == index_name)]
+            for key in stale_keys:
+                del self._entries[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            Dict[str, int]: The number of entries, hits and misses.
+        """
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -11,6 +11,10 @@ from runner.database_manager import DatabaseManager
 from runner.statistics_manager import StatisticsManager
 from workflow.team_builder import build_team
 from database_utils.execution import ExecutionStatus
+from llm.engine_registry import ENGINE_REGISTRY
+from llm.scheduler import LLM_REQUEST_SCHEDULER
+from llm.resilience import LLM_RESILIENCE
+from llm.single_flight import LLM_SINGLE_FLIGHT_GROUP
 from workflow.system_state import SystemState
 import fcntl
 
@@ -91,11 +95,15 @@ class RunManager:
         """Runs the tasks using a pool of workers."""
         print(f"Running tasks with {self.args.num_workers} workers.")
         if self.args.num_workers > 1:
+            worker_errors = []
             with Pool(self.args.num_workers) as pool:
                 for task in self.tasks:
-                    pool.apply_async(self.worker, args=(task,), callback=self.task_done)
+                    pool.apply_async(self.worker, args=(task,), callback=self.task_done, error_callback=worker_errors.append)
                 pool.close()
                 pool.join()
+            if worker_errors:
+                # Errors escaping a task (the tools record their own) abort the run, such as replay-only cache misses.
+                raise worker_errors[0]
         else:
             for task in self.tasks:
                 log = self.worker(task)
@@ -127,6 +135,10 @@ class RunManager:
         for state_dict in team.stream(state_values, thread_config, stream_mode="values"):
             logger.log("________________________________________________________________________________________")
             continue
+        logger.log(f"LLM engine registry: {ENGINE_REGISTRY.get_stats()}", "info")
+        logger.log(f"LLM request scheduler: {LLM_REQUEST_SCHEDULER.get_stats()}", "info")
+        logger.log(f"LLM resilience: {LLM_RESILIENCE.get_stats()}", "info")
+        logger.log(f"LLM single-flight: {LLM_SINGLE_FLIGHT_GROUP.get_stats()}", "info")
         system_state = SystemState(**state_dict)
         return system_state, task.db_id, task.question_id
 
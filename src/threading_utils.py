@@ -1,7 +1,16 @@
 import queue
+import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 import logging
 
+SHARED_EXECUTOR_MAX_WORKERS = 8
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
 def _threaded(func):
     """
     A function that adds threading capabilities to a function.
@@ -51,3 +60,37 @@ def ordered_concurrent_function_calls(call_list: list) -> list:
     sorted_results = [result[1] for result in results]
 
     return sorted_results
+
+def get_shared_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide thread pool used to fan out independent tools.
+    Functions submitted to it must not block on other work submitted to the same pool.
+
+    Returns:
+        ThreadPoolExecutor: The shared thread pool.
+    """
+    global _shared_executor
+    if _shared_executor is None:
+        with _shared_executor_lock:
+            if _shared_executor is None:
+                _shared_executor = ThreadPoolExecutor(max_workers=SHARED_EXECUTOR_MAX_WORKERS, thread_name_prefix="shared")
+    return _shared_executor
+
+
+def get_background_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the process-wide event loop running in a background thread, on which synchronous code
+    can run coroutines with `asyncio.run_coroutine_threadsafe`.
+    Coroutines submitted to it must not block the loop.
+
+    Returns:
+        asyncio.AbstractEventLoop: The background event loop.
+    """
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="background-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
@@ -1,12 +1,14 @@
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 from pydantic import BaseModel
 import concurrent.futures
 from functools import partial
 import logging
+import math
 import threading
 
-from llm.models import async_llm_chain_call, get_llm_chain
-from llm.prompts import get_prompt
+from database_utils.execution import ExecutionStatus
+from llm.models import async_llm_chain_call, get_llm_chain, submit_llm_chain_call
+from llm.prompts import get_prompt, PROMPT_LAYOUT_SHUFFLED, PROMPT_LAYOUT_PREFIX_STABLE
 from llm.parsers import get_parser
 from workflow.system_state import SystemState
 from workflow.sql_meta_info import SQLMetaInfo
@@ -23,12 +25,29 @@ class GenerateCandidate(Tool):
         parser_name: str
         sampling_count: int
         input_file_path: str = None
+        schema_token_budget: Optional[int] = None
+        prompt_layout: str = PROMPT_LAYOUT_SHUFFLED
+        # Draws all samples from one prompt (one upload with engines supporting native multi-sample requests)
+        # instead of sending one diversified prompt per sample.
+        native_sampling: bool = False
+        # Launches the samples progressively and stops once enough of them execute to the same result.
+        early_stopping: bool = False
+        # Fraction of sampling_count that must agree on the execution result to stop.
+        early_stopping_agreement: float = 0.5
+        # Number of samples in flight at once when stopping early.
+        early_stopping_window: int = 3
 
     def __init__(self,
                 generator_configs: list[Dict]):
         super().__init__()
         self.generator_configs = [self.GeneratorConfig(**config) for config in generator_configs]
+        for generator_config in self.generator_configs:
+            if generator_config.early_stopping and generator_config.native_sampling:
+                raise ValueError(f"Generator {generator_config.template_name}: early_stopping cannot be combined with native_sampling, "
+                                 "which draws all samples in one request")
         self.generators_queries = {}
+        self.schema_token_reports = {}
+        self.sampling_reports = {}
         self.next_generator_to_use = "ALL"
 
     def _process_generator(self, generator_config, state: SystemState):
@@ -49,17 +68,30 @@ class GenerateCandidate(Tool):
             return []
             
         request_list = []
-        for i in range(generator_config.sampling_count):
+        schema_token_reports = []
+        sample_seeds = [0] if generator_config.native_sampling else range(generator_config.sampling_count)
+        for i in sample_seeds:
             try:
+                prefix_stable = generator_config.prompt_layout == PROMPT_LAYOUT_PREFIX_STABLE
+                sample_seed = state.get_sample_seed(generator_config.template_name, i)
+                database_schema, schema_token_report = state.get_compressed_schema_string(
+                    token_budget=generator_config.schema_token_budget, schema_type="complete", shuffle_seed=sample_seed, shuffle=not prefix_stable
+                )
                 request_kwargs = {
-                    "DATABASE_SCHEMA": state.get_schema_string(schema_type="complete"),
+                    "DATABASE_SCHEMA": database_schema,
                     "QUESTION": state.task.question,
                     "HINT": state.task.evidence,
                 }
+                if prefix_stable:
+                    diversity_seed = None if generator_config.native_sampling else sample_seed
+                    request_kwargs["DIVERSITY_HINT"] = state.get_diversity_hint(seed=diversity_seed, schema_type="complete")
                 request_list.append(request_kwargs)
+                schema_token_reports.append(schema_token_report)
             except Exception as e:
                 logging.info(f"Error in creating request_kwargs for generator {generator_config.template_name}: {e}")
                 continue
+        self.schema_token_reports[generator_config.template_name] = schema_token_reports
+        logging.info(f"Schema tokens per prompt: {[report['schema_tokens'] for report in schema_token_reports]}")
         
         try:
             logging.info("Making API call with following parameters:")
@@ -67,20 +99,32 @@ class GenerateCandidate(Tool):
             logging.info(f"Engine: {generator_config.engine_config}")
             logging.info(f"Number of requests: {len(request_list)}")
             
-            response = async_llm_chain_call(
-                prompt=get_prompt(template_name=generator_config.template_name),
-                engine=get_llm_chain(**generator_config.engine_config),
-                parser=get_parser(generator_config.parser_name),
-                request_list=request_list,
-                step=f"{self.tool_name}_{generator_config.engine_config['engine_name']}",
-            )
-            response = [res for sublist in response for res in sublist]
-            logging.info(f"API call successful, received {len(response)} responses")
+            prompt = get_prompt(template_name=generator_config.template_name, prompt_layout=generator_config.prompt_layout)
+            engine = get_llm_chain(**generator_config.engine_config)
+            parser = get_parser(generator_config.parser_name)
+            step = f"{self.tool_name}_{generator_config.engine_config['engine_name']}"
+            sql_meta_infos = []
+            if generator_config.early_stopping:
+                # The candidates were executed while sampling, so they are kept with their execution results.
+                sql_meta_infos, sampling_report = self._sample_until_consensus(generator_config, prompt, engine, parser, request_list, step)
+                self.sampling_reports[generator_config.template_name] = sampling_report
+                logging.info(f"Sampling report: {sampling_report}")
+                response = []
+            else:
+                response = async_llm_chain_call(
+                    prompt=prompt,
+                    engine=engine,
+                    parser=parser,
+                    request_list=request_list,
+                    step=step,
+                    sampling_count=generator_config.sampling_count if generator_config.native_sampling else 1,
+                )
+                response = [res for sublist in response for res in sublist]
+                logging.info(f"API call successful, received {len(response)} responses")
         except Exception as e:
             logging.info(f"Error in generating SQL queries for generator {generator_config.template_name}: {e}")
             return []
             
-        sql_meta_infos = []
         for res in response:
             if not res:
                 continue
@@ -93,6 +137,90 @@ class GenerateCandidate(Tool):
         
         return sql_meta_infos
 
+    def _sample_until_consensus(self, generator_config: GeneratorConfig, prompt: Any, engine: Any, parser: Any,
+                                request_list: List[Dict], step: str) -> Tuple[List[SQLMetaInfo], Dict[str, int]]:
+        """
+        Samples the requests progressively, executing each candidate as it arrives, and stops once the largest cluster
+        of candidates with the same (non-empty) execution result reaches the agreement threshold.
+        Requests not started yet are cancelled.
+
+        Args:
+            generator_config (GeneratorConfig): The generator configuration.
+            prompt (Any): The prompt.
+            engine (Any): The LLM chain.
+            parser (Any): The parser of the responses.
+            request_list (List[Dict]): The request of every sample.
+            step (str): The step name of the requests.
+
+        Returns:
+            Tuple[List[SQLMetaInfo], Dict[str, int]]: The executed candidates received, and the sampling report.
+        """
+        required_agreement = max(1, math.ceil(generator_config.early_stopping_agreement * len(request_list)))
+        window = max(1, generator_config.early_stopping_window)
+        sql_meta_infos = []
+        received = 0
+        cluster_sizes = {}
+        in_flight = set()
+        launched = 0
+        cancelled = 0
+        while True:
+            while launched < len(request_list) and len(in_flight) < window:
+                in_flight.add(submit_llm_chain_call(prompt, engine, parser, request_list[launched], step, sample_index=launched))
+                launched += 1
+            if not in_flight:
+                break
+            done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                try:
+                    res = future.result()
+                except Exception as e:
+                    logging.info(f"Error in sampling a candidate: {e}")
+                    continue
+                received += 1
+                if not res:
+                    continue
+                try:
+                    sql_meta_info = SQLMetaInfo(**res)
+                except Exception as e:
+                    logging.info(f"Error in creating SQLMetaInfo for generator {generator_config.template_name}: {e}")
+                    continue
+                sql_meta_infos.append(sql_meta_info)
+                cluster_key = self._get_cluster_key(sql_meta_info)
+                if cluster_key is not None:
+                    cluster_sizes[cluster_key] = cluster_sizes.get(cluster_key, 0) + 1
+            if max(cluster_sizes.values(), default=0) >= required_agreement:
+                cancelled = sum(future.cancel() for future in in_flight)
+                break
+        return sql_meta_infos, {
+            "planned": len(request_list),
+            "launched": launched,
+            "received": received,
+            "largest_cluster": max(cluster_sizes.values(), default=0),
+            "required_agreement": required_agreement,
+            "saved": len(request_list) - launched + cancelled,
+        }
+
+    @staticmethod
+    def _get_cluster_key(sql_meta_info: SQLMetaInfo) -> Optional[str]:
+        """
+        Executes a sampled candidate and returns its execution result cluster.
+        The execution result is kept on the candidate, so it is not executed again downstream.
+
+        Args:
+            sql_meta_info (SQLMetaInfo): The sampled candidate.
+
+        Returns:
+            Optional[str]: The cluster key, or None if the candidate does not execute to a non-empty result.
+        """
+        try:
+            execution_result = sql_meta_info.execution_result
+            if sql_meta_info.execution_status != ExecutionStatus.SYNTACTICALLY_CORRECT:
+                return None
+        except Exception as e:
+            logging.info(f"Error in executing a sampled candidate: {e}")
+            return None
+        return str(execution_result) if isinstance(execution_result, str) else repr(execution_result)
+
     def _run(self, state: SystemState):
         """
         Executes the candidate generation process using parallel processing.
@@ -103,6 +231,8 @@ class GenerateCandidate(Tool):
         state.SQL_meta_infos[self.tool_name] = []
         for generator_config in self.generator_configs:
             self.generators_queries[generator_config.template_name] = []
+            self.schema_token_reports[generator_config.template_name] = []
+            self.sampling_reports.pop(generator_config.template_name, None)
 
         # Use ThreadPoolExecutor for parallel processing
         with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(self.generator_configs), 4)) as executor:
@@ -136,5 +266,7 @@ class GenerateCandidate(Tool):
         return {
             "node_type": self.tool_name,
             "generation_based_candidates": [{"template_name": generator_config.template_name, "candidates": [candidate.SQL for candidate in self.generators_queries[generator_config.template_name]]} for generator_config in self.generator_configs],
+            "schema_token_reports": self.schema_token_reports,
+            "sampling_reports": self.sampling_reports,
             "candidates": candidates
         }
\ No newline at end of file
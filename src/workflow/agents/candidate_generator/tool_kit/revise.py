@@ -1,9 +1,7 @@
 from typing import Dict
-import concurrent.futures
-from functools import partial
 
 from llm.models import async_llm_chain_call, get_llm_chain
-from llm.prompts import get_prompt
+from llm.prompts import get_prompt, PROMPT_LAYOUT_SHUFFLED, PROMPT_LAYOUT_PREFIX_STABLE
 from llm.parsers import get_parser
 from database_utils.execution import ExecutionStatus
 from workflow.system_state import SystemState
@@ -15,70 +13,70 @@ class Revise(Tool):
     Tool for correcting a SQL query that returns empty set or has a syntax error.
     """
 
-    def __init__(self, template_name: str = None, engine_config: str = None, parser_name: str = None):
+    def __init__(self, template_name: str = None, engine_config: str = None, parser_name: str = None, schema_token_budget: int = None,
+                 prompt_layout: str = PROMPT_LAYOUT_SHUFFLED):
         super().__init__()
         self.template_name = template_name
         self.engine_config = engine_config
         self.parser_name = parser_name
+        self.schema_token_budget = schema_token_budget
+        self.prompt_layout = prompt_layout
+        self.schema_token_reports = []
         
 
     def _process_batch(self, batch_data, state: SystemState):
         """
         Process a batch of SQL queries for revision.
+        The requests are sent through the shared LLM request scheduler, which bounds their concurrency.
         
         Args:
             batch_data (list): List of (index, SQL_meta_info) tuples to process
             state (SystemState): The current system state
+
+        Returns:
+            list: The revision response of each tuple, None where the request could not be created or failed.
         """
         request_list = []
-        for index, target_SQL_meta_info in batch_data:
+        request_positions = []
+        for position, (index, target_SQL_meta_info) in enumerate(batch_data):
             try:
+                prefix_stable = self.prompt_layout == PROMPT_LAYOUT_PREFIX_STABLE
+                sample_seed = state.get_sample_seed(self.tool_name, self.template_name, index)
+                database_schema, schema_token_report = state.get_compressed_schema_string(
+                    token_budget=self.schema_token_budget, schema_type="complete", shuffle_seed=sample_seed, shuffle=not prefix_stable
+                )
                 request_kwargs = {
-                    "DATABASE_SCHEMA": state.get_schema_string(schema_type="complete"),
+                    "DATABASE_SCHEMA": database_schema,
                     "QUESTION": state.task.question,
                     "HINT": state.task.evidence,
                     "QUERY": target_SQL_meta_info.SQL,
                     "RESULT": self.get_formatted_execution_result(target_SQL_meta_info)
                 }
+                if prefix_stable:
+                    request_kwargs["DIVERSITY_HINT"] = state.get_diversity_hint(seed=sample_seed, schema_type="complete")
                 request_list.append(request_kwargs)
+                request_positions.append(position)
+                self.schema_token_reports.append(schema_token_report)
             except Exception as e:
                 print(f"Error in Checker while creating request list: {e}")
                 continue
 
-        try:
-            # Create a prompt and engine for each request
-            prompts = [get_prompt(template_name=self.template_name) for _ in request_list]
-            engines = [get_llm_chain(**self.engine_config) for _ in request_list]
-            parser = get_parser(self.parser_name)
-            
-            # Process requests in parallel
-            with concurrent.futures.ThreadPoolExecutor(max_workers=len(request_list)) as executor:
-                futures = []
-                for prompt, engine, request in zip(prompts, engines, request_list):
-                    future = executor.submit(
-                        async_llm_chain_call,
-                        prompt=prompt,
-                        engine=engine,
-                        parser=parser,
-                        request_list=[request],
-                        step=f"{self.tool_name}_parallel"
-                    )
-                    futures.append(future)
-                
-                # Gather results
-                responses = []
-                for future in concurrent.futures.as_completed(futures):
-                    try:
-                        result = future.result()
-                        responses.extend(result[0])
-                    except Exception as e:
-                        print(f"Error in parallel LLM call: {e}")
-                        continue
-                
+        responses = [None] * len(batch_data)
+        if not request_list:
             return responses
+        try:
+            response = async_llm_chain_call(
+                prompt=get_prompt(template_name=self.template_name, prompt_layout=self.prompt_layout),
+                engine=get_llm_chain(**self.engine_config),
+                parser=get_parser(self.parser_name),
+                request_list=request_list,
+                step=f"{self.tool_name}_parallel"
+            )
+            for position, result in zip(request_positions, response):
+                responses[position] = result[0]
         except Exception as e:
             print(f"Error in Checker while getting response: {e}")
-            return []
+        return responses
 
     def _run(self, state: SystemState):
         """
@@ -100,6 +98,7 @@ class Revise(Tool):
         else:
             SQL_id = self.tool_name + "_1"
         state.SQL_meta_infos[SQL_id] = []
+        self.schema_token_reports = []
 
         # Mark queries that need fixing
         for SQL_meta_info in target_SQL_meta_infos:
@@ -112,17 +111,8 @@ class Revise(Tool):
 
         need_fixing_SQL_meta_infos = [(index, target_SQL_meta_info) for index, target_SQL_meta_info in enumerate(target_SQL_meta_infos) if target_SQL_meta_info.need_fixing]
         
-        # Split into batches for parallel processing
-        batch_size = 5  # Process 5 queries per batch
-        batches = [need_fixing_SQL_meta_infos[i:i + batch_size] for i in range(0, len(need_fixing_SQL_meta_infos), batch_size)]
-        
-        # Process batches in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(batches), 4)) as executor:
-            process_func = partial(self._process_batch, state=state)
-            all_responses = list(executor.map(process_func, batches))
-        
-        # Flatten responses
-        response = [item for sublist in all_responses for item in sublist]
+        # The scheduler bounds the concurrency, so all queries are sent as one batch
+        response = self._process_batch(need_fixing_SQL_meta_infos, state)
         
         # Process results
         index = 0
@@ -194,5 +184,6 @@ class Revise(Tool):
         return {
             "original_SQL_id": original_SQL_id,
             "refined_SQL_id": refined_SQL_id,
-            "candidates": candidates
+            "candidates": candidates,
+            "schema_token_reports": self.schema_token_reports
         }
\ No newline at end of file
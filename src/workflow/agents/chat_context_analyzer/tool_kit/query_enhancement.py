@@ -2,6 +2,7 @@ from typing import Dict, Any
 from workflow.agents.tool import Tool
 from workflow.chat_state import ChatSystemState
 from llm.models import async_llm_chain_call, get_llm_chain
+from llm.scheduler import PRIORITY_INTERACTIVE
 from llm.prompts import get_prompt
 from llm.parsers import get_parser
 import logging
@@ -36,7 +37,8 @@ class QueryEnhancement(Tool):
             parser=get_parser(self.parser_name),
             request_list=[request_kwargs],
             step=self.tool_name,
-            sampling_count=1
+            sampling_count=1,
+            priority=PRIORITY_INTERACTIVE
         )[0][0]
         
         # Update question with schema-enhanced version
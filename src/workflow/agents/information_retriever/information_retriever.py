@@ -1,5 +1,7 @@
 from workflow.agents.agent import Agent
 from workflow.system_state import SystemState
+from runner.logger import Logger
+from threading_utils import get_shared_executor
 import logging
 
 from workflow.agents.information_retriever.tool_kit.extract_keywords import ExtractKeywords
@@ -12,6 +14,12 @@ class InformationRetriever(Agent):
     Agent responsible for retrieving relevant entities and context from the question and hint.
     """
     
+    # State fields written by each retrieval tool, merged back in this order in parallel mode
+    RETRIEVAL_TOOL_FIELDS = {
+        "retrieve_entity": ["similar_columns", "schema_with_examples"],
+        "retrieve_context": ["schema_with_descriptions", "column_relevance"],
+    }
+    
     def __init__(self, config: dict):
         """Initialize the tools needed for information retrieval"""
         super().__init__(
@@ -20,6 +28,7 @@ class InformationRetriever(Agent):
                          "extracting keywords, retrieving entities, and retrieving context"),
             config=config
         )
+        self.execution_mode = config.get("execution_mode", "agent")
         
         self.tools = {
             "extract_keywords": ExtractKeywords(**config["tools"]["extract_keywords"]),
@@ -30,4 +39,59 @@ class InformationRetriever(Agent):
     def run(self, state: SystemState) -> SystemState:
         logging.info(f"[InformationRetriever] Received question for processing: {state.task.question}")
         logging.info(f"[InformationRetriever] Original question was: {state.task.original_question}")
-        return super().run(state)
\ No newline at end of file
+        return self.workout(state)
+
+    def workout(self, system_state: SystemState) -> SystemState:
+        """
+        Runs the tools in the configured execution mode.
+        In 'parallel' mode, keywords are extracted first and both retrieval tools then run concurrently,
+        since they only depend on the extracted keywords.
+
+        Args:
+            system_state (SystemState): The current system state.
+
+        Returns:
+            SystemState: The processed system state.
+        """
+        if self.execution_mode != "parallel":
+            return super().workout(system_state)
+        
+        self.tools["extract_keywords"](system_state)
+        return self._run_retrieval_tools_concurrently(system_state)
+
+    def _run_retrieval_tools_concurrently(self, system_state: SystemState) -> SystemState:
+        """
+        Runs the retrieval tools on copies of the state using the shared executor and merges their updates
+        back into the state in a fixed order, so the result does not depend on which tool finishes first.
+
+        Args:
+            system_state (SystemState): The current system state.
+
+        Returns:
+            SystemState: The state with the merged retrieval results.
+        """
+        history_length = len(system_state.execution_history)
+        executor = get_shared_executor()
+        futures = {}
+        for tool_name in self.RETRIEVAL_TOOL_FIELDS:
+            tool_state = system_state.model_copy(update={
+                "execution_history": list(system_state.execution_history),
+                "errors": dict(system_state.errors),
+            })
+            futures[tool_name] = (tool_state, executor.submit(self.tools[tool_name], tool_state))
+        
+        for tool_name, field_names in self.RETRIEVAL_TOOL_FIELDS.items():
+            tool_state, future = futures[tool_name]
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error in tool {tool_name}: {e}")
+                system_state.errors[tool_name] = f"{type(e)}: <{e}>"
+                continue
+            for field_name in field_names:
+                setattr(system_state, field_name, getattr(tool_state, field_name))
+            system_state.execution_history.extend(tool_state.execution_history[history_length:])
+            system_state.errors.update(tool_state.errors)
+        
+        Logger().dump_history_to_file(system_state.execution_history)
+        return system_state
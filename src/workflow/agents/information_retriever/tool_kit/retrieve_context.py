@@ -1,7 +1,5 @@
 import logging
 from typing import Dict, List
-import concurrent.futures
-from functools import partial
 
 from database_utils.db_catalog.csv_utils import load_tables_description
 
@@ -45,11 +43,12 @@ class RetrieveContext(Tool):
             top_k=self.top_k
         )
         
+        state.column_relevance = self._get_column_relevance(retrieved_columns)
         state.schema_with_descriptions = self._format_retrieved_descriptions(retrieved_columns)
 
     def _find_most_similar_columns(self, question: str, evidence: str, keywords: List[str], chat_context: str, top_k: int) -> Dict[str, Dict[str, Dict[str, str]]]:
         """
-        Finds the most similar columns based on the question and evidence using parallel processing.
+        Finds the most similar columns based on the question and evidence with a single batched catalog query.
 
         Args:
             question (str): The question string.
@@ -63,46 +62,16 @@ class RetrieveContext(Tool):
         """
         logging.info("Finding the most similar columns")
         
-        # Process keywords in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(keywords), 4)) as executor:
-            process_func = partial(self._process_keyword_query, question=question, evidence=evidence, top_k=top_k)
-            results = list(executor.map(process_func, keywords))
+        queries = []
+        for keyword in keywords:
+            queries.append(f"{question} {keyword}")
+            queries.append(f"{evidence} {keyword}")
         
-        # Merge results
-        tables_with_descriptions = {}
-        for result in results:
-            for table_name, column_descriptions in result.items():
-                if table_name not in tables_with_descriptions:
-                    tables_with_descriptions[table_name] = {}
-                for column_name, description in column_descriptions.items():
-                    if (column_name not in tables_with_descriptions[table_name] or 
-                        description["score"] > tables_with_descriptions[table_name][column_name]["score"]):
-                        tables_with_descriptions[table_name][column_name] = description
-        
-        return tables_with_descriptions
-
-    def _process_keyword_query(self, keyword: str, question: str, evidence: str, top_k: int) -> Dict[str, Dict[str, Dict[str, str]]]:
-        """
-        Process a single keyword query.
+        retrieved_descriptions = DatabaseManager().query_vector_db_batch(queries, top_k=top_k)
         
-        Args:
-            keyword (str): The keyword to process.
-            question (str): The question string.
-            evidence (str): The evidence string.
-            top_k (int): Number of top results to retrieve.
-            
-        Returns:
-            Dict[str, Dict[str, Dict[str, str]]]: Retrieved descriptions for the keyword.
-        """
         tables_with_descriptions = {}
-        question_based_query = f"{question} {keyword}"
-        evidence_based_query = f"{evidence} {keyword}"
-        
-        retrieved_question_based_query = DatabaseManager().query_vector_db(question_based_query, top_k=top_k)
-        retrieved_evidence_based_query = DatabaseManager().query_vector_db(evidence_based_query, top_k=top_k)
-        
-        tables_with_descriptions = self._add_description(tables_with_descriptions, retrieved_question_based_query)
-        tables_with_descriptions = self._add_description(tables_with_descriptions, retrieved_evidence_based_query)
+        for retrieved in retrieved_descriptions:
+            tables_with_descriptions = self._add_description(tables_with_descriptions, retrieved)
         
         return tables_with_descriptions
 
@@ -125,14 +94,36 @@ class RetrieveContext(Tool):
             if table_name not in tables_with_descriptions:
                 tables_with_descriptions[table_name] = {}
             for column_name, description in column_descriptions.items():
-                if (column_name not in tables_with_descriptions[table_name] or 
-                    description["score"] > tables_with_descriptions[table_name][column_name]["score"]):
+                current = tables_with_descriptions[table_name].get(column_name)
+                if (current is None or 
+                    description["score"] > current["score"]):
                     tables_with_descriptions[table_name][column_name] = description
+                # Scores are squared L2 distances, so the relevance of a column comes from its closest match over all queries.
+                best_score = description["score"] if current is None else min(description["score"], current["best_score"])
+                tables_with_descriptions[table_name][column_name]["best_score"] = best_score
         return tables_with_descriptions
 
+    def _get_column_relevance(self, retrieved_columns: Dict[str, Dict[str, Dict[str, str]]]) -> Dict[str, Dict[str, float]]:
+        """
+        Converts the best retrieval scores (squared L2 distances between normalized embeddings) into relevance scores in [0, 1].
+
+        Args:
+            retrieved_columns (Dict[str, Dict[str, Dict[str, str]]]): The retrieved columns with descriptions.
+
+        Returns:
+            Dict[str, Dict[str, float]]: The relevance of each retrieved column.
+        """
+        return {
+            table_name: {
+                column_name: max(0.0, 1.0 - float(column_info["best_score"]) / 2)
+                for column_name, column_info in column_descriptions.items() if "best_score" in column_info
+            }
+            for table_name, column_descriptions in retrieved_columns.items()
+        }
+
     def _format_retrieved_descriptions(self, retrieved_columns: Dict[str, Dict[str, Dict[str, str]]]) -> Dict[str, Dict[str, Dict[str, str]]]:
         """
-        Formats retrieved descriptions by removing the score key.
+        Formats retrieved descriptions by removing the score keys.
 
         Args:
             retrieved_columns (Dict[str, Dict[str, Dict[str, str]]]): The retrieved columns with descriptions.
@@ -144,7 +135,9 @@ class RetrieveContext(Tool):
         for column_descriptions in retrieved_columns.values():
             for column_info in column_descriptions.values():
                 column_info.pop("score", None)
+                column_info.pop("best_score", None)
         return retrieved_columns
 
     def _get_updates(self, state: SystemState) -> Dict:
-        return {"schema_with_descriptions": state.schema_with_descriptions}
\ No newline at end of file
+        return {"schema_with_descriptions": state.schema_with_descriptions,
+                "column_relevance": state.column_relevance}
\ No newline at end of file
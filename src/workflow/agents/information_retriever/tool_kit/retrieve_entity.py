@@ -1,3 +1,4 @@
+import logging
 import numpy as np
 import difflib
 from typing import List, Dict, Any, Tuple, Optional
@@ -5,24 +6,9 @@ import concurrent.futures
 from functools import partial
 
 from langchain_openai import OpenAIEmbeddings
-from google.oauth2 import service_account
-from google.cloud import aiplatform
-import vertexai
-import os
-
-GCP_PROJECT = os.getenv("GCP_PROJECT")
-GCP_REGION = os.getenv("GCP_REGION")
-GCP_CREDENTIALS = os.getenv("GCP_CREDENTIALS")
-
-if GCP_CREDENTIALS and GCP_PROJECT and GCP_REGION:
-    aiplatform.init(
-    project=GCP_PROJECT,
-    location=GCP_REGION,
-    credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS)
-    )
-    vertexai.init(project=GCP_PROJECT, location=GCP_REGION, credentials=service_account.Credentials.from_service_account_file(GCP_CREDENTIALS))
 
 from runner.database_manager import DatabaseManager
+from database_utils.db_values.search import ngram_presence
 from workflow.system_state import SystemState
 from workflow.agents.tool import Tool
 
@@ -31,13 +17,17 @@ class RetrieveEntity(Tool):
     Tool for retrieving entities and columns similar to given keywords from the question and hint.
     """
 
-    def __init__(self):
+    def __init__(self, max_probes: int = 64, n_gram: int = 3, min_ngram_presence: float = 0.0):
         super().__init__()
         self.embedding_function = OpenAIEmbeddings(model="text-embedding-3-small")
         self.edit_distance_threshold = 0.3
         self.embedding_similarity_threshold = 0.6
+        self.max_probes = max_probes
+        self.n_gram = n_gram
+        self.min_ngram_presence = min_ngram_presence
         
         self.retrieved_entities = []
+        self.probe_stats = {}
         
     def _run(self, state: SystemState):
         """
@@ -248,33 +238,68 @@ class RetrieveEntity(Tool):
                     
         return selected_values
 
-    def _get_to_search_values(self, keywords: List[str]) -> List[str]:
+    def _get_to_search_values(self, keywords: List[str]) -> List[Dict[str, str]]:
         """
-        Extracts values to search from the keywords.
+        Extracts the bounded set of values to search from the keywords.
+        Probes are deduplicated across keywords, pruned when none of their n-grams occur in the value index
+        (probes shorter than the n-gram size have no n-gram and are always kept), and capped at the probe budget, preferring whole keywords and hint values over shorter substrings.
 
         Args:
             keywords (List[str]): The list of keywords.
 
         Returns:
-            List[str]: A list of values to search.
+            List[Dict[str, str]]: A list of substring packets to search.
         """
-        def get_substring_packet(keyword: str, substring: str) -> Dict[str, str]:
-            return {"keyword": keyword, "substring": substring}
+        def get_substring_packet(keyword: str, substring: str, priority: int) -> Dict[str, Any]:
+            return {"keyword": keyword, "substring": substring, "priority": priority}
         
-        to_search_values = []
+        candidates = []
         for keyword in keywords:
             keyword = keyword.strip()
-            to_search_values.append(get_substring_packet(keyword, keyword))
+            candidates.append(get_substring_packet(keyword, keyword, 0))
+            hint_column, hint_value = self._column_value(keyword)
+            if hint_value:
+                candidates.append(get_substring_packet(keyword, hint_value, 0))
             if " " in keyword:
                 for i in range(len(keyword)):
                     if keyword[i] == " ":
                         first_part = keyword[:i]
                         second_part = keyword[i+1:]
-                        to_search_values.append(get_substring_packet(keyword, first_part))
-                        to_search_values.append(get_substring_packet(keyword, second_part))
-            hint_column, hint_value = self._column_value(keyword)
-            if hint_value:
-                to_search_values.append(get_substring_packet(keyword, hint_value))
+                        candidates.append(get_substring_packet(keyword, first_part, 1))
+                        candidates.append(get_substring_packet(keyword, second_part, 1))
+        
+        # Sorted before deduplicating, so a substring probed for several keywords keeps its highest priority packet.
+        candidates.sort(key=lambda x: (x["priority"], -len(x["substring"])))
+        seen_substrings = set()
+        unique_candidates = []
+        for packet in candidates:
+            # LSH and the n-gram index are case-sensitive, so only identical substrings are duplicates
+            substring = packet["substring"]
+            if not substring.strip() or substring in seen_substrings:
+                continue
+            seen_substrings.add(substring)
+            unique_candidates.append(packet)
+        
+        ngram_index = DatabaseManager().get_value_ngram_index(self.n_gram)
+        short_candidates = [packet for packet in unique_candidates if len(packet["substring"]) < self.n_gram]
+        present_candidates = short_candidates + [packet for packet in unique_candidates 
+                                                 if len(packet["substring"]) >= self.n_gram
+                                                 and ngram_presence(ngram_index, packet["substring"], self.n_gram) > self.min_ngram_presence]
+        
+        present_candidates.sort(key=lambda x: (x["priority"], -len(x["substring"])))
+        to_search_values = [{"keyword": packet["keyword"], "substring": packet["substring"]} 
+                            for packet in present_candidates[:self.max_probes]]
+        
+        self.probe_stats = {
+            "generated": len(candidates),
+            "pruned_as_duplicate": len(candidates) - len(unique_candidates),
+            "shorter_than_ngram": len(short_candidates),
+            "pruned_by_ngram_filter": len(unique_candidates) - len(present_candidates),
+            "pruned_by_budget": len(present_candidates) - len(to_search_values),
+            "probed": len(to_search_values),
+        }
+        logging.info(f"Entity search probes: {self.probe_stats}")
+        
         to_search_values.sort(key=lambda x: (x["keyword"], len(x["substring"]), x["substring"]), reverse=True)
         return to_search_values
     
@@ -336,4 +361,5 @@ class RetrieveEntity(Tool):
                 
     def _get_updates(self, state: SystemState) -> Dict:
         return {"similar_columns": state.similar_columns, 
-                "schema_with_examples": state.schema_with_examples}
\ No newline at end of file
+                "schema_with_examples": state.schema_with_examples,
+                "probe_stats": self.probe_stats}
\ No newline at end of file
@@ -1,9 +1,10 @@
 import logging
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 from llm.models import async_llm_chain_call, get_llm_chain
 from llm.prompts import get_prompt
 from llm.parsers import get_parser
+from llm.tokens import count_tokens
 from runner.logger import Logger
 from runner.database_manager import DatabaseManager
 from workflow.system_state import SystemState
@@ -12,68 +13,206 @@ from workflow.agents.tool import Tool
 class FilterColumn(Tool):
     """
     Tool for filtering columns based on profiles and updating the tentative schema.
+    With a batch size above one, several column profiles are judged in a single request, and the columns
+    whose verdict is missing from a batched answer are judged again with single column requests.
     """
 
-    def __init__(self, template_name: str = None, engine_config: str = None, parser_name: str = None):
+    def __init__(self, template_name: str = None, engine_config: str = None, parser_name: str = None,
+                 batch_size: int = 1, batch_token_budget: int = 2000,
+                 batch_template_name: str = "filter_column_batch", batch_parser_name: str = "filter_column_batch"):
         super().__init__()
         self.template_name = template_name
         self.engine_config = engine_config
         self.parser_name = parser_name
+        self.batch_size = batch_size
+        self.batch_token_budget = batch_token_budget
+        self.batch_template_name = batch_template_name
+        self.batch_parser_name = batch_parser_name
+        self.request_stats = {}
 
     def _run(self, state: SystemState):
         """
         Executes the column filtering process.
-        
+
         Args:
             state (SystemState): The current system state.
         """
 
         column_profiles = DatabaseManager().get_column_profiles(
-            schema_with_examples=state.schema_with_examples, 
-            use_value_description=True, 
-            with_keys=True, 
+            schema_with_examples=state.schema_with_examples,
+            use_value_description=True,
+            with_keys=True,
             with_references=True,
             tentative_schema=state.tentative_schema
         )
 
-        list_of_kwargs = []
-        for table_name, columns in column_profiles.items():
-            for column_name, column_profile in columns.items():
-                kwargs = {
-                    "QUESTION": state.task.question,
-                    "HINT": state.task.evidence,
-                    "COLUMN_PROFILE": column_profile,
-                }
-                list_of_kwargs.append(kwargs)
+        columns = [
+            (table_name, column_name, column_profile)
+            for table_name, columns in column_profiles.items()
+            for column_name, column_profile in columns.items()
+        ]
+        self.request_stats = {"columns": len(columns), "batched_requests": 0, "single_requests": 0, "fallback_columns": 0}
+
+        verdicts = {}
+        if self.batch_size > 1:
+            verdicts.update(self._filter_in_batches(state, columns))
+        remaining_columns = [column for column in columns if (column[0], column[1]) not in verdicts]
+        if self.batch_size > 1:
+            self.request_stats["fallback_columns"] = len(remaining_columns)
+        verdicts.update(self._filter_one_by_one(state, remaining_columns))
 
-        response = async_llm_chain_call(
-            prompt=get_prompt(template_name=self.template_name),
-            engine=get_llm_chain(**self.engine_config),
-            parser=get_parser(self.parser_name),
-            request_list=list_of_kwargs,
-            step=self.tool_name, 
-            sampling_count=1
-        )
-        
-        index = 0
         tentative_schema = state.tentative_schema
         for table_name, columns in column_profiles.items():
             tentative_schema[table_name] = []
-            for column_name, column_profile in columns.items():
+            for column_name in columns:
                 try:
-                    chosen = (response[index][0]["is_column_information_relevant"].lower() == "yes")
+                    chosen = (verdicts[(table_name, column_name)]["is_column_information_relevant"].lower() == "yes")
                     if chosen:
                         tentative_schema[table_name].append(column_name)
                 except Exception as e:
                     Logger().log(f"({state.task.db_id}, {state.task.question_id}) Error in column filtering: {e}", "error")
                     logging.error(f"Error in column filtering for table '{table_name}', column '{column_name}': {e}")
-                index += 1        
-        
+
         state.add_columns_to_tentative_schema(state.similar_columns)
         state.add_connections_to_tentative_schema()
-        
+
+    def _pack_batches(self, columns: List[Tuple[str, str, str]]) -> List[List[Tuple[str, str, str]]]:
+        """
+        Packs the column profiles, in order, into batches of at most `batch_size` columns and `batch_token_budget` profile tokens.
+        A profile larger than the budget gets a batch of its own.
+
+        Args:
+            columns (List[Tuple[str, str, str]]): The (table, column, profile) triples.
+
+        Returns:
+            List[List[Tuple[str, str, str]]]: The batches.
+        """
+        batches = []
+        current_batch = []
+        current_tokens = 0
+        for column in columns:
+            profile_tokens = count_tokens(column[2])
+            if current_batch and (len(current_batch) >= self.batch_size or current_tokens + profile_tokens > self.batch_token_budget):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(column)
+            current_tokens += profile_tokens
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    def _filter_in_batches(self, state: SystemState, columns: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """
+        Judges the relevance of the columns with batched requests.
+
+        Args:
+            state (SystemState): The current system state.
+            columns (List[Tuple[str, str, str]]): The (table, column, profile) triples.
+
+        Returns:
+            Dict[Tuple[str, str], Dict]: The verdicts of the columns answered by the batched requests.
+        """
+        batches = self._pack_batches(columns)
+        if not batches:
+            return {}
+        list_of_kwargs = []
+        for batch in batches:
+            column_profiles = "\n\n".join(
+                f"Column {column_number}:\n{column_profile.strip()}"
+                for column_number, (_, _, column_profile) in enumerate(batch, start=1)
+            )
+            list_of_kwargs.append({
+                "QUESTION": state.task.question,
+                "HINT": state.task.evidence,
+                "COLUMN_PROFILES": column_profiles,
+            })
+
+        response = async_llm_chain_call(
+            prompt=get_prompt(template_name=self.batch_template_name),
+            engine=get_llm_chain(**self.engine_config),
+            parser=get_parser(self.batch_parser_name),
+            request_list=list_of_kwargs,
+            step=self.tool_name,
+            sampling_count=1
+        )
+        self.request_stats["batched_requests"] = len(batches)
+
+        verdicts = {}
+        for batch, batch_response in zip(batches, response):
+            batch_verdicts = self._get_batch_verdicts(batch_response[0], len(batch))
+            for column_number, (table_name, column_name, _) in enumerate(batch, start=1):
+                if column_number in batch_verdicts:
+                    verdicts[(table_name, column_name)] = batch_verdicts[column_number]
+        return verdicts
+
+    @staticmethod
+    def _get_batch_verdicts(batch_response: Optional[List[Dict]], batch_length: int) -> Dict[int, Dict]:
+        """
+        Maps the verdicts of a batched answer to their column numbers, leaving out duplicated or out of range numbers
+        and answers other than yes or no.
+
+        Args:
+            batch_response (Optional[List[Dict]]): The parsed verdicts, or None if the request failed.
+            batch_length (int): The number of columns in the batch.
+
+        Returns:
+            Dict[int, Dict]: The verdict of each answered column number.
+        """
+        batch_verdicts = {}
+        duplicated = set()
+        for verdict in batch_response or []:
+            column_number = verdict["column_number"]
+            if not 1 <= column_number <= batch_length:
+                continue
+            if verdict["is_column_information_relevant"] not in ("yes", "no"):
+                continue
+            if column_number in batch_verdicts:
+                duplicated.add(column_number)
+            batch_verdicts[column_number] = verdict
+        for column_number in duplicated:
+            del batch_verdicts[column_number]
+        return batch_verdicts
+
+    def _filter_one_by_one(self, state: SystemState, columns: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str], Dict]:
+        """
+        Judges the relevance of each column with its own request.
+
+        Args:
+            state (SystemState): The current system state.
+            columns (List[Tuple[str, str, str]]): The (table, column, profile) triples.
+
+        Returns:
+            Dict[Tuple[str, str], Dict]: The verdicts of the columns whose request succeeded.
+        """
+        if not columns:
+            return {}
+        list_of_kwargs = []
+        for _, _, column_profile in columns:
+            kwargs = {
+                "QUESTION": state.task.question,
+                "HINT": state.task.evidence,
+                "COLUMN_PROFILE": column_profile,
+            }
+            list_of_kwargs.append(kwargs)
+
+        response = async_llm_chain_call(
+            prompt=get_prompt(template_name=self.template_name),
+            engine=get_llm_chain(**self.engine_config),
+            parser=get_parser(self.parser_name),
+            request_list=list_of_kwargs,
+            step=self.tool_name,
+            sampling_count=1
+        )
+        self.request_stats["single_requests"] = len(columns)
+
+        verdicts = {}
+        for (table_name, column_name, _), column_response in zip(columns, response):
+            if column_response[0] is not None:
+                verdicts[(table_name, column_name)] = column_response[0]
+        return verdicts
 
     def _get_updates(self, state: SystemState) -> Dict:
-        updates = {"tentative_schema": state.tentative_schema}
+        updates = {"tentative_schema": state.tentative_schema, "request_stats": dict(self.request_stats)}
         updates.update(state.check_schema_status())
-        return updates
\ No newline at end of file
+        return updates
@@ -11,15 +11,18 @@ from runner.database_manager import DatabaseManager
 class SelectTables(Tool):
     """
     Tool for selecting tables based on the specified mode and updating the tentative schema.
+    With add_join_path_tables, the bridge tables needed to join the selected tables are added back with their join columns.
     """
 
-    def __init__(self, mode: str, template_name: str = None, engine_config: str = None, parser_name: str = None, sampling_count: int = 1):
+    def __init__(self, mode: str, template_name: str = None, engine_config: str = None, parser_name: str = None, sampling_count: int = 1,
+                 add_join_path_tables: bool = False):
         super().__init__()
         self.mode = mode
         self.template_name = template_name
         self.engine_config = engine_config
         self.parser_name = parser_name
         self.sampling_count = sampling_count
+        self.add_join_path_tables = add_join_path_tables
         
         self.selected_tables = []
         self.chain_of_thought_reasoning = ""
@@ -68,7 +71,7 @@ class SelectTables(Tool):
             for table_name in self.selected_tables
         }
         state.add_columns_to_tentative_schema(state.similar_columns)
-        state.add_connections_to_tentative_schema()
+        state.add_connections_to_tentative_schema(add_join_path_tables=self.add_join_path_tables)
 
     def aggregate_tables(self, tables_dicts: List[Dict[str, Any]]) -> Dict[str, List[str]]:
         """
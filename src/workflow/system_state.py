@@ -1,11 +1,14 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from runner.task import Task
 from runner.database_manager import DatabaseManager
+from database_utils.schema import DatabaseSchema
 from workflow.sql_meta_info import SQLMetaInfo
 
 import re
+import random
+import hashlib
 
 
 class SystemState(BaseModel):
@@ -28,6 +31,7 @@ class SystemState(BaseModel):
     similar_columns: Dict[str, List[str]] = {}
     schema_with_examples: Dict[str, Dict[str, List[str]]] = {}
     schema_with_descriptions:  Dict[str, Dict[str, Dict[str, str]]] = {}
+    column_relevance: Dict[str, Dict[str, float]] = {}
     
     SQL_meta_infos: Dict[str, List[SQLMetaInfo]] = {}
     unit_tests: Dict[str, List[str]] = {}
@@ -68,17 +72,16 @@ class SystemState(BaseModel):
         correct_columns = DatabaseManager().get_sql_columns_dict(sql=ground_truth_sql)
         missing_tables = []
         missing_columns = []
+        tentative_schema = DatabaseSchema.from_schema_dict(self.tentative_schema)
 
         for table_name, cols in correct_columns.items():
             for col in cols:
-                selected_table = [table for table in self.tentative_schema.keys() if table.lower() == table_name.lower()]
-                if not selected_table:
+                selected_table = tentative_schema.get_table_info(table_name)
+                if selected_table is None:
                     if table_name not in missing_tables:
                         missing_tables.append(table_name)
-                else:
-                    selected_table = selected_table[0]
-                    if col.lower() not in [selected_col.lower() for selected_col in self.tentative_schema[selected_table]]:
-                        missing_columns.append(f"'{table_name}'.'{col}'")
+                elif selected_table.get_actual_column_name(col) is None:
+                    missing_columns.append(f"'{table_name}'.'{col}'")
         
         status = {
             "missing_table_status": "success" if not missing_tables else "missing_table",
@@ -89,15 +92,20 @@ class SystemState(BaseModel):
         }
         return status
     
-    def add_connections_to_tentative_schema(self):
+    def add_connections_to_tentative_schema(self, add_join_path_tables: bool = False):
         """
         Adds connections to the tentative schema.
+
+        Args:
+            add_join_path_tables (bool): Flag to also add the bridge tables needed to join the selected tables.
         """
-        DatabaseManager().add_connections_to_tentative_schema(self.tentative_schema)
+        self.tentative_schema = DatabaseManager().add_connections_to_tentative_schema(self.tentative_schema, add_join_path_tables=add_join_path_tables)
         
     def get_schema_string(self,
                           schema_type: str = "tentative",
-                          include_value_description: bool = True) -> str:
+                          include_value_description: bool = True,
+                          shuffle_seed: Optional[int] = None,
+                          shuffle: bool = True) -> str:
 
         if schema_type == "tentative":
             schema = self.tentative_schema
@@ -110,9 +118,95 @@ class SystemState(BaseModel):
             schema,
             self.schema_with_examples,
             self.schema_with_descriptions,
-            include_value_description=include_value_description
+            include_value_description=include_value_description,
+            shuffle_seed=shuffle_seed,
+            shuffle=shuffle
         )
     
+    def get_compressed_schema_string(self,
+                                     token_budget: Optional[int],
+                                     schema_type: str = "tentative",
+                                     include_value_description: bool = True,
+                                     shuffle_seed: Optional[int] = None,
+                                     shuffle: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """
+        Renders the schema string within a token budget, using the relevance of the retrieved columns.
+        Columns similar to the question or holding retrieved values are never dropped.
+
+        Args:
+            token_budget (Optional[int]): The maximum number of tokens of the schema string. None disables the compression.
+            schema_type (str): The schema to render, "tentative" or "complete".
+            include_value_description (bool): Whether to include value descriptions.
+            shuffle_seed (Optional[int]): Seed for the table and column shuffles.
+            shuffle (bool): Whether to shuffle the tables and columns.
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: The schema string and its token report.
+        """
+        if schema_type == "tentative":
+            schema = self.tentative_schema
+        elif schema_type == "complete":
+            schema = DatabaseManager().get_db_schema()
+        else:
+            raise ValueError(f"Unknown schema type: {schema_type}")
+
+        column_relevance = {table_name: dict(columns) for table_name, columns in self.column_relevance.items()}
+        protected_columns = {table_name: list(columns) for table_name, columns in self.similar_columns.items()}
+        for table_name, columns in self.schema_with_examples.items():
+            protected_columns.setdefault(table_name, []).extend(columns)
+        for table_name, columns in protected_columns.items():
+            for column_name in columns:
+                column_relevance.setdefault(table_name, {})[column_name] = 1.0
+
+        return DatabaseManager().get_compressed_database_schema_string(
+            schema,
+            self.schema_with_examples,
+            self.schema_with_descriptions,
+            column_relevance=column_relevance,
+            protected_columns=protected_columns,
+            token_budget=token_budget,
+            include_value_description=include_value_description,
+            shuffle_seed=shuffle_seed,
+            shuffle=shuffle
+        )
+
+    def get_sample_seed(self, *parts: Any) -> int:
+        """
+        Derives a reproducible seed for one sample of one question, e.g. for its schema shuffles.
+        Seeds differ across databases, questions and the given parts (such as the generator and the sample index),
+        and are stable across runs and processes, so the seeded schema strings can be cached.
+
+        Args:
+            *parts (Any): The parts identifying the sample within the question.
+
+        Returns:
+            int: The seed.
+        """
+        key = repr((self.task.db_id, str(self.task.question_id)) + parts)
+        return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+    def get_diversity_hint(self, seed: Optional[int], schema_type: str = "tentative") -> str:
+        """
+        Builds the short per-sample hint that replaces the schema shuffles in the prefix stable prompt layout.
+
+        Args:
+            seed (Optional[int]): The sample seed. No hint is given without a seed.
+            schema_type (str): The schema the hint refers to, "tentative" or "complete".
+
+        Returns:
+            str: The diversity hint.
+        """
+        if seed is None:
+            return ""
+        if schema_type == "tentative":
+            table_names = list(self.tentative_schema.keys())
+        elif schema_type == "complete":
+            table_names = list(DatabaseManager().get_db_schema().keys())
+        else:
+            raise ValueError(f"Unknown schema type: {schema_type}")
+        random.Random(seed).shuffle(table_names)
+        return f"For this attempt, go over the tables in the following order: {', '.join(table_names)}."
+
     def get_database_schema_for_queries(
         self,
         queries: List[str],
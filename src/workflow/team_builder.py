@@ -1,30 +1,36 @@
 import logging
+import importlib
 from typing import Dict, Any
 
 from langgraph.graph import END, StateGraph
+from llm.prompts import PROMPT_TEMPLATE_REGISTRY
 from workflow.system_state import SystemState
 from workflow.chat_state import ChatSystemState
 
-from workflow.agents.information_retriever.information_retriever import InformationRetriever
-from workflow.agents.schema_selector.schema_selector import SchemaSelector
-from workflow.agents.candidate_generator.candidate_generator import CandidateGenerator
-from workflow.agents.unit_tester.unit_tester import UnitTester
-from workflow.agents.response_generator.response_generator import ResponseGenerator
-from workflow.agents.sql_executor.sql_executor import SQLExecutor
-from workflow.agents.chat_context_analyzer.chat_context_analyzer import ChatContextAnalyzer
-
-from workflow.agents.evaluation import ExecutionAccuracy
-
+# Agent classes by dotted path, imported (with their tools) only when the configuration uses the agent.
 AGENT_CLASSES = {
-    "chat_context_analyzer": ChatContextAnalyzer,
-    "candidate_generator": CandidateGenerator,
-    "information_retriever": InformationRetriever,
-    "schema_selector": SchemaSelector,
-    "unit_tester": UnitTester,
-    "response_generator": ResponseGenerator,
-    "sql_executor": SQLExecutor,
+    "chat_context_analyzer": "workflow.agents.chat_context_analyzer.chat_context_analyzer.ChatContextAnalyzer",
+    "candidate_generator": "workflow.agents.candidate_generator.candidate_generator.CandidateGenerator",
+    "information_retriever": "workflow.agents.information_retriever.information_retriever.InformationRetriever",
+    "schema_selector": "workflow.agents.schema_selector.schema_selector.SchemaSelector",
+    "unit_tester": "workflow.agents.unit_tester.unit_tester.UnitTester",
+    "response_generator": "workflow.agents.response_generator.response_generator.ResponseGenerator",
+    "sql_executor": "workflow.agents.sql_executor.sql_executor.SQLExecutor",
 }
 
+def get_agent_class(agent_name: str) -> type:
+    """
+    Imports the class of an agent.
+
+    Args:
+        agent_name (str): The name of the agent in the configuration.
+
+    Returns:
+        type: The agent class.
+    """
+    module_name, class_name = AGENT_CLASSES[agent_name].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
 class CHESSTeamBuilder:
     def __init__(self, config: Dict[str, any]) -> None:
         state_class = ChatSystemState if config.get("enable_chat", False) else SystemState
@@ -38,7 +44,7 @@ class CHESSTeamBuilder:
         self._add_agents(agents)
         
         # Skip adding evaluation node
-        # self.team.add_node("evaluation", ExecutionAccuracy())
+        # self.team.add_node("evaluation", ExecutionAccuracy()) # from workflow.agents.evaluation
         
         # Connect agents without evaluation
         agents_list = list(agents.keys())
@@ -56,7 +62,7 @@ class CHESSTeamBuilder:
             agents (list): A list of agent names.
         """
         for agent_name, agent_config in agents.items():
-            agent = AGENT_CLASSES[agent_name](config=agent_config)
+            agent = get_agent_class(agent_name)(config=agent_config)
             self.team.add_node(agent_name, agent)
             logging.info(f"Added agent: {agent_name}.")
 
@@ -83,6 +89,7 @@ def build_team(config: Dict[str, any]) -> StateGraph:
         StateGraph: The compiled team.
     """
 
+    PROMPT_TEMPLATE_REGISTRY.load_all()
     builder = CHESSTeamBuilder(config)
     builder.build()
     team = builder.team.compile()
@@ -6,6 +6,7 @@ from typing import Dict, Optional
 import uuid
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from interface import CHESSInterface
 from threading import Lock
@@ -71,7 +72,7 @@ async def create_session(request: SessionRequest):
         interface = get_user_interface(request.user_id)
         
         # Create a new CHESS session
-        chess_session_id = interface.start_chat_session(request.db_id)
+        chess_session_id = await run_in_threadpool(interface.start_chat_session, request.db_id)
         
         # Store the mapping
         with sessions_lock:
@@ -115,8 +116,10 @@ async def query(request: QueryRequest):
         # Format the prompt part with date
         formatted_prompt = f"[EMPLOYEE_ID]\n{request.user_id}{date_info}\n\n[QUESTION]\n{prompt}"
 
-        # Process the query using the user's interface with instructions as evidence
-        response = interface.chat_query(
+        # Process the query using the user's interface with instructions as evidence,
+        # off the event loop so that concurrent requests are not blocked by the pipeline
+        response = await run_in_threadpool(
+            interface.chat_query,
             session_id=chess_session_id,
             question=formatted_prompt,
             evidence=instructions